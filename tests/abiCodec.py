@@ -0,0 +1,668 @@
+"""Pure Python contract ABI codec, byte compatible with chain abi_serializer.
+
+Loads contract .abi json, resolves typedefs, structs and struct bases once and compiles a pack/unpack
+function pair per type. Runs of fixed size fields are packed with a single struct.Struct call.
+Removes the cleos or abi_json_to_bin round trip per action when building transactions in the harness.
+"""
+
+import calendar
+import glob
+import json
+import os
+import struct
+import time
+
+import eosKeys
+
+###########################################################################################
+class AbiError(Exception):
+    pass
+
+###########################################################################################
+# Built-in value conversions, mirroring eosio::chain name, symbol and asset
+
+_nameCharmap=".12345abcdefghijklmnopqrstuvwxyz"
+_nameCharIndex=dict((c, i) for i, c in enumerate(_nameCharmap))
+_nameToIntCache={}
+_intToNameCache={}
+_maxNameCache=65536
+
+def nameToInt(s):
+    value=_nameToIntCache.get(s)
+    if value is not None:
+        return value
+    if len(s) > 13:
+        raise AbiError("Name is longer than 13 characters (%s)" % (s))
+    value=0
+    for i in range(13):
+        c=_nameCharIndex.get(s[i], 0) if i < len(s) else 0
+        if i < 12:
+            value |= (c & 0x1f) << (64-5*(i+1))
+        else:
+            value |= c & 0x0f
+    if len(_nameToIntCache) < _maxNameCache:
+        _nameToIntCache[s]=value
+    return value
+
+def intToName(value):
+    s=_intToNameCache.get(value)
+    if s is not None:
+        return s
+    chars=["."]*13
+    tmp=value
+    for i in range(13):
+        chars[12-i]=_nameCharmap[tmp & (0x0f if i == 0 else 0x1f)]
+        tmp >>= (4 if i == 0 else 5)
+    s="".join(chars).rstrip(".")
+    if len(_intToNameCache) < _maxNameCache:
+        _intToNameCache[value]=s
+    return s
+
+def _symbolCodeToInt(code):
+    value=0
+    for i, c in enumerate(code):
+        if c < "A" or c > "Z":
+            raise AbiError("invalid character in symbol name: %s" % (code))
+        value |= ord(c) << (8*(i+1))
+    return value
+
+def _symbolName(value):
+    value >>= 8
+    chars=[]
+    while value > 0:
+        chars.append(chr(value & 0xff))
+        value >>= 8
+    return "".join(chars)
+
+# "4,EOS" -> uint64
+def symbolToInt(s):
+    s=s.strip()
+    comma=s.find(",")
+    if comma < 0:
+        raise AbiError("missing comma in symbol: %s" % (s))
+    return _symbolCodeToInt(s[comma+1:]) | int(s[:comma])
+
+def intToSymbol(value):
+    return "%d,%s" % (value & 0xff, _symbolName(value))
+
+def symbolCodeToInt(s):
+    return _symbolCodeToInt(s) >> 8
+
+def intToSymbolCode(value):
+    return _symbolName(value << 8)
+
+# "1.0000 EOS" -> (amount, symbol)
+def assetToInts(s):
+    s=s.strip()
+    space=s.find(" ")
+    if space < 0:
+        raise AbiError("Asset's amount and symbol should be separated with space: %s" % (s))
+    amountStr=s[:space]
+    symbolStr=s[space+1:].strip()
+    dot=amountStr.find(".")
+    if dot == len(amountStr)-1:
+        raise AbiError("Missing decimal fraction after decimal point: %s" % (s))
+    decimals=len(amountStr)-dot-1 if dot >= 0 else 0
+    if dot >= 0:
+        intPart=int(amountStr[:dot])
+        fractPart=int(amountStr[dot+1:])
+        if amountStr[0] == "-":
+            fractPart=-fractPart
+    else:
+        intPart=int(amountStr)
+        fractPart=0
+    return (intPart*10**decimals + fractPart, _symbolCodeToInt(symbolStr) | decimals)
+
+# Matches asset::to_string, including truncating integer division
+def intsToAsset(amount, symbol):
+    decimals=symbol & 0xff
+    precision=10**decimals
+    intPart=-(-amount // precision) if amount < 0 else amount // precision
+    result=str(intPart)
+    if decimals:
+        fract=amount - intPart*precision
+        result += "." + str(precision + fract)[1:]
+    return result + " " + _symbolName(symbol)
+
+def timeToInt(value):
+    if isinstance(value, int):
+        return value
+    return calendar.timegm(time.strptime(value.split(".")[0], "%Y-%m-%dT%H:%M:%S"))
+
+def intToTime(value):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(value))
+
+def _checksum(data, prefix):
+    return eosKeys.ripemd160(data + prefix.encode("utf-8"))[:4]
+
+# "EOS..." | "EOSK1..." | "EOSR1..." -> (which, data)
+def _parseKeyString(s, size, kind):
+    if not s.startswith(eosKeys.PublicKeyPrefix):
+        raise AbiError("%s has invalid prefix: %s" % (kind, s))
+    s=s[len(eosKeys.PublicKeyPrefix):]
+    which=0
+    prefix=""
+    for i, p in enumerate(("K1", "R1")):
+        if s.startswith(p):
+            which, prefix, s=i, p, s[len(p):]
+            break
+    raw=eosKeys.base58Decode(s)
+    if len(raw) != size+4:
+        raise AbiError("Invalid %s length: %s" % (kind, s))
+    data=raw[:size]
+    if _checksum(data, prefix) != raw[size:]:
+        raise AbiError("Invalid %s checksum: %s" % (kind, s))
+    return (which, data)
+
+def _formatKeyString(which, data):
+    prefix="" if which == 0 else ("K1", "R1")[which]
+    return eosKeys.PublicKeyPrefix + prefix + eosKeys.base58Encode(data + _checksum(data, prefix))
+
+###########################################################################################
+# Variable length encodings
+
+def packVarUint32(value, buf):
+    while True:
+        b=value & 0x7f
+        value >>= 7
+        if value:
+            buf.append(b | 0x80)
+        else:
+            buf.append(b)
+            return
+
+def unpackVarUint32(data, pos):
+    value=0
+    shift=0
+    while True:
+        b=data[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return (value, pos)
+        shift += 7
+
+def _packString(value, buf):
+    raw=value.encode("utf-8")
+    packVarUint32(len(raw), buf)
+    buf += raw
+
+def _unpackString(data, pos):
+    size, pos=unpackVarUint32(data, pos)
+    end=pos+size
+    return (bytes(data[pos:end]).decode("utf-8"), end)
+
+def _fixedStringCodec(capacity):
+    def pack(value, buf):
+        raw=value.encode("utf-8")[:capacity]
+        packVarUint32(len(raw), buf)
+        buf += raw
+    return (pack, _unpackString)
+
+def _packBytes(value, buf):
+    raw=bytes.fromhex(value)
+    packVarUint32(len(raw), buf)
+    buf += raw
+
+def _unpackBytes(data, pos):
+    size, pos=unpackVarUint32(data, pos)
+    end=pos+size
+    return (bytes(data[pos:end]).hex(), end)
+
+def _checksumCodec(size):
+    def pack(value, buf):
+        raw=bytes.fromhex(value)
+        if len(raw) != size:
+            raise AbiError("Expected %d byte checksum, got %d" % (size, len(raw)))
+        buf += raw
+    def unpack(data, pos):
+        end=pos+size
+        return (bytes(data[pos:end]).hex(), end)
+    return (pack, unpack)
+
+def _keyCodec(size, kind):
+    def pack(value, buf):
+        which, data=_parseKeyString(value, size, kind)
+        packVarUint32(which, buf)
+        buf += data
+    def unpack(data, pos):
+        which, pos=unpackVarUint32(data, pos)
+        end=pos+size
+        return (_formatKeyString(which, bytes(data[pos:end])), end)
+    return (pack, unpack)
+
+def _bigUintCodec(size):
+    def pack(value, buf):
+        buf += int(value).to_bytes(size, "little")
+    def unpack(data, pos):
+        end=pos+size
+        return (str(int.from_bytes(data[pos:end], "little")), end)
+    return (pack, unpack)
+
+###########################################################################################
+# Fixed size built-ins: (struct format, to raw tuple, from raw values). Runs of these are merged into one Struct.
+
+def _intSpec(fmt):
+    return (fmt, lambda v: (int(v),), None)
+
+def _largeIntFromRaw(v):
+    return v if v <= 0xffffffff else str(v)
+
+def _floatToString(v):
+    return "%.17f" % (v)
+
+_FixedTypes={
+    "uint8":           _intSpec("B"),
+    "uint16":          _intSpec("H"),
+    "uint32":          _intSpec("I"),
+    "uint64":          ("Q", lambda v: (int(v),), _largeIntFromRaw),
+    "int8":            _intSpec("b"),
+    "int16":           _intSpec("h"),
+    "int32":           _intSpec("i"),
+    "int64":           ("q", lambda v: (int(v),), _largeIntFromRaw),
+    "float64":         ("d", lambda v: (float(v),), _floatToString),
+    "name":            ("Q", lambda v: (nameToInt(v),), intToName),
+    "time":            ("I", lambda v: (timeToInt(v),), intToTime),
+    "symbol":          ("Q", lambda v: (symbolToInt(v),), intToSymbol),
+    "symbol_code":     ("Q", lambda v: (symbolCodeToInt(v),), intToSymbolCode),
+    "asset":           ("qQ", assetToInts, intsToAsset),
+}
+for _alias in ("account_name", "permission_name", "action_name", "scope_name"):
+    _FixedTypes[_alias]=_FixedTypes["name"]
+
+_VariableTypes={
+    "string":          (_packString, _unpackString),
+    "field_name":      (_packString, _unpackString),
+    "type_name":       (_packString, _unpackString),
+    "fixed_string32":  _fixedStringCodec(32),
+    "fixed_string16":  _fixedStringCodec(16),
+    "bytes":           (_packBytes, _unpackBytes),
+    "checksum160":     _checksumCodec(20),
+    "checksum256":     _checksumCodec(32),
+    "checksum512":     _checksumCodec(64),
+    "public_key":      _keyCodec(33, "Public Key"),
+    "signature":       _keyCodec(65, "Signature"),
+    "uint128":         _bigUintCodec(16),
+    "uint256":         _bigUintCodec(32),
+}
+
+# Built-in struct types defined by the chain rather than contract abis
+_BuiltInStructs=[
+    {"name": "producer_key", "base": "", "fields": [
+        {"name": "producer_name", "type": "account_name"},
+        {"name": "block_signing_key", "type": "public_key"}]},
+    {"name": "producer_schedule", "base": "", "fields": [
+        {"name": "version", "type": "uint32"},
+        {"name": "producers", "type": "producer_key[]"}]},
+]
+
+def isBuiltInType(typeName):
+    return typeName in _FixedTypes or typeName in _VariableTypes or typeName == "producer_schedule"
+
+###########################################################################################
+class AbiCodec(object):
+    """Compiled codec for one contract abi. pack* take json style values, unpack* return them as
+    abi_bin_to_json would. With stringifyLargeInts, 64 bit integers above 0xffffffff come back as strings,
+    the same as nodeos json output."""
+
+    def __init__(self, abi, stringifyLargeInts=True):
+        if isinstance(abi, str):
+            abi=json.loads(abi)
+        self.abi=abi
+        self.stringifyLargeInts=stringifyLargeInts
+        self.typedefs={}
+        self.structs={}
+        self.actions={}
+        self.tables={}
+        for st in _BuiltInStructs:
+            self.structs[st["name"]]=st
+        for st in abi.get("structs", []):
+            self.structs[st["name"]]=st
+        for td in abi.get("types", []):
+            self.typedefs[td["new_type_name"]]=td["type"]
+        for a in abi.get("actions", []):
+            self.actions[a["name"]]=a["type"]
+        for t in abi.get("tables", []):
+            self.tables[t["name"]]=t["type"]
+        self.__codecs={}
+        self.__validate()
+
+    @staticmethod
+    def fromFile(abiFile, stringifyLargeInts=True):
+        with open(abiFile, "r") as f:
+            return AbiCodec(json.load(f), stringifyLargeInts)
+
+    def __validate(self):
+        for newType in self.typedefs:
+            seen=[newType]
+            t=self.typedefs[newType]
+            while t in self.typedefs:
+                if t in seen:
+                    raise AbiError("Circular reference in type %s" % (newType))
+                seen.append(t)
+                t=self.typedefs[t]
+            if not self.isType(t):
+                raise AbiError("Invalid type %s for typedef %s" % (t, newType))
+        for st in self.structs.values():
+            seen=[st["name"]]
+            current=st
+            while current.get("base"):
+                base=self.getStruct(current["base"])
+                if base["name"] in seen:
+                    raise AbiError("Circular reference in struct %s" % (st["name"]))
+                seen.append(base["name"])
+                current=base
+            for field in st["fields"]:
+                if not self.isType(field["type"]):
+                    raise AbiError("Invalid type %s for field %s.%s" % (field["type"], st["name"], field["name"]))
+        for name, t in list(self.actions.items()) + list(self.tables.items()):
+            if not self.isType(t):
+                raise AbiError("Invalid type %s for %s" % (t, name))
+
+    def resolveType(self, typeName):
+        while typeName in self.typedefs:
+            typeName=self.typedefs[typeName]
+        return typeName
+
+    @staticmethod
+    def fundamentalType(typeName):
+        if typeName.endswith("[]"):
+            return typeName[:-2]
+        if typeName.endswith("?"):
+            return typeName[:-1]
+        return typeName
+
+    def isType(self, typeName):
+        t=AbiCodec.fundamentalType(typeName)
+        if isBuiltInType(t) or t in self.structs:
+            return True
+        if t in self.typedefs:
+            return self.isType(self.typedefs[t])
+        return False
+
+    def getStruct(self, typeName):
+        st=self.structs.get(self.resolveType(typeName))
+        if st is None:
+            raise AbiError("Unknown struct %s" % (typeName))
+        return st
+
+    def getActionType(self, action):
+        t=self.actions.get(action)
+        if t is None:
+            raise AbiError("Unknown action %s" % (action))
+        return t
+
+    def getTableType(self, table):
+        t=self.tables.get(table)
+        if t is None:
+            raise AbiError("Unknown table %s" % (table))
+        return t
+
+    # Returns compiled (pack(value, buf), unpack(data, pos) -> (value, pos)) for type
+    def getCodec(self, typeName):
+        codec=self.__codecs.get(typeName)
+        if codec is None:
+            codec=self.__compile(typeName)
+            self.__codecs[typeName]=codec
+        return codec
+
+    def __compile(self, typeName):
+        rtype=self.resolveType(typeName)
+        if rtype != typeName:
+            return self.getCodec(rtype)
+        if rtype.endswith("[]"):
+            return AbiCodec.__arrayCodec(self.getCodec(AbiCodec.fundamentalType(rtype)))
+        if rtype.endswith("?"):
+            return AbiCodec.__optionalCodec(self.getCodec(AbiCodec.fundamentalType(rtype)))
+        if rtype in _FixedTypes:
+            return self.__fieldsCodec([(None, rtype)], single=True)
+        if rtype in _VariableTypes:
+            return _VariableTypes[rtype]
+        return self.__fieldsCodec(self.__structFields(rtype))
+
+    # Struct fields with base struct fields first
+    def __structFields(self, typeName):
+        st=self.getStruct(typeName)
+        fields=self.__structFields(st["base"]) if st.get("base") else []
+        return fields + [(f["name"], f["type"]) for f in st["fields"]]
+
+    def __fixedSpec(self, typeName):
+        rtype=self.resolveType(typeName)
+        spec=_FixedTypes.get(rtype)
+        if spec is None:
+            return None
+        fmt, toRaw, fromRaw=spec
+        if fromRaw is _largeIntFromRaw and not self.stringifyLargeInts:
+            fromRaw=None
+        return (fmt, toRaw, fromRaw)
+
+    @staticmethod
+    def __arrayCodec(elementCodec):
+        packElement, unpackElement=elementCodec
+        def pack(value, buf):
+            packVarUint32(len(value), buf)
+            for v in value:
+                packElement(v, buf)
+        def unpack(data, pos):
+            size, pos=unpackVarUint32(data, pos)
+            result=[]
+            for _ in range(size):
+                v, pos=unpackElement(data, pos)
+                result.append(v)
+            return (result, pos)
+        return (pack, unpack)
+
+    @staticmethod
+    def __optionalCodec(elementCodec):
+        packElement, unpackElement=elementCodec
+        def pack(value, buf):
+            if value is None:
+                buf.append(0)
+            else:
+                buf.append(1)
+                packElement(value, buf)
+        def unpack(data, pos):
+            flag=data[pos]
+            if not flag:
+                return (None, pos+1)
+            return unpackElement(data, pos+1)
+        return (pack, unpack)
+
+    @staticmethod
+    def __fixedRunCodec(run):
+        layout=struct.Struct("<" + "".join(spec[0] for _, spec in run))
+        packers=[(name, spec[1]) for name, spec in run]
+        unpackers=[]
+        index=0
+        for name, spec in run:
+            width=len(spec[0])
+            unpackers.append((name, spec[2], index, width))
+            index += width
+        size=layout.size
+        def pack(value, buf):
+            raw=[]
+            for name, toRaw in packers:
+                try:
+                    v=value[name]
+                except KeyError:
+                    raise AbiError("Missing '%s' in variant object" % (name))
+                raw.extend(toRaw(v))
+            buf += layout.pack(*raw)
+        def unpack(data, pos, obj):
+            items=layout.unpack_from(data, pos)
+            for name, fromRaw, index, width in unpackers:
+                if width == 1:
+                    obj[name]=items[index] if fromRaw is None else fromRaw(items[index])
+                else:
+                    obj[name]=fromRaw(*items[index:index+width])
+            return pos+size
+        return (pack, unpack)
+
+    def __variableFieldCodec(self, name, typeName):
+        packField, unpackField=self.getCodec(typeName)
+        def pack(value, buf):
+            try:
+                v=value[name]
+            except KeyError:
+                raise AbiError("Missing '%s' in variant object" % (name))
+            packField(v, buf)
+        def unpack(data, pos, obj):
+            obj[name], pos=unpackField(data, pos)
+            return pos
+        return (pack, unpack)
+
+    # Compile field list into segments; consecutive fixed size fields share one struct.Struct.
+    #  single: codec for a lone built-in value rather than an object
+    def __fieldsCodec(self, fields, single=False):
+        segments=[]
+        run=[]
+        for name, typeName in fields:
+            spec=self.__fixedSpec(typeName)
+            if spec is not None:
+                run.append((name, spec))
+                continue
+            if run:
+                segments.append(AbiCodec.__fixedRunCodec(run))
+                run=[]
+            segments.append(self.__variableFieldCodec(name, typeName))
+        if run:
+            segments.append(AbiCodec.__fixedRunCodec(run))
+
+        if single:
+            packRun, unpackRun=segments[0]
+            def packValue(value, buf):
+                packRun({None: value}, buf)
+            def unpackValue(data, pos):
+                obj={}
+                pos=unpackRun(data, pos, obj)
+                return (obj[None], pos)
+            return (packValue, unpackValue)
+
+        if len(segments) == 1:
+            packObject, unpackSegment=segments[0]
+        else:
+            packers=[s[0] for s in segments]
+            unpackers=[s[1] for s in segments]
+            def packObject(value, buf):
+                for packSegment in packers:
+                    packSegment(value, buf)
+            def unpackSegment(data, pos, obj):
+                for unpackSeg in unpackers:
+                    pos=unpackSeg(data, pos, obj)
+                return pos
+        def unpackObject(data, pos):
+            obj={}
+            pos=unpackSegment(data, pos, obj)
+            return (obj, pos)
+        return (packObject, unpackObject)
+
+    def packType(self, typeName, value):
+        pack=self.getCodec(typeName)[0]
+        buf=bytearray()
+        try:
+            pack(value, buf)
+        except (AbiError, ValueError, TypeError, AttributeError, struct.error) as ex:
+            raise AbiError("Failed to pack %s: %s" % (typeName, ex))
+        return bytes(buf)
+
+    def unpackType(self, typeName, data):
+        unpack=self.getCodec(typeName)[1]
+        try:
+            value, pos=unpack(data, 0)
+        except (IndexError, ValueError, UnicodeDecodeError, struct.error) as ex:
+            raise AbiError("Failed to unpack %s: %s" % (typeName, ex))
+        if pos != len(data):
+            raise AbiError("Unpacked %d of %d bytes for %s" % (pos, len(data), typeName))
+        return value
+
+    # Pack action args, equivalent to abi_json_to_bin. Returns bytes.
+    def packAction(self, action, args):
+        return self.packType(self.getActionType(action), args)
+
+    # Unpack action data bytes, equivalent to abi_bin_to_json. Returns json object.
+    def unpackAction(self, action, data):
+        return self.unpackType(self.getActionType(action), data)
+
+    # Json style sample value for type, for benchmarks and self checks
+    def sampleValue(self, typeName):
+        rtype=self.resolveType(typeName)
+        if rtype.endswith("[]"):
+            return [self.sampleValue(rtype[:-2]) for _ in range(2)]
+        if rtype.endswith("?"):
+            return self.sampleValue(rtype[:-1])
+        sample=_SampleValues.get(rtype)
+        if sample is not None:
+            return sample
+        return dict((name, self.sampleValue(t)) for name, t in self.__structFields(rtype))
+
+_SampleValues={
+    "uint8": 1, "uint16": 2, "uint32": 3, "uint64": 4, "int8": -1, "int16": -2, "int32": -3, "int64": -4,
+    "float64": "1.50000000000000000", "uint128": "5", "uint256": "6",
+    "name": "inita", "account_name": "inita", "permission_name": "active", "action_name": "transfer",
+    "scope_name": "eosio", "time": "2018-01-01T00:00:00", "symbol": "4,EOS", "symbol_code": "EOS",
+    "asset": "10.0000 EOS", "string": "memo", "field_name": "field", "type_name": "type",
+    "fixed_string32": "fixed", "fixed_string16": "fixed", "bytes": "00ff", "checksum160": "00"*20,
+    "checksum256": "00"*32, "checksum512": "00"*64,
+    "public_key": "EOS6MRyAjQq8ud7hVNYcfnVPJqcVpscN5So8BhtHuGYqET5GDW5CV",
+    "signature": "EOS" + eosKeys.base58Encode(b"\x1f" + b"\x01"*64 + eosKeys.ripemd160(b"\x1f" + b"\x01"*64)[:4]),
+}
+
+###########################################################################################
+# Loads every contracts/<name>/<name>.abi under contractsDir. Returns dict contract name -> AbiCodec.
+def loadContractAbis(contractsDir="contracts", stringifyLargeInts=True):
+    codecs={}
+    for abiFile in sorted(glob.glob(os.path.join(contractsDir, "*", "*.abi"))):
+        name=os.path.splitext(os.path.basename(abiFile))[0]
+        codecs[name]=AbiCodec.fromFile(abiFile, stringifyLargeInts)
+    return codecs
+
+# Compare codec output with the node's abi_json_to_bin and abi_bin_to_json for action args.
+#  node: testUtils.Node (or anything with abiJsonToBin/abiBinToJson). Returns None on match, else error string.
+def crossCheckAction(node, code, codec, action, args):
+    binArgs=codec.packAction(action, args).hex()
+    nodeBinArgs=node.abiJsonToBin(code, action, args)
+    if nodeBinArgs != binArgs:
+        return "%s::%s abi_json_to_bin %s != local %s" % (code, action, nodeBinArgs, binArgs)
+    nodeArgs=node.abiBinToJson(code, action, binArgs)
+    localArgs=codec.unpackAction(action, bytes.fromhex(binArgs))
+    if nodeArgs != localArgs:
+        return "%s::%s abi_bin_to_json %s != local %s" % (code, action, nodeArgs, localArgs)
+    return None
+
+# Time pack and unpack of every action in codec. Returns dict action -> (pack/s, unpack/s, bytes).
+def benchmark(codec, iterations=10000, actions=None):
+    results={}
+    for action in (actions or sorted(codec.actions)):
+        args=codec.sampleValue(codec.getActionType(action))
+        pack, unpack=codec.getCodec(codec.getActionType(action))
+        data=codec.packAction(action, args)
+        start=time.perf_counter()
+        for _ in range(iterations):
+            buf=bytearray()
+            pack(args, buf)
+        packTime=time.perf_counter()-start
+        start=time.perf_counter()
+        for _ in range(iterations):
+            unpack(data, 0)
+        unpackTime=time.perf_counter()-start
+        results[action]=(iterations/packTime, iterations/unpackTime, len(data))
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser=argparse.ArgumentParser(description="Benchmark the python abi codec against contract abis")
+    parser.add_argument("--contracts-dir", type=str, help="Directory holding contracts/<name>/<name>.abi", default="contracts")
+    parser.add_argument("--contracts", type=str, help="Comma separated contract names",
+                        default="eosio.system,eosio.token,currency,exchange")
+    parser.add_argument("--iterations", type=int, help="Pack/unpack iterations per action", default=10000)
+    args=parser.parse_args()
+
+    for contract in args.contracts.split(","):
+        abiFile=os.path.join(args.contracts_dir, contract, "%s.abi" % (contract))
+        codec=AbiCodec.fromFile(abiFile)
+        for action, (packRate, unpackRate, size) in sorted(benchmark(codec, args.iterations).items()):
+            sample=codec.sampleValue(codec.getActionType(action))
+            if codec.unpackAction(action, codec.packAction(action, sample)) != sample:
+                print("ERROR: %s::%s does not round trip" % (contract, action))
+            print("%-14s %-16s %5d bytes  pack %9.0f/s  unpack %9.0f/s" % (contract, action, size, packRate, unpackRate))
@@ -0,0 +1,215 @@
+"""Record and replay of the harness's external calls: http_plugin requests, cleos, pgrep and mongo shell
+commands, and reads of launcher generated config files.
+
+With a recording cassette set (testUtils.Utils.setCassette), every call goes to a log file with its answer,
+result or failure. A replaying cassette serves the recorded answers without a cluster, so the harness's own
+code (json filtering, waits, validation) can be profiled against a real run. Requests are matched by key
+(endpoint and body, or command line). Repeated requests get their recorded answers in order and the last one
+once those run out, since polling loops ask the same question a varying number of times. The replayed run
+has to issue the same requests, e.g. same key pool seed and random seed.
+
+Layout: header (magic, record count, index offset), then records of u32 length + u64 key hash + zlib
+compressed pickle of (key, failed, answer, elapsed seconds), then the index of (offset, key hash) pairs.
+A file without index, from a run that did not close its cassette, is indexed by scanning the records.
+"""
+
+import collections
+import hashlib
+import mmap
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+Magic=b"EOSCAS01"
+_headerLayout=struct.Struct("<8sQQ")
+_recordLayout=struct.Struct("<IQ")
+_indexLayout=struct.Struct("<QQ")
+
+RecordMode="record"
+ReplayMode="replay"
+
+###########################################################################################
+class CassetteMiss(Exception):
+    """Replay got a request that is not in the recording, the replayed run has diverged."""
+    pass
+
+def getKeyHash(key):
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8", "surrogateescape")).digest()[:8], "little")
+
+###########################################################################################
+class Cassette(object):
+    """Call log in record or replay mode. Thread safe. With realTime, replay sleeps as long as the
+    recorded call took."""
+
+    def __init__(self, path, mode=ReplayMode, realTime=False):
+        assert mode in (RecordMode, ReplayMode)
+        self.path=path
+        self.mode=mode
+        self.realTime=realTime
+        self.calls=0
+        self.repeats=0
+        self.misses=0
+        self.__lock=threading.Lock()
+        self.__file=None
+        self.__mmap=None
+        if mode == RecordMode:
+            self.__file=open(path, "wb")
+            self.__file.write(_headerLayout.pack(Magic, 0, 0))
+            self.__index=[]
+        else:
+            self.__file=open(path, "rb")
+            self.__mmap=mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, count, indexOffset=_headerLayout.unpack_from(self.__mmap, 0)
+            if magic != Magic:
+                self.close()
+                raise ValueError("Not a call cassette: %s" % (path))
+            # record offsets in recording order, kept intact while replay consumes __offsets
+            self.__recordOffsets=[]
+            self.__offsets={}
+            for offset, keyHash in self.__readIndex(count, indexOffset):
+                self.__recordOffsets.append(offset)
+                self.__offsets.setdefault(keyHash, collections.deque()).append(offset)
+            # key -> (failed, pickled answer, elapsed) served once the recorded ones are used up
+            self.__last={}
+
+    def __readIndex(self, count, indexOffset):
+        if indexOffset > 0:
+            for i in range(count):
+                yield _indexLayout.unpack_from(self.__mmap, indexOffset + i*_indexLayout.size)
+            return
+        offset=_headerLayout.size
+        while offset + _recordLayout.size <= len(self.__mmap):
+            length, keyHash=_recordLayout.unpack_from(self.__mmap, offset)
+            if offset + _recordLayout.size + length > len(self.__mmap):
+                # torn last record
+                return
+            yield (offset, keyHash)
+            offset += _recordLayout.size + length
+
+    # Returns (key, failed, pickled answer, elapsed) of record at offset
+    def __readRecord(self, offset):
+        length=_recordLayout.unpack_from(self.__mmap, offset)[0]
+        start=offset + _recordLayout.size
+        key, failed, answer, elapsed=pickle.loads(zlib.decompress(self.__mmap[start:start+length]))
+        return (key, failed, pickle.dumps(answer, protocol=pickle.HIGHEST_PROTOCOL), elapsed)
+
+    def __append(self, key, failed, answer, elapsed):
+        data=zlib.compress(pickle.dumps((key, failed, answer, elapsed), protocol=pickle.HIGHEST_PROTOCOL))
+        keyHash=getKeyHash(key)
+        with self.__lock:
+            self.calls += 1
+            offset=self.__file.tell()
+            self.__file.write(_recordLayout.pack(len(data), keyHash))
+            self.__file.write(data)
+            self.__index.append((offset, keyHash))
+
+    def __next(self, key):
+        keyHash=getKeyHash(key)
+        with self.__lock:
+            self.calls += 1
+            offsets=self.__offsets.get(keyHash)
+            while offsets:
+                recordKey, failed, answer, elapsed=self.__readRecord(offsets.popleft())
+                if recordKey == key:
+                    self.__last[key]=(failed, answer, elapsed)
+                    return (failed, answer, elapsed)
+            last=self.__last.get(key)
+            if last is None:
+                self.misses += 1
+                raise CassetteMiss("Request not in cassette %s: %s" % (self.path, key[:256]))
+            self.repeats += 1
+            return last
+
+    # Runs func(), the external call identified by key, through the cassette. Exceptions of errorTypes
+    #  are answers too: recorded, and raised again on replay.
+    def call(self, key, func, errorTypes=()):
+        if self.mode == RecordMode:
+            start=time.perf_counter()
+            try:
+                answer=func()
+            except errorTypes as ex:
+                self.__append(key, True, ex, time.perf_counter()-start)
+                raise
+            self.__append(key, False, answer, time.perf_counter()-start)
+            return answer
+
+        failed, answer, elapsed=self.__next(key)
+        if self.realTime:
+            time.sleep(elapsed)
+        answer=pickle.loads(answer)
+        if failed:
+            raise answer
+        return answer
+
+    def getStats(self):
+        with self.__lock:
+            return {"mode": self.mode, "calls": self.calls, "repeats": self.repeats, "misses": self.misses}
+
+    def close(self):
+        if self.__file is None:
+            return
+        if self.mode == RecordMode:
+            with self.__lock:
+                indexOffset=self.__file.tell()
+                for offset, keyHash in self.__index:
+                    self.__file.write(_indexLayout.pack(offset, keyHash))
+                self.__file.seek(0)
+                self.__file.write(_headerLayout.pack(Magic, len(self.__index), indexOffset))
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__mmap=None
+        self.__file.close()
+        self.__file=None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    # Yields (key, failed, answer, elapsed) of every record in recording order. Replay mode only.
+    def records(self):
+        for offset in self.__recordOffsets:
+            key, failed, answer, elapsed=self.__readRecord(offset)
+            yield (key, failed, pickle.loads(answer), elapsed)
+
+# Request kind and target of key, e.g. "http /v1/chain/get_info" or "cmd cleos get info". Command
+#  options are skipped along with their values.
+def getOperation(key):
+    parts=key.split("\n", 1)[0].split()
+    if len(parts) < 2:
+        return key[:64]
+    if parts[0] == "http":
+        return "http " + parts[1][parts[1].find("/"):]
+    words=[parts[0], parts[1].rsplit("/", 1)[-1]]
+    afterOption=False
+    for part in parts[2:]:
+        if part.startswith("-"):
+            afterOption=True
+        elif afterOption:
+            afterOption=False
+        else:
+            words.append(part)
+            if len(words) == 4:
+                break
+    return " ".join(words)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser=argparse.ArgumentParser(description="Summarize a call cassette recorded by the test harness")
+    parser.add_argument("path", type=str, help="Cassette file")
+    parser.add_argument("--dump", action="store_true", help="Print every request key")
+    args=parser.parse_args()
+
+    summary={}
+    with Cassette(args.path, ReplayMode) as cas:
+        for key, failed, answer, elapsed in cas.records():
+            if args.dump:
+                print("%s%.3f %s" % ("FAILED " if failed else "", elapsed, key[:200].replace("\n", "\\n")))
+            count, failures, total=summary.get(getOperation(key), (0, 0, 0.0))
+            summary[getOperation(key)]=(count + 1, failures + (1 if failed else 0), total + elapsed)
+    for operation, (count, failures, total) in sorted(summary.items(), key=lambda item: -item[1][2]):
+        print("%-48s %6d calls %4d failed %9.3f s" % (operation, count, failures, total))
@@ -101,6 +101,7 @@ try:
     if not cluster.spreadFundsAndValidate(10):
         errorExit("Failed to spread and validate funds.")
 
+    cluster.reportInfoCacheStats()
     testSuccessful=True
     print("Funds spread validated")
 finally:
@@ -0,0 +1,479 @@
+"""In-process secp256k1 key handling in EOS formats: WIF private keys, "EOS..." public keys and
+compact signatures.
+
+Pure Python, no dependencies beyond the standard library. Replaces forking "cleos create key" per key
+and walletd sign_transaction round trips.
+KeyPool keeps deterministic pre-generated keys in a memory mapped file so test runs can reuse them.
+"""
+
+import fcntl
+import hashlib
+import hmac
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+
+###########################################################################################
+# secp256k1 curve parameters
+P=0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N=0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G=(0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+   0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+PublicKeyPrefix="EOS"
+WifVersion=0x80
+
+###########################################################################################
+# Point arithmetic in jacobian coordinates (X, Y, Z), affine x=X/Z^2, y=Y/Z^3. None is infinity.
+
+def _inverse(a, m=P):
+    return pow(a, m-2, m)
+
+def _toJacobian(point):
+    return (point[0], point[1], 1)
+
+def _fromJacobian(point):
+    if point is None:
+        return None
+    x, y, z=point
+    zInv=_inverse(z)
+    zInv2=zInv*zInv % P
+    return (x*zInv2 % P, y*zInv2*zInv % P)
+
+def _double(point):
+    if point is None:
+        return None
+    x, y, z=point
+    if y == 0:
+        return None
+    ySq=y*y % P
+    s=4*x*ySq % P
+    m=3*x*x % P
+    nx=(m*m - 2*s) % P
+    ny=(m*(s - nx) - 8*ySq*ySq) % P
+    nz=2*y*z % P
+    return (nx, ny, nz)
+
+def _add(p1, p2):
+    if p1 is None:
+        return p2
+    if p2 is None:
+        return p1
+    x1, y1, z1=p1
+    x2, y2, z2=p2
+    z1Sq=z1*z1 % P
+    z2Sq=z2*z2 % P
+    u1=x1*z2Sq % P
+    u2=x2*z1Sq % P
+    s1=y1*z2Sq*z2 % P
+    s2=y2*z1Sq*z1 % P
+    if u1 == u2:
+        if s1 != s2:
+            return None
+        return _double(p1)
+    h=u2-u1
+    r=s2-s1
+    hSq=h*h % P
+    hCu=hSq*h % P
+    u1HSq=u1*hSq % P
+    nx=(r*r - hCu - 2*u1HSq) % P
+    ny=(r*(u1HSq - nx) - s1*hCu) % P
+    nz=h*z1*z2 % P
+    return (nx, ny, nz)
+
+# Precomputed G*2^i, makes k*G a series of additions
+_gPowers=[]
+def _getGPowers():
+    if len(_gPowers) == 0:
+        point=_toJacobian(G)
+        for i in range(256):
+            _gPowers.append(point)
+            point=_double(point)
+    return _gPowers
+
+def pointMultiply(k, point=None):
+    """k*point (affine), point defaults to the generator."""
+    result=None
+    if point is None:
+        for i, power in enumerate(_getGPowers()):
+            if (k >> i) & 1:
+                result=_add(result, power)
+        return _fromJacobian(result)
+
+    addend=_toJacobian(point)
+    while k > 0:
+        if k & 1:
+            result=_add(result, addend)
+        addend=_double(addend)
+        k >>= 1
+    return _fromJacobian(result)
+
+def pointAdd(p1, p2):
+    """Sum of two affine points."""
+    return _fromJacobian(_add(_toJacobian(p1) if p1 is not None else None, _toJacobian(p2) if p2 is not None else None))
+
+###########################################################################################
+# Encodings
+
+_base58Alphabet="123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_base58Index={c: i for i, c in enumerate(_base58Alphabet)}
+
+def base58Encode(data):
+    num=int.from_bytes(data, "big")
+    chars=[]
+    while num > 0:
+        num, rem=divmod(num, 58)
+        chars.append(_base58Alphabet[rem])
+    pad=len(data) - len(data.lstrip(b"\0"))
+    return "1"*pad + "".join(reversed(chars))
+
+def base58Decode(s):
+    num=0
+    for c in s:
+        if c not in _base58Index:
+            raise ValueError("Invalid base58 character: %s" % (c))
+        num=num*58 + _base58Index[c]
+    pad=len(s) - len(s.lstrip("1"))
+    body=num.to_bytes((num.bit_length()+7)//8, "big") if num > 0 else b""
+    return b"\0"*pad + body
+
+def sha256(data):
+    return hashlib.sha256(data).digest()
+
+def ripemd160(data):
+    try:
+        h=hashlib.new("ripemd160")
+    except ValueError:
+        return _ripemd160(data)
+    h.update(data)
+    return h.digest()
+
+# Pure python ripemd160, for OpenSSL builds without the legacy digest
+def _ripemd160(data):
+    rl=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15, 7,4,13,1,10,6,15,3,12,0,9,5,2,14,11,8,
+        3,10,14,4,9,15,8,1,2,7,0,6,13,11,5,12, 1,9,11,10,0,8,12,4,13,3,7,15,14,5,6,2,
+        4,0,5,9,7,12,2,10,14,1,3,8,11,6,15,13]
+    rr=[5,14,7,0,9,2,11,4,13,6,15,8,1,10,3,12, 6,11,3,7,0,13,5,10,14,15,8,12,4,9,1,2,
+        15,5,1,3,7,14,6,9,11,8,12,2,10,0,4,13, 8,6,4,1,3,11,15,0,5,12,2,13,9,7,10,14,
+        12,15,10,4,1,5,8,7,6,2,13,14,0,3,9,11]
+    sl=[11,14,15,12,5,8,7,9,11,13,14,15,6,7,9,8, 7,6,8,13,11,9,7,15,7,12,15,9,11,7,13,12,
+        11,13,6,7,14,9,13,15,14,8,13,6,5,12,7,5, 11,12,14,15,14,15,9,8,9,14,5,6,8,6,5,12,
+        9,15,5,11,6,8,13,12,5,12,13,14,11,8,5,6]
+    sr=[8,9,9,11,13,15,15,5,7,7,8,11,14,14,12,6, 9,13,15,7,12,8,9,11,7,7,12,7,6,15,13,11,
+        9,7,15,11,8,6,6,14,12,13,5,14,13,13,7,5, 15,5,8,11,14,14,6,14,6,9,12,9,12,5,15,8,
+        8,5,12,9,12,5,14,6,8,13,6,5,15,13,11,11]
+    kl=[0x00000000, 0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xA953FD4E]
+    kr=[0x50A28BE6, 0x5C4DD124, 0x6D703EF3, 0x7A6D76E9, 0x00000000]
+    fs=[lambda x, y, z: x ^ y ^ z,
+        lambda x, y, z: (x & y) | (~x & z),
+        lambda x, y, z: (x | ~y) ^ z,
+        lambda x, y, z: (x & z) | (y & ~z),
+        lambda x, y, z: x ^ (y | ~z)]
+    rol=lambda x, n: ((x << n) | (x >> (32-n))) & 0xFFFFFFFF
+
+    msg=data + b"\x80" + b"\0"*((55 - len(data)) % 64) + (len(data)*8).to_bytes(8, "little")
+    h=[0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+    for off in range(0, len(msg), 64):
+        x=[int.from_bytes(msg[off+4*i:off+4*i+4], "little") for i in range(16)]
+        al, bl, cl, dl, el=h
+        ar, br, cr, dr, er=h
+        for j in range(80):
+            rnd=j//16
+            t=rol((al + (fs[rnd](bl, cl, dl) & 0xFFFFFFFF) + x[rl[j]] + kl[rnd]) & 0xFFFFFFFF, sl[j]) + el
+            al, el, dl, cl, bl=el, dl, rol(cl, 10), bl, t & 0xFFFFFFFF
+            t=rol((ar + (fs[4-rnd](br, cr, dr) & 0xFFFFFFFF) + x[rr[j]] + kr[rnd]) & 0xFFFFFFFF, sr[j]) + er
+            ar, er, dr, cr, br=er, dr, rol(cr, 10), br, t & 0xFFFFFFFF
+        t=(h[1] + cl + dr) & 0xFFFFFFFF
+        h[1]=(h[2] + dl + er) & 0xFFFFFFFF
+        h[2]=(h[3] + el + ar) & 0xFFFFFFFF
+        h[3]=(h[4] + al + br) & 0xFFFFFFFF
+        h[4]=(h[0] + bl + cr) & 0xFFFFFFFF
+        h[0]=t
+    return b"".join(v.to_bytes(4, "little") for v in h)
+
+###########################################################################################
+# Keys
+
+def generatePrivateKey(randomBytes=os.urandom):
+    """Returns new 32 byte private key secret. randomBytes(n) supplies entropy."""
+    while True:
+        secret=randomBytes(32)
+        k=int.from_bytes(secret, "big")
+        if 0 < k < N:
+            return secret
+
+def privateKeyToWif(secret):
+    data=bytes([WifVersion]) + secret
+    return base58Encode(data + sha256(sha256(data))[:4])
+
+def wifToPrivateKey(wif):
+    """Returns 32 byte private key secret. Raises ValueError on malformed key."""
+    data=base58Decode(wif)
+    if len(data) != 37 or data[0] != WifVersion:
+        raise ValueError("Invalid WIF private key: %s" % (wif))
+    body, check=data[:-4], data[-4:]
+    if check != sha256(sha256(body))[:4] and check != sha256(body)[:4]:
+        raise ValueError("Invalid WIF private key checksum: %s" % (wif))
+    return body[1:]
+
+def publicKeyFromPrivateKey(secret):
+    """Returns 33 byte compressed public key."""
+    x, y=pointMultiply(int.from_bytes(secret, "big"))
+    return bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+
+def publicKeyToString(publicKey):
+    return PublicKeyPrefix + base58Encode(publicKey + ripemd160(publicKey)[:4])
+
+def publicKeyFromString(s):
+    """Returns 33 byte compressed public key. Raises ValueError on malformed key."""
+    if not s.startswith(PublicKeyPrefix):
+        raise ValueError("Public key has invalid prefix: %s" % (s))
+    data=base58Decode(s[len(PublicKeyPrefix):])
+    if len(data) != 37 or ripemd160(data[:33])[:4] != data[33:]:
+        raise ValueError("Invalid public key: %s" % (s))
+    return data[:33]
+
+def wifToPublicKey(wif):
+    """Public key string for WIF private key."""
+    return publicKeyToString(publicKeyFromPrivateKey(wifToPrivateKey(wif)))
+
+def createKey(randomBytes=os.urandom):
+    """Returns (WIF private key, public key string), like "cleos create key"."""
+    secret=generatePrivateKey(randomBytes)
+    return (privateKeyToWif(secret), publicKeyToString(publicKeyFromPrivateKey(secret)))
+
+def _createKeys(count):
+    return [createKey() for _ in range(count)]
+
+def createKeys(count, processes=None, minPerProcess=64):
+    """Returns list of count (WIF private key, public key string) pairs, generated across a process pool
+    of up to processes (default cpu count) workers."""
+    processes=processes or multiprocessing.cpu_count()
+    processes=min(processes, max(1, count // minPerProcess))
+    if processes <= 1:
+        return _createKeys(count)
+
+    chunks=[count // processes + (1 if i < count % processes else 0) for i in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        results=pool.map(_createKeys, chunks)
+    return [key for chunk in results for key in chunk]
+
+def deriveKey(seedDigest, slot):
+    """Returns deterministic 32 byte private key secret for slot of the seed."""
+    counter=0
+    while True:
+        secret=sha256(seedDigest + struct.pack("<QI", slot, counter))
+        if 0 < int.from_bytes(secret, "big") < N:
+            return secret
+        counter += 1
+
+def _deriveKeyRecords(args):
+    seedDigest, start, count=args
+    records=[]
+    for slot in range(start, start+count):
+        secret=deriveKey(seedDigest, slot)
+        records.append(secret + publicKeyFromPrivateKey(secret))
+    return b"".join(records)
+
+def deriveKeyRecords(seedDigest, start, count, processes=None, minPerProcess=64):
+    """Returns packed KeyPool records (secret + compressed public key) for slots [start, start+count)."""
+    processes=processes or multiprocessing.cpu_count()
+    processes=min(processes, max(1, count // minPerProcess))
+    if processes <= 1:
+        return _deriveKeyRecords((seedDigest, start, count))
+
+    chunks=[]
+    for i in range(processes):
+        chunkCount=count // processes + (1 if i < count % processes else 0)
+        chunks.append((seedDigest, start, chunkCount))
+        start += chunkCount
+    with multiprocessing.Pool(processes) as pool:
+        return b"".join(pool.map(_deriveKeyRecords, chunks))
+
+###########################################################################################
+# Signatures
+
+SignaturePrefix="EOS"
+
+def _rfc6979Nonce(secret, digest, extraEntropy=b""):
+    """Deterministic nonce per RFC 6979 (HMAC-SHA256), extraEntropy mixed in as in section 3.6."""
+    h1=(int.from_bytes(digest, "big") % N).to_bytes(32, "big")
+    v=b"\x01"*32
+    k=b"\x00"*32
+    k=hmac.new(k, v + b"\x00" + secret + h1 + extraEntropy, hashlib.sha256).digest()
+    v=hmac.new(k, v, hashlib.sha256).digest()
+    k=hmac.new(k, v + b"\x01" + secret + h1 + extraEntropy, hashlib.sha256).digest()
+    v=hmac.new(k, v, hashlib.sha256).digest()
+    while True:
+        v=hmac.new(k, v, hashlib.sha256).digest()
+        nonce=int.from_bytes(v, "big")
+        if 0 < nonce < N:
+            return nonce
+        k=hmac.new(k, v + b"\x00", hashlib.sha256).digest()
+        v=hmac.new(k, v, hashlib.sha256).digest()
+
+def isCanonicalSignature(sig):
+    """Canonical compact signature as required by the chain: r and s use all 32 bytes without a high bit."""
+    return (not (sig[1] & 0x80) and not (sig[1] == 0 and not (sig[2] & 0x80)) and
+            not (sig[33] & 0x80) and not (sig[33] == 0 and not (sig[34] & 0x80)))
+
+def signDigest(secret, digest):
+    """Returns 65 byte canonical compact signature (recovery header, r, s) of 32 byte digest.
+    Like fc, retries with a counter as extra nonce entropy until the signature is canonical."""
+    d=int.from_bytes(secret, "big")
+    z=int.from_bytes(digest, "big")
+    counter=0
+    while True:
+        extraEntropy=counter.to_bytes(32, "little") if counter > 0 else b""
+        counter += 1
+        k=_rfc6979Nonce(secret, digest, extraEntropy)
+        x, y=pointMultiply(k)
+        r=x % N
+        if r == 0:
+            continue
+        s=_inverse(k, N)*(z + r*d) % N
+        if s == 0:
+            continue
+        recId=(y & 1) | (2 if x >= N else 0)
+        if s > N//2:
+            s=N-s
+            recId ^= 1
+        sig=bytes([27 + 4 + recId]) + r.to_bytes(32, "big") + s.to_bytes(32, "big")
+        if isCanonicalSignature(sig):
+            return sig
+
+def recoverPublicKey(digest, sig):
+    """Returns 33 byte compressed public key that produced compact signature sig over digest."""
+    recId=(sig[0] - 27) & 3
+    r=int.from_bytes(sig[1:33], "big")
+    s=int.from_bytes(sig[33:65], "big")
+    x=r + (N if recId & 2 else 0)
+    y=pow((pow(x, 3, P) + 7) % P, (P+1)//4, P)
+    if (y & 1) != (recId & 1):
+        y=P-y
+    z=int.from_bytes(digest, "big")
+    rInv=_inverse(r, N)
+    point=pointAdd(pointMultiply(s*rInv % N, (x, y)), pointMultiply((-z*rInv) % N))
+    return bytes([2 + (point[1] & 1)]) + point[0].to_bytes(32, "big")
+
+def signatureToString(sig):
+    return SignaturePrefix + base58Encode(sig + ripemd160(sig)[:4])
+
+def signatureFromString(s):
+    """Returns 65 byte compact signature. Raises ValueError on malformed signature."""
+    if not s.startswith(SignaturePrefix):
+        raise ValueError("Signature has invalid prefix: %s" % (s))
+    data=base58Decode(s[len(SignaturePrefix):])
+    if len(data) != 69 or ripemd160(data[:65])[:4] != data[65:]:
+        raise ValueError("Invalid signature: %s" % (s))
+    return data[:65]
+
+###########################################################################################
+class KeyPool(object):
+    """File of pre-generated key pairs. Key in slot i is derived from (seed, i), so a seed always yields the
+    same keys in the same order. Layout: header (magic, sha256 of seed, record count) followed by fixed size
+    records (32 byte secret, 33 byte compressed public key) indexed by slot. The file is memory mapped for
+    reads and grown under an exclusive file lock, so processes can share it.
+
+    lease(count) hands out the next count slots of this KeyPool object; a background thread keeps
+    reserve generated keys ahead of the lease cursor."""
+
+    Magic=b"EOSKEYP1"
+    HeaderFormat="<8s32sQ"
+    HeaderSize=struct.calcsize(HeaderFormat)
+    RecordSize=32+33
+
+    def __init__(self, path, seed, reserve=1024, processes=None):
+        self.path=path
+        self.seedDigest=sha256(seed.encode("utf-8"))
+        self.reserve=reserve
+        self.processes=processes
+        self.__lock=threading.Lock()
+        self.__extendLock=threading.Lock()
+        self.__cursor=0
+        self.__refillThread=None
+        self.__mmap=None
+
+        dirName=os.path.dirname(path)
+        if dirName:
+            os.makedirs(dirName, exist_ok=True)
+        self.__fd=os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.__fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self.__fd).st_size < KeyPool.HeaderSize:
+                os.ftruncate(self.__fd, 0)
+                os.pwrite(self.__fd, struct.pack(KeyPool.HeaderFormat, KeyPool.Magic, self.seedDigest, 0), 0)
+            magic, seedDigest, count=self.__readHeader()
+            if magic != KeyPool.Magic or seedDigest != self.seedDigest:
+                raise ValueError("Key pool %s has bad magic or was created with a different seed" % (path))
+        finally:
+            fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+    def __readHeader(self):
+        return struct.unpack(KeyPool.HeaderFormat, os.pread(self.__fd, KeyPool.HeaderSize, 0))
+
+    # Number of generated keys in the file
+    def size(self):
+        return self.__readHeader()[2]
+
+    # Grow file to at least count keys
+    def __extend(self, count):
+        with self.__extendLock:
+            fcntl.flock(self.__fd, fcntl.LOCK_EX)
+            try:
+                current=self.size()
+                if current >= count:
+                    return
+                records=deriveKeyRecords(self.seedDigest, current, count-current, self.processes)
+                os.pwrite(self.__fd, records, KeyPool.HeaderSize + current*KeyPool.RecordSize)
+                os.pwrite(self.__fd, struct.pack(KeyPool.HeaderFormat, KeyPool.Magic, self.seedDigest, count), 0)
+            finally:
+                fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+    def __getRecord(self, slot):
+        end=KeyPool.HeaderSize + (slot+1)*KeyPool.RecordSize
+        with self.__lock:
+            if self.__mmap is None or len(self.__mmap) < end:
+                if self.__mmap is not None:
+                    self.__mmap.close()
+                self.__mmap=mmap.mmap(self.__fd, os.fstat(self.__fd).st_size, access=mmap.ACCESS_READ)
+            return self.__mmap[end-KeyPool.RecordSize:end]
+
+    # Returns (WIF private key, public key string) in slot, generating it if needed
+    def getKey(self, slot):
+        if slot >= self.size():
+            self.__extend(slot+1)
+        record=self.__getRecord(slot)
+        return (privateKeyToWif(record[:32]), publicKeyToString(record[32:]))
+
+    # Returns next count (WIF private key, public key string) pairs
+    def lease(self, count):
+        with self.__lock:
+            start=self.__cursor
+            self.__cursor += count
+        self.__extend(start+count)
+        keys=[self.getKey(slot) for slot in range(start, start+count)]
+        self.__startRefill()
+        return keys
+
+    def __startRefill(self):
+        with self.__lock:
+            if self.__refillThread is not None and self.__refillThread.is_alive():
+                return
+            target=self.__cursor+self.reserve
+            self.__refillThread=threading.Thread(target=self.__extend, args=(target,), name="key-pool-refill")
+            self.__refillThread.daemon=True
+            self.__refillThread.start()
+
+    def close(self):
+        with self.__lock:
+            thread=self.__refillThread
+        if thread is not None:
+            thread.join()
+        with self.__lock:
+            if self.__mmap is not None:
+                self.__mmap.close()
+                self.__mmap=None
+        os.close(self.__fd)
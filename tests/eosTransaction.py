@@ -0,0 +1,181 @@
+"""Offline transaction construction and signing.
+
+Builds packed transactions in process: reference block and expiration from the node's cached get info,
+action data from abiCodec, signatures from eosKeys and the transaction id from the packed bytes.
+The result goes straight to push_transaction, without cleos or walletd sign_transaction in between.
+"""
+
+import datetime
+import struct
+import threading
+import time
+
+import abiCodec
+import eosKeys
+
+# cleos signs with an all zero chain id
+ZeroChainId=b"\0"*32
+DefaultExpirationSeconds=30
+SystemAccount="eosio"
+ActivePermission="active"
+CoreSymbol="4,EOS"
+
+_headerLayout=struct.Struct("<IHHIHH")
+
+###########################################################################################
+# Packing, mirrors eosio::chain::transaction raw serialization
+
+def packAction(account, name, authorization, data, buf):
+    """Appends raw action to bytearray buf. authorization is a list of (actor, permission)."""
+    buf += struct.pack("<QQ", abiCodec.nameToInt(account), abiCodec.nameToInt(name))
+    abiCodec.packVarUint32(len(authorization), buf)
+    for actor, permission in authorization:
+        buf += struct.pack("<QQ", abiCodec.nameToInt(actor), abiCodec.nameToInt(permission))
+    abiCodec.packVarUint32(len(data), buf)
+    buf += data
+
+def packTransaction(expiration, refBlockNum, refBlockPrefix, actions, contextFreeActions=None, region=0):
+    """Returns raw transaction bytes. actions/contextFreeActions are lists of
+    (account, name, authorization, data bytes) tuples."""
+    contextFreeActions=contextFreeActions or []
+    buf=bytearray(_headerLayout.pack(expiration, region, refBlockNum & 0xffff, refBlockPrefix, 0, 0))
+    for actionList in (contextFreeActions, actions):
+        abiCodec.packVarUint32(len(actionList), buf)
+        for action in actionList:
+            packAction(*action, buf=buf)
+    return bytes(buf)
+
+def unpackTransaction(packedTrx):
+    """Returns raw transaction bytes as the chain's json form of a transaction, action data as hex."""
+    (expiration, region, refBlockNum, refBlockPrefix, bandwidthWords, contextFreeCpu)=_headerLayout.unpack_from(packedTrx, 0)
+    pos=_headerLayout.size
+    trx={"expiration": abiCodec.intToTime(expiration), "region": region, "ref_block_num": refBlockNum,
+         "ref_block_prefix": refBlockPrefix, "packed_bandwidth_words": bandwidthWords,
+         "context_free_cpu_bandwidth": contextFreeCpu}
+    for key in ("context_free_actions", "actions"):
+        count, pos=abiCodec.unpackVarUint32(packedTrx, pos)
+        actions=[]
+        for _ in range(count):
+            account, name=struct.unpack_from("<QQ", packedTrx, pos)
+            pos += 16
+            authCount, pos=abiCodec.unpackVarUint32(packedTrx, pos)
+            authorization=[]
+            for _ in range(authCount):
+                actor, permission=struct.unpack_from("<QQ", packedTrx, pos)
+                pos += 16
+                authorization.append({"actor": abiCodec.intToName(actor), "permission": abiCodec.intToName(permission)})
+            size, pos=abiCodec.unpackVarUint32(packedTrx, pos)
+            actions.append({"account": abiCodec.intToName(account), "name": abiCodec.intToName(name),
+                            "authorization": authorization, "data": packedTrx[pos:pos+size].hex()})
+            pos += size
+        trx[key]=actions
+    if pos != len(packedTrx):
+        raise ValueError("Unpacked %d of %d transaction bytes" % (pos, len(packedTrx)))
+    return trx
+
+def getTransactionId(packedTrx):
+    return eosKeys.sha256(packedTrx).hex()
+
+def getSigDigest(packedTrx, chainId=ZeroChainId):
+    return eosKeys.sha256(chainId + packedTrx)
+
+# Returns (ref_block_num, ref_block_prefix) for hex block id, see transaction_header::set_reference_block
+def getRefBlock(blockId):
+    raw=bytes.fromhex(blockId)
+    return (int.from_bytes(raw[0:4], "big") & 0xffff, int.from_bytes(raw[8:12], "little"))
+
+def parseTime(timeStr):
+    fmt="%Y-%m-%dT%H:%M:%S.%f" if "." in timeStr else "%Y-%m-%dT%H:%M:%S"
+    epoch=datetime.datetime(1970, 1, 1)
+    return int((datetime.datetime.strptime(timeStr, fmt)-epoch).total_seconds())
+
+def signTransaction(packedTrx, secrets, chainId=ZeroChainId):
+    """Returns list of signature strings, one per 32 byte private key secret."""
+    digest=getSigDigest(packedTrx, chainId)
+    return [eosKeys.signatureToString(eosKeys.signDigest(secret, digest)) for secret in secrets]
+
+# Packed transaction json object as push_transaction takes it
+def toPushJson(packedTrx, signatures):
+    return {"signatures": signatures, "compression": "none", "data": packedTrx.hex()}
+
+###########################################################################################
+class TransactionBuilder(object):
+    """Builds and signs transactions for a node without cleos or walletd.
+
+    Contract abis come from get_code on the node unless set with setCodec, and are compiled once per account.
+    Keys are WIF private key strings, such as Account.activePrivateKey; decoded secrets are cached."""
+
+    def __init__(self, node, chainId=ZeroChainId, expirationSeconds=DefaultExpirationSeconds):
+        self.node=node
+        self.chainId=chainId
+        self.expirationSeconds=expirationSeconds
+        self.__codecs={}
+        self.__secrets={}
+        self.__lock=threading.Lock()
+
+    def setCodec(self, account, codec):
+        with self.__lock:
+            self.__codecs[account]=codec
+
+    # Returns AbiCodec for contract account, fetching its abi from the node on first use. None on failure.
+    def getCodec(self, account):
+        with self.__lock:
+            codec=self.__codecs.get(account)
+        if codec is not None:
+            return codec
+        abi=self.node.getAccountAbi(account)
+        if abi is None:
+            return None
+        codec=abiCodec.AbiCodec(abi)
+        with self.__lock:
+            return self.__codecs.setdefault(account, codec)
+
+    def getSecret(self, wif):
+        secret=self.__secrets.get(wif)
+        if secret is None:
+            secret=eosKeys.wifToPrivateKey(wif)
+            self.__secrets[wif]=secret
+        return secret
+
+    # Returns (expiration, ref_block_num, ref_block_prefix) from head block in (cached) get info. None on failure.
+    def getReference(self):
+        info=self.node.getInfo()
+        if info is None:
+            return None
+        refBlockNum, refBlockPrefix=getRefBlock(info["head_block_id"])
+        return (parseTime(info["head_block_time"]) + self.expirationSeconds, refBlockNum, refBlockPrefix)
+
+    # Returns action tuple with args packed via the contract abi.
+    #  authorization: list of (actor, permission)
+    def createAction(self, account, name, args, authorization):
+        codec=self.getCodec(account)
+        if codec is None:
+            raise abiCodec.AbiError("No abi for account %s" % (account))
+        return (account, name, authorization, codec.packAction(name, args))
+
+    # amount is in core token units, as for "cleos transfer"
+    def createTransferAction(self, source, destination, amount, memo="memo"):
+        args={"from": source.name, "to": destination.name,
+              "quantity": abiCodec.intsToAsset(amount, abiCodec.symbolToInt(CoreSymbol)), "memo": memo}
+        return self.createAction(SystemAccount, "transfer", args, [(source.name, ActivePermission)])
+
+    # Context free action making otherwise identical transactions unique, like "cleos -f"
+    def createNonceAction(self):
+        return self.createAction(SystemAccount, "nonce", {"value": str(int(time.time()*1000000))}, [])
+
+    # Returns (transaction id, packed transaction json object) signed with WIF keys.
+    #  reference: (expiration, ref_block_num, ref_block_prefix), defaults to getReference()
+    def build(self, actions, keys, contextFreeActions=None, reference=None):
+        reference=reference or self.getReference()
+        if reference is None:
+            return None
+        packedTrx=packTransaction(reference[0], reference[1], reference[2], actions, contextFreeActions)
+        signatures=signTransaction(packedTrx, [self.getSecret(key) for key in keys], self.chainId)
+        return (getTransactionId(packedTrx), toPushJson(packedTrx, signatures))
+
+    # Build, sign and push. Returns push_transaction result json object, None on failure.
+    def push(self, actions, keys, contextFreeActions=None, silentErrors=False):
+        built=self.build(actions, keys, contextFreeActions)
+        if built is None:
+            return None
+        return self.node.pushTransaction(built[1], silentErrors=silentErrors)
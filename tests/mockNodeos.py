@@ -0,0 +1,889 @@
+"""In-process stand-in for nodeos and walletd, for running the harness without chain binaries.
+
+MockChain keeps accounts, core token balances, abis, blocks and transaction history in memory and produces
+blocks on a virtual clock. MockNodeos serves a chain (and optionally a MockWallet) over HTTP with the
+chain_api, account_history_api, wallet_api and net_api paths, with injected latency and failures. Several
+servers can share one chain to stand in for a cluster; their nodes are plain testUtils.Node objects on the
+http transport:
+
+    chain=MockChain(blockInterval=0.5, speed=10.0)
+    servers=startMockNodes(3, chain)
+    cluster=testUtils.Cluster(localCluster=False, transport=testUtils.Utils.TransportHttpTag)
+    cluster.setNodes([server.getNode() for server in servers])
+
+Pushed transactions are checked for duplicates, expiration and reference block, applied right away (eosio
+newaccount, transfer and issue change state, other actions are accepted as they are) and included in the
+following blocks, at most maxBlockTransactions per block. Signatures are only verified with verifySignatures.
+"""
+
+import collections
+import http.server
+import json
+import random
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+import abiCodec
+import eosKeys
+import eosTransaction
+import testUtils
+
+# Key of the eosio account in the test genesis files
+DefaultPrivateKey="5KQwrPbwdL6PhXujxW37FSSQZ1JiwsST4cqQzDeyXtP79zkvFD3"
+DefaultPublicKey="EOS6MRyAjQq8ud7hVNYcfnVPJqcVpscN5So8BhtHuGYqET5GDW5CV"
+CoreSymbol=abiCodec.symbolToInt(eosTransaction.CoreSymbol)
+InitialSupply=10000000000000
+ZeroId="0"*64
+
+# fc exception name -> (code, what), as declared in chain/exceptions.hpp
+_Exceptions={
+    "assert_exception":                  (10, "Assert Exception"),
+    "parse_error_exception":             (4, "Parse Error"),
+    "tx_missing_sigs":                   (3030002, "signatures do not satisfy declared authorizations"),
+    "checktime_exceeded":                (3030010, "allotted processing time was exceeded"),
+    "tx_duplicate":                      (3030011, "duplicate transaction"),
+    "unknown_transaction_exception":     (3030012, "unknown transaction"),
+    "tx_resource_exhausted":             (3030015, "transaction exhausted allowed resources"),
+    "tx_decompression_error":            (3030021, "Error decompressing transaction"),
+    "expired_tx_exception":              (3030022, "Expired Transaction"),
+    "tx_exp_too_far_exception":          (3030023, "Transaction Expiration Too Far"),
+    "invalid_ref_block_exception":       (3030024, "Invalid Reference Block"),
+    "account_name_exists_exception":     (3040001, "account name already exists"),
+    "unknown_block_exception":           (3110000, "unknown block"),
+    "abi_type_exception":                (3120007, "Invalid ABI"),
+    "packed_transaction_type_exception": (3120010, "Invalid packed transaction"),
+    "wallet_exist_exception":            (3140001, "Wallet already exists"),
+    "wallet_nonexistent_exception":      (3140002, "Nonexistent wallet"),
+    "wallet_locked_exception":           (3140003, "Locked wallet"),
+    "wallet_missing_pub_key_exception":  (3140004, "Missing public key"),
+    "wallet_invalid_password_exception": (3140005, "Invalid wallet password"),
+}
+
+_StatusMessages={400: "Bad Request", 401: "UnAuthorized", 404: "Not Found", 409: "Conflict", 500: "Internal Service Error"}
+
+# Native eosio actions the mock applies, see chain_initializer.cpp, plus the eosio.system token actions
+_CoreAbi={
+    "types": [{"new_type_name": "weight_type", "type": "uint16"}],
+    "structs": [
+        {"name": "permission_level", "base": "", "fields": [
+            {"name": "actor", "type": "account_name"}, {"name": "permission", "type": "permission_name"}]},
+        {"name": "key_weight", "base": "", "fields": [
+            {"name": "key", "type": "public_key"}, {"name": "weight", "type": "weight_type"}]},
+        {"name": "permission_level_weight", "base": "", "fields": [
+            {"name": "permission", "type": "permission_level"}, {"name": "weight", "type": "weight_type"}]},
+        {"name": "authority", "base": "", "fields": [
+            {"name": "threshold", "type": "uint32"}, {"name": "keys", "type": "key_weight[]"},
+            {"name": "accounts", "type": "permission_level_weight[]"}]},
+        {"name": "newaccount", "base": "", "fields": [
+            {"name": "creator", "type": "account_name"}, {"name": "name", "type": "account_name"},
+            {"name": "owner", "type": "authority"}, {"name": "active", "type": "authority"},
+            {"name": "recovery", "type": "authority"}]},
+        {"name": "nonce", "base": "", "fields": [{"name": "value", "type": "string"}]},
+        {"name": "transfer", "base": "", "fields": [
+            {"name": "from", "type": "account_name"}, {"name": "to", "type": "account_name"},
+            {"name": "quantity", "type": "asset"}, {"name": "memo", "type": "string"}]},
+        {"name": "issue", "base": "", "fields": [
+            {"name": "to", "type": "account_name"}, {"name": "quantity", "type": "asset"}]},
+    ],
+    "actions": [{"name": "newaccount", "type": "newaccount"}, {"name": "nonce", "type": "nonce"},
+                {"name": "transfer", "type": "transfer"}, {"name": "issue", "type": "issue"}],
+    "tables": [],
+}
+
+###########################################################################################
+class ChainError(Exception):
+    """fc exception raised by a mock api call, reported the way http_plugin reports it."""
+
+    def __init__(self, name, message=""):
+        self.name=name
+        self.code, self.what=_Exceptions[name]
+        self.message=message or self.what
+        super().__init__("%d %s: %s" % (self.code, self.name, self.message))
+
+    # Http status chain_api_plugin answers with; other api plugins answer 500
+    def getChainStatus(self):
+        if self.name == "tx_missing_sigs":
+            return 401
+        if self.name == "tx_duplicate":
+            return 409
+        if 3030000 <= self.code < 3040000:
+            return 400
+        return 500
+
+    # fc::exception::to_detail_string, as push_transactions reports per transaction errors
+    def toDetailString(self):
+        return "%d %s: %s\n%s" % (self.code, self.name, self.what, self.message)
+
+    def toResults(self, status):
+        return {"code": status, "message": _StatusMessages.get(status, "Error"),
+                "error": {"code": self.code, "name": self.name, "what": self.what,
+                          "details": [{"message": self.message, "file": "mockNodeos.py", "line_number": 0, "method": ""}]}}
+
+def _formatTime(seconds, millis=False):
+    text=abiCodec.intToTime(int(seconds))
+    if millis:
+        text += ".%03d" % (int(round((seconds - int(seconds))*1000)) % 1000)
+    return text
+
+###########################################################################################
+class MockChain(object):
+    """Chain state shared by the MockNodeos servers of a mock cluster. Thread safe.
+
+    Block time is virtual: each block advances it by blockInterval seconds. With start(), blocks are produced
+    every blockInterval/speed real seconds, so speed=10.0 runs the chain ten times faster than nodeos would;
+    with speed=None blocks are only produced by produceBlocks(). Blocks irreversibleBlocks behind head are
+    irreversible. maxBlockTransactions caps transactions per block, the rest wait for later blocks."""
+
+    def __init__(self, blockInterval=0.5, speed=1.0, irreversibleBlocks=2, maxBlockTransactions=None,
+                 genesisTime=None, eosioPublicKey=DefaultPublicKey, systemAbi=None, verifySignatures=False,
+                 chainId=eosTransaction.ZeroChainId, maxExpirationSeconds=3600, producer="eosio"):
+        self.blockInterval=blockInterval
+        self.speed=speed
+        self.irreversibleBlocks=irreversibleBlocks
+        self.maxBlockTransactions=maxBlockTransactions
+        self.verifySignatures=verifySignatures
+        self.chainId=chainId
+        self.maxExpirationSeconds=maxExpirationSeconds
+        self.producer=producer
+        self.__lock=threading.Lock()
+        self.__accounts={}
+        self.__balances={}
+        self.__supply=0
+        self.__abis={}
+        self.__codecs={}
+        self.__tables={}
+        self.__blocks=[]
+        self.__blockNums={}
+        self.__pending=collections.deque()
+        self.__transactions={}
+        self.__history={}
+        self.__handlers={("eosio", "newaccount"): self.__applyNewAccount, ("eosio", "transfer"): self.__applyTransfer,
+                         ("eosio", "issue"): self.__applyIssue}
+        self.__stopEvent=threading.Event()
+        self.__thread=None
+        self.pushed=0
+        self.rejected=0
+        self.included=0
+
+        abi=json.loads(json.dumps(_CoreAbi))
+        if systemAbi is not None:
+            # contract structs and actions take precedence over the built-in ones
+            names=set(st["name"] for st in systemAbi.get("structs", []))
+            abi["structs"]=[st for st in abi["structs"] if st["name"] not in names] + systemAbi.get("structs", [])
+            actions=set(a["name"] for a in systemAbi.get("actions", []))
+            abi["actions"]=[a for a in abi["actions"] if a["name"] not in actions] + systemAbi.get("actions", [])
+            abi["types"]=abi["types"] + systemAbi.get("types", [])
+            abi["tables"]=systemAbi.get("tables", [])
+        self.setAbi(eosTransaction.SystemAccount, abi)
+
+        if genesisTime is None:
+            genesisTime=int(time.time()/blockInterval)*blockInterval
+        self.__headTime=genesisTime
+        authority={"threshold": 1, "keys": [{"key": eosioPublicKey, "weight": 1}], "accounts": []}
+        self.__accounts[eosTransaction.SystemAccount]={"creator": "", "owner": authority, "active": authority}
+        self.__balances[eosTransaction.SystemAccount]=InitialSupply
+        self.__supply=InitialSupply
+        self.__appendBlock([])
+
+    # Real seconds between blocks, e.g. for Node.blockInterval
+    def getRealBlockInterval(self):
+        return self.blockInterval/self.speed if self.speed else self.blockInterval
+
+    def start(self):
+        if self.__thread is not None or self.speed is None:
+            return
+        self.__stopEvent.clear()
+        self.__thread=threading.Thread(target=self.__run, name="mock-producer")
+        self.__thread.daemon=True
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stopEvent.set()
+        self.__thread.join()
+        self.__thread=None
+
+    def __run(self):
+        interval=self.getRealBlockInterval()
+        nextTime=time.monotonic() + interval
+        while not self.__stopEvent.wait(max(0.0, nextTime - time.monotonic())):
+            self.produceBlocks(1)
+            nextTime += interval
+
+    # Produce count blocks now. Returns the last block json object
+    def produceBlocks(self, count=1):
+        block=None
+        for _ in range(count):
+            with self.__lock:
+                limit=len(self.__pending)
+                if self.maxBlockTransactions is not None:
+                    limit=min(limit, self.maxBlockTransactions)
+                block=self.__appendBlock([self.__pending.popleft() for _ in range(limit)])
+        return block
+
+    def __appendBlock(self, transIds):
+        num=len(self.__blocks) + 1
+        previous=self.__blocks[-1]["id"] if self.__blocks else ZeroId
+        if self.__blocks:
+            self.__headTime += self.blockInterval
+        digest=eosKeys.sha256(bytes.fromhex(previous) + struct.pack("<Id", num, self.__headTime) +
+                              b"".join(bytes.fromhex(transId) for transId in transIds))
+        blockId=(struct.pack(">I", num) + digest[4:]).hex()
+        records=[self.__transactions[transId] for transId in transIds]
+        regions=[]
+        if records:
+            receipts=[{"status": "executed", "id": transId} for transId in transIds]
+            regions=[{"region": 0, "cycles_summary": [[{"read_locks": [], "write_locks": [], "transactions": receipts}]]}]
+        block={"previous": previous, "timestamp": _formatTime(self.__headTime, millis=True),
+               "transaction_mroot": ZeroId, "action_mroot": ZeroId, "block_mroot": ZeroId,
+               "producer": self.producer, "schedule_version": 0, "new_producers": None,
+               "producer_signature": eosKeys.signatureToString(b"\x1f" + b"\0"*64),
+               "regions": regions, "input_transactions": [record["packed"] for record in records],
+               "id": blockId, "block_num": num, "ref_block_prefix": eosTransaction.getRefBlock(blockId)[1]}
+        self.__blocks.append(block)
+        self.__blockNums[blockId]=num
+        for record in records:
+            record["block_num"]=num
+            for account in record["accounts"]:
+                self.__history.setdefault(account, []).append(record["transaction_id"])
+        self.included += len(records)
+        return block
+
+    def setAbi(self, account, abi):
+        codec=abiCodec.AbiCodec(abi)
+        with self.__lock:
+            self.__abis[account]=abi
+            self.__codecs[account]=codec
+
+    # Seed rows returned by get_table_rows for code, scope and table
+    def setTableRows(self, code, scope, table, rows):
+        with self.__lock:
+            self.__tables[(code, scope, table)]=list(rows)
+
+    # Create account name directly, without a transaction. Keys are public key strings.
+    def createAccount(self, name, ownerKey=DefaultPublicKey, activeKey=None, balance=0, creator=eosTransaction.SystemAccount):
+        with self.__lock:
+            if name in self.__accounts:
+                raise ChainError("account_name_exists_exception", "Cannot create account named %s, as that name is already taken" % (name))
+            self.__accounts[name]={"creator": creator,
+                                   "owner": {"threshold": 1, "keys": [{"key": ownerKey, "weight": 1}], "accounts": []},
+                                   "active": {"threshold": 1, "keys": [{"key": activeKey or ownerKey, "weight": 1}], "accounts": []}}
+            self.__balances[name]=balance
+            self.__supply += balance
+
+    def getPendingCount(self):
+        with self.__lock:
+            return len(self.__pending)
+
+    def getStats(self):
+        with self.__lock:
+            return {"headBlockNum": len(self.__blocks), "pending": len(self.__pending), "pushed": self.pushed,
+                    "rejected": self.rejected, "included": self.included, "accounts": len(self.__accounts)}
+
+    ####################################################################
+    # chain_api
+
+    def getInfo(self):
+        with self.__lock:
+            head=self.__blocks[-1]
+            lib=max(1, head["block_num"] - self.irreversibleBlocks)
+            return {"server_version": "mock", "head_block_num": head["block_num"], "last_irreversible_block_num": lib,
+                    "head_block_id": head["id"], "head_block_time": _formatTime(self.__headTime),
+                    "head_block_producer": self.producer}
+
+    def getBlock(self, blockNumOrId):
+        key=str(blockNumOrId)
+        with self.__lock:
+            num=self.__blockNums.get(key)
+            if num is None and key.isdigit():
+                num=int(key)
+            if num is None or not 1 <= num <= len(self.__blocks):
+                raise ChainError("unknown_block_exception", "Could not find block: %s" % (key))
+            return self.__blocks[num-1]
+
+    def getAccount(self, name):
+        with self.__lock:
+            account=self.__getAccount(name)
+            return {"account_name": name, "permissions": [
+                {"perm_name": "active", "parent": "owner", "required_auth": account["active"]},
+                {"perm_name": "owner", "parent": "", "required_auth": account["owner"]}]}
+
+    def __getAccount(self, name):
+        account=self.__accounts.get(name)
+        if account is None:
+            raise ChainError("assert_exception", "unknown key (eosio::chain::name): %s" % (name))
+        return account
+
+    def getCode(self, name):
+        with self.__lock:
+            self.__getAccount(name)
+            return {"account_name": name, "code_hash": ZeroId, "wast": "", "abi": self.__abis.get(name)}
+
+    def getCodec(self, code):
+        with self.__lock:
+            codec=self.__codecs.get(code)
+        if codec is None:
+            raise ChainError("abi_type_exception", "No ABI set on account %s" % (code))
+        return codec
+
+    def abiJsonToBin(self, code, action, args):
+        try:
+            return {"binargs": self.getCodec(code).packAction(action, args).hex()}
+        except abiCodec.AbiError as ex:
+            raise ChainError("abi_type_exception", str(ex))
+
+    def abiBinToJson(self, code, action, binargs):
+        try:
+            return {"args": self.getCodec(code).unpackAction(action, bytes.fromhex(binargs))}
+        except (abiCodec.AbiError, ValueError) as ex:
+            raise ChainError("abi_type_exception", str(ex))
+
+    def getCurrencyBalance(self, code, account, symbol=None):
+        with self.__lock:
+            if code != eosTransaction.SystemAccount or account not in self.__accounts or symbol not in (None, "", "EOS"):
+                return []
+            return [abiCodec.intsToAsset(self.__balances.get(account, 0), CoreSymbol)]
+
+    def getCurrencyStats(self, code, symbol=None):
+        with self.__lock:
+            if code != eosTransaction.SystemAccount or symbol not in (None, "", "EOS"):
+                return {}
+            return {"EOS": {"supply": abiCodec.intsToAsset(self.__supply, CoreSymbol)}}
+
+    def getTableRows(self, code, scope, table, limit=10):
+        with self.__lock:
+            rows=self.__tables.get((code, scope, table), [])
+            return {"rows": rows[:limit], "more": len(rows) > limit}
+
+    # Returns push_transaction result json object for packed transaction json object. Raises ChainError.
+    def pushTransaction(self, packed):
+        try:
+            data=bytes.fromhex(packed["data"])
+            compression=packed.get("compression", "none")
+            if compression == "zlib":
+                data=zlib.decompress(data)
+            elif compression != "none":
+                raise ValueError("Unknown compression %s" % (compression))
+            trx=eosTransaction.unpackTransaction(data)
+        except zlib.error as ex:
+            raise self.__reject(ChainError("tx_decompression_error", str(ex)))
+        except (KeyError, TypeError, AttributeError, ValueError, IndexError, struct.error) as ex:
+            raise self.__reject(ChainError("packed_transaction_type_exception", str(ex)))
+        transId=eosTransaction.getTransactionId(data)
+        signatures=packed.get("signatures", [])
+        keys=self.__recoverKeys(data, signatures) if self.verifySignatures else None
+
+        with self.__lock:
+            try:
+                if transId in self.__transactions:
+                    raise ChainError("tx_duplicate", "duplicate transaction %s" % (transId))
+                self.__checkHeader(trx)
+                if keys is not None:
+                    self.__checkAuthorization(trx, keys)
+                traces, accounts=self.__apply(trx)
+            except ChainError:
+                self.rejected += 1
+                raise
+            self.__transactions[transId]={"transaction_id": transId, "block_num": None, "accounts": accounts,
+                                          "packed": {"signatures": signatures, "compression": "none", "data": data.hex()},
+                                          "transaction": {"signatures": signatures, "compression": "none", "data": trx}}
+            self.__pending.append(transId)
+            self.pushed += 1
+        return {"transaction_id": transId, "processed": {"status": "executed", "id": transId, "action_traces": traces,
+                                                         "deferred_transaction_requests": []}}
+
+    # Count a rejection outside the chain lock. Returns ex for raising
+    def __reject(self, ex):
+        with self.__lock:
+            self.rejected += 1
+        return ex
+
+    def __checkHeader(self, trx):
+        expiration=abiCodec.timeToInt(trx["expiration"])
+        if expiration <= self.__headTime:
+            raise ChainError("expired_tx_exception", "transaction has expired, expiration is %s and pending block time is %s" % (
+                trx["expiration"], _formatTime(self.__headTime)))
+        if expiration > self.__headTime + self.maxExpirationSeconds:
+            raise ChainError("tx_exp_too_far_exception", "Transaction expiration is too far in the future")
+        head=len(self.__blocks)
+        refNum=head - ((head - trx["ref_block_num"]) & 0xffff)
+        if refNum < 1 or self.__blocks[refNum-1]["ref_block_prefix"] != trx["ref_block_prefix"]:
+            raise ChainError("invalid_ref_block_exception", "Transaction's reference block did not match")
+
+    def __recoverKeys(self, data, signatures):
+        digest=eosTransaction.getSigDigest(data, self.chainId)
+        try:
+            return set(eosKeys.publicKeyToString(eosKeys.recoverPublicKey(digest, eosKeys.signatureFromString(sig)))
+                       for sig in signatures)
+        except ValueError as ex:
+            raise self.__reject(ChainError("tx_missing_sigs", str(ex)))
+
+    def __checkAuthorization(self, trx, keys):
+        for action in trx["actions"]:
+            for level in action["authorization"]:
+                account=self.__accounts.get(level["actor"])
+                authority=account.get(level["permission"]) if account is not None else None
+                weight=sum(kw["weight"] for kw in authority["keys"] if kw["key"] in keys) if authority is not None else 0
+                if authority is None or weight < authority["threshold"]:
+                    raise ChainError("tx_missing_sigs", "transaction declares authority '%s@%s', but does not have signatures for it" % (
+                        level["actor"], level["permission"]))
+
+    # Apply actions; on failure every change made so far is undone. Returns (action traces, accounts involved)
+    def __apply(self, trx):
+        undo=[]
+        traces=[]
+        accounts=set()
+        try:
+            for action in trx["context_free_actions"] + trx["actions"]:
+                accounts.update(level["actor"] for level in action["authorization"])
+                handler=self.__handlers.get((action["account"], action["name"]))
+                if handler is not None:
+                    try:
+                        args=self.__codecs[action["account"]].unpackAction(action["name"], bytes.fromhex(action["data"]))
+                    except abiCodec.AbiError as ex:
+                        raise ChainError("assert_exception", str(ex))
+                    accounts.update(handler(args, undo))
+                traces.append({"receiver": action["account"], "act": action, "console": "", "region_id": 0,
+                               "cycle_index": 0, "data_access": []})
+        except ChainError:
+            for restore in reversed(undo):
+                restore()
+            raise
+        return (traces, sorted(accounts))
+
+    def __addBalance(self, name, amount, undo):
+        balance=self.__balances.get(name, 0)
+        if balance + amount < 0:
+            raise ChainError("assert_exception", "integer underflow subtracting token balance")
+        self.__balances[name]=balance + amount
+        undo.append(lambda: self.__balances.__setitem__(name, balance))
+
+    def __getCoreAmount(self, quantity):
+        amount, symbol=abiCodec.assetToInts(quantity)
+        if symbol != CoreSymbol:
+            raise ChainError("assert_exception", "unsupported symbol %s" % (quantity))
+        if amount <= 0:
+            raise ChainError("assert_exception", "must transfer positive quantity")
+        return amount
+
+    def __applyNewAccount(self, args, undo):
+        name=args["name"]
+        self.__getAccount(args["creator"])
+        if name in self.__accounts:
+            raise ChainError("account_name_exists_exception", "Cannot create account named %s, as that name is already taken" % (name))
+        self.__accounts[name]={"creator": args["creator"], "owner": args["owner"], "active": args["active"]}
+        self.__balances[name]=0
+        undo.append(lambda: (self.__accounts.pop(name, None), self.__balances.pop(name, None)))
+        return (args["creator"], name)
+
+    def __applyTransfer(self, args, undo):
+        amount=self.__getCoreAmount(args["quantity"])
+        self.__getAccount(args["from"])
+        self.__getAccount(args["to"])
+        self.__addBalance(args["from"], -amount, undo)
+        self.__addBalance(args["to"], amount, undo)
+        return (args["from"], args["to"])
+
+    def __applyIssue(self, args, undo):
+        amount=self.__getCoreAmount(args["quantity"])
+        self.__getAccount(args["to"])
+        self.__addBalance(args["to"], amount, undo)
+        supply=self.__supply
+        self.__supply=supply + amount
+        def restoreSupply():
+            self.__supply=supply
+        undo.append(restoreSupply)
+        return (args["to"],)
+
+    ####################################################################
+    # account_history_api, indexes transactions once they are in a block
+
+    def getTransaction(self, transId):
+        with self.__lock:
+            record=self.__transactions.get(transId)
+            if record is None or record["block_num"] is None:
+                raise ChainError("unknown_transaction_exception", "Could not find transaction %s" % (transId))
+            return {"transaction_id": transId, "transaction": record["transaction"]}
+
+    def getTransactions(self, name, skipSeq=None, numSeq=None):
+        with self.__lock:
+            transIds=self.__history.get(name, [])
+            start=skipSeq or 0
+            end=len(transIds) if numSeq is None else start + numSeq
+            return {"transactions": [{"seq_num": seq, "transaction_id": transIds[seq],
+                                      "transaction": self.__transactions[transIds[seq]]["transaction"]}
+                                     for seq in range(start, min(end, len(transIds)))],
+                    "time_limit_exceeded_error": False}
+
+    def getKeyAccounts(self, key):
+        with self.__lock:
+            return {"account_names": sorted(name for name, account in self.__accounts.items()
+                                            if any(kw["key"] == key for perm in ("owner", "active") for kw in account[perm]["keys"]))}
+
+    def getControlledAccounts(self, controller):
+        with self.__lock:
+            return {"controlled_accounts": sorted(name for name, account in self.__accounts.items()
+                                                  if any(plw["permission"]["actor"] == controller
+                                                         for perm in ("owner", "active") for plw in account[perm]["accounts"]))}
+
+###########################################################################################
+class MockWallet(object):
+    """wallet_api state, as walletd or nodeos with the wallet plugin keeps it. Thread safe."""
+
+    def __init__(self):
+        self.__wallets={}
+        self.__timeout=None
+        self.__lastUsed=time.monotonic()
+        self.__lock=threading.Lock()
+
+    def __touch(self):
+        now=time.monotonic()
+        if self.__timeout is not None and now - self.__lastUsed > self.__timeout:
+            for wallet in self.__wallets.values():
+                wallet["unlocked"]=False
+        self.__lastUsed=now
+
+    def __getWallet(self, name, unlocked=False):
+        wallet=self.__wallets.get(name)
+        if wallet is None:
+            raise ChainError("wallet_nonexistent_exception", "Wallet not found: %s" % (name))
+        if unlocked and not wallet["unlocked"]:
+            raise ChainError("wallet_locked_exception", "Wallet is locked: %s" % (name))
+        return wallet
+
+    # Returns the new wallet's password
+    def create(self, name):
+        with self.__lock:
+            self.__touch()
+            if name in self.__wallets:
+                raise ChainError("wallet_exist_exception", "Wallet with name: '%s' already exists" % (name))
+            password="PW" + eosKeys.privateKeyToWif(eosKeys.generatePrivateKey())
+            self.__wallets[name]={"password": password, "unlocked": True, "keys": {}}
+            return password
+
+    def open(self, name):
+        with self.__lock:
+            self.__touch()
+            self.__getWallet(name)
+
+    def lock(self, name):
+        with self.__lock:
+            self.__touch()
+            self.__getWallet(name)["unlocked"]=False
+
+    def lockAll(self):
+        with self.__lock:
+            for wallet in self.__wallets.values():
+                wallet["unlocked"]=False
+
+    def unlock(self, name, password):
+        with self.__lock:
+            self.__touch()
+            wallet=self.__getWallet(name)
+            if wallet["password"] != password:
+                raise ChainError("wallet_invalid_password_exception", "Invalid password for wallet: %s" % (name))
+            wallet["unlocked"]=True
+
+    def importKey(self, name, wif):
+        try:
+            publicKey=eosKeys.wifToPublicKey(wif)
+        except ValueError as ex:
+            raise ChainError("assert_exception", str(ex))
+        with self.__lock:
+            self.__touch()
+            self.__getWallet(name, unlocked=True)["keys"][publicKey]=wif
+
+    def listWallets(self):
+        with self.__lock:
+            self.__touch()
+            return [name + (" *" if wallet["unlocked"] else "") for name, wallet in sorted(self.__wallets.items())]
+
+    def listKeys(self):
+        with self.__lock:
+            self.__touch()
+            return [[publicKey, wif] for wallet in self.__wallets.values() if wallet["unlocked"]
+                    for publicKey, wif in sorted(wallet["keys"].items())]
+
+    def getPublicKeys(self):
+        return [publicKey for publicKey, _ in self.listKeys()]
+
+    def setTimeout(self, seconds):
+        with self.__lock:
+            self.__timeout=seconds
+
+    # Sign signed_transaction json object (action data as hex) with keys. Returns it with the signatures added.
+    def signTransaction(self, trx, publicKeys, chainId):
+        keys=dict(self.listKeys())
+        secrets=[]
+        for publicKey in publicKeys:
+            if publicKey not in keys:
+                raise ChainError("wallet_missing_pub_key_exception", "Public key not found in unlocked wallets %s" % (publicKey))
+            secrets.append(eosKeys.wifToPrivateKey(keys[publicKey]))
+        def toTuples(actions):
+            return [(a["account"], a["name"], [(p["actor"], p["permission"]) for p in a["authorization"]], bytes.fromhex(a["data"]))
+                    for a in actions]
+        try:
+            packedTrx=eosTransaction.packTransaction(abiCodec.timeToInt(trx["expiration"]), trx["ref_block_num"],
+                                                     trx["ref_block_prefix"], toTuples(trx.get("actions", [])),
+                                                     toTuples(trx.get("context_free_actions", [])), trx.get("region", 0))
+        except (KeyError, TypeError, ValueError) as ex:
+            raise ChainError("assert_exception", "Invalid transaction: %s" % (ex))
+        signed=dict(trx)
+        signed["signatures"]=list(trx.get("signatures", [])) + eosTransaction.signTransaction(
+            packedTrx, secrets, bytes.fromhex(chainId) if chainId else eosTransaction.ZeroChainId)
+        return signed
+
+###########################################################################################
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads=True
+    allow_reuse_address=True
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version="HTTP/1.1"
+    disable_nagle_algorithm=True
+
+    def do_POST(self):
+        length=int(self.headers.get("Content-Length", 0))
+        body=self.rfile.read(length) if length > 0 else b""
+        mock=self.server.mock
+        if mock.down:
+            # like a killed node: drop the connection without answering
+            self.close_connection=True
+            return
+        status, payload=mock.handle(self.path, body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET=do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+###########################################################################################
+class MockNodeos(object):
+    """HTTP front end of a MockChain and/or MockWallet, on host:port (port 0 picks a free port).
+
+    Every request is delayed by latency plus up to latencyJitter seconds. Requests to failurePaths fail with
+    exception failureError at failureRate (per transaction for push_transactions); injectFailures makes the
+    next calls to a path fail. setDown(True) drops connections like a killed node."""
+
+    PushPaths=("/v1/chain/push_transaction", "/v1/chain/push_transactions")
+
+    def __init__(self, chain=None, wallet=None, host="localhost", port=0, latency=0.0, latencyJitter=0.0,
+                 failureRate=0.0, failureError="checktime_exceeded", failurePaths=PushPaths):
+        self.chain=chain
+        self.wallet=wallet
+        self.host=host
+        self.port=port
+        self.latency=latency
+        self.latencyJitter=latencyJitter
+        self.failureRate=failureRate
+        self.failureError=failureError
+        self.failurePaths=set(failurePaths)
+        self.down=False
+        self.peers=collections.OrderedDict()
+        self.requests=collections.Counter()
+        self.__injected={}
+        self.__lock=threading.Lock()
+        self.__server=None
+        self.__thread=None
+        self.__routes={}
+        if chain is not None:
+            self.__routes.update({
+                "/v1/chain/get_info":                  (200, lambda p: chain.getInfo()),
+                "/v1/chain/get_block":                 (200, lambda p: chain.getBlock(p["block_num_or_id"])),
+                "/v1/chain/get_account":               (200, lambda p: chain.getAccount(p["account_name"])),
+                "/v1/chain/get_code":                  (200, lambda p: chain.getCode(p["account_name"])),
+                "/v1/chain/get_table_rows":            (200, lambda p: chain.getTableRows(p["code"], p["scope"], p["table"], p.get("limit", 10))),
+                "/v1/chain/get_currency_balance":      (200, lambda p: chain.getCurrencyBalance(p["code"], p["account"], p.get("symbol"))),
+                "/v1/chain/get_currency_stats":        (200, lambda p: chain.getCurrencyStats(p["code"], p.get("symbol"))),
+                "/v1/chain/abi_json_to_bin":           (200, lambda p: chain.abiJsonToBin(p["code"], p["action"], p["args"])),
+                "/v1/chain/abi_bin_to_json":           (200, lambda p: chain.abiBinToJson(p["code"], p["action"], p["binargs"])),
+                "/v1/chain/push_transaction":          (202, lambda p: chain.pushTransaction(p)),
+                "/v1/chain/push_transactions":         (202, self.__pushTransactions),
+                "/v1/account_history/get_transaction": (200, lambda p: chain.getTransaction(p["transaction_id"])),
+                "/v1/account_history/get_transactions": (200, lambda p: chain.getTransactions(p["account_name"], p.get("skip_seq"), p.get("num_seq"))),
+                "/v1/account_history/get_key_accounts": (200, lambda p: chain.getKeyAccounts(p["public_key"])),
+                "/v1/account_history/get_controlled_accounts": (200, lambda p: chain.getControlledAccounts(p["controlling_account"])),
+                "/v1/net/connect":                     (201, self.__connect),
+                "/v1/net/disconnect":                  (201, self.__disconnect),
+                "/v1/net/status":                      (201, lambda p: self.__getPeerStatus(p)),
+                "/v1/net/connections":                 (201, lambda p: [self.__getPeerStatus(peer) for peer in list(self.peers)]),
+            })
+        if wallet is not None:
+            self.__routes.update({
+                "/v1/wallet/set_timeout":              (200, lambda p: wallet.setTimeout(p)),
+                "/v1/wallet/sign_transaction":         (201, lambda p: wallet.signTransaction(p[0], p[1], p[2])),
+                "/v1/wallet/create":                   (201, lambda p: wallet.create(p)),
+                "/v1/wallet/open":                     (200, lambda p: wallet.open(p)),
+                "/v1/wallet/lock_all":                 (200, lambda p: wallet.lockAll()),
+                "/v1/wallet/lock":                     (200, lambda p: wallet.lock(p)),
+                "/v1/wallet/unlock":                   (200, lambda p: wallet.unlock(p[0], p[1])),
+                "/v1/wallet/import_key":               (201, lambda p: wallet.importKey(p[0], p[1])),
+                "/v1/wallet/list_wallets":             (200, lambda p: wallet.listWallets()),
+                "/v1/wallet/list_keys":                (200, lambda p: wallet.listKeys()),
+                "/v1/wallet/get_public_keys":          (200, lambda p: wallet.getPublicKeys()),
+            })
+
+    def start(self):
+        if self.__server is not None:
+            return self
+        self.__server=_Server((self.host, self.port), _RequestHandler)
+        self.__server.mock=self
+        self.port=self.__server.server_address[1]
+        self.__thread=threading.Thread(target=self.__server.serve_forever, name="mock-nodeos-%d" % (self.port))
+        self.__thread.daemon=True
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        if self.__server is None:
+            return
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__thread.join()
+        self.__server=None
+        self.__thread=None
+
+    def setDown(self, down=True):
+        self.down=down
+
+    # The next count calls to path fail with exception name (see _Exceptions)
+    def injectFailures(self, path, count=1, name="checktime_exceeded", message=""):
+        with self.__lock:
+            self.__injected.setdefault(path, collections.deque()).extend([ChainError(name, message)]*count)
+
+    def __takeFailure(self, path):
+        with self.__lock:
+            injected=self.__injected.get(path)
+            if injected:
+                return injected.popleft()
+        if path in self.failurePaths and self.failureRate > 0 and random.random() < self.failureRate:
+            return ChainError(self.failureError)
+        return None
+
+    # testUtils.Node talking to this server over http
+    def getNode(self):
+        node=testUtils.Node(self.host, self.port, transport=testUtils.Utils.TransportHttpTag)
+        if self.chain is not None:
+            node.blockInterval=self.chain.getRealBlockInterval()
+        return node
+
+    # Returns (http status, response body bytes) for an api call
+    def handle(self, path, body):
+        with self.__lock:
+            self.requests[path] += 1
+        delay=self.latency + (random.uniform(0, self.latencyJitter) if self.latencyJitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        route=self.__routes.get(path)
+        if route is None:
+            return (404, json.dumps({"code": 404, "message": "Not Found", "error": {"code": 0, "name": "",
+                                     "what": "Unknown Endpoint", "details": []}}).encode("utf-8"))
+        status, handler=route
+        try:
+            params=json.loads(body.decode("utf-8")) if body else {}
+            failure=self.__takeFailure(path) if path != "/v1/chain/push_transactions" else None
+            if failure is not None:
+                raise failure
+            result=handler(params)
+        except ChainError as ex:
+            status=ex.getChainStatus() if path.startswith("/v1/chain/") else 500
+            return (status, json.dumps(ex.toResults(status)).encode("utf-8"))
+        except (ValueError, KeyError, IndexError, TypeError) as ex:
+            error=ChainError("parse_error_exception", "Unable to parse arguments: %s" % (ex))
+            return (400, json.dumps(error.toResults(400)).encode("utf-8"))
+        return (status, json.dumps(result).encode("utf-8"))
+
+    def __pushTransactions(self, params):
+        if len(params) > 1000:
+            raise ChainError("assert_exception", "Attempt to push too many transactions at once")
+        results=[]
+        for packed in params:
+            try:
+                failure=self.__takeFailure("/v1/chain/push_transactions")
+                if failure is not None:
+                    raise failure
+                results.append(self.chain.pushTransaction(packed))
+            except ChainError as ex:
+                results.append({"transaction_id": ZeroId, "processed": {"error": ex.toDetailString()}})
+        return results
+
+    def __connect(self, host):
+        with self.__lock:
+            if host in self.peers:
+                return "already connected"
+            self.peers[host]=time.time()
+            return "added connection"
+
+    def __disconnect(self, host):
+        with self.__lock:
+            if self.peers.pop(host, None) is None:
+                return "no known connection for host"
+            return "connection removed"
+
+    def __getPeerStatus(self, host):
+        if host not in self.peers:
+            return None
+        info=self.chain.getInfo()
+        return {"peer": host, "connecting": False, "syncing": False, "last_handshake": {
+            "network_version": 0, "chain_id": self.chain.chainId.hex(), "node_id": ZeroId, "key": DefaultPublicKey,
+            "time": str(int(self.peers[host]*1000000000)), "token": ZeroId, "sig": "", "p2p_address": host,
+            "last_irreversible_block_num": info["last_irreversible_block_num"], "last_irreversible_block_id": ZeroId,
+            "head_num": info["head_block_num"], "head_id": info["head_block_id"], "os": "linux", "agent": "mock",
+            "generation": 1}}
+
+###########################################################################################
+# Start count servers on free ports sharing chain (default: a new MockChain) and start block production.
+#  Server keyword args go to each MockNodeos. Returns list of started MockNodeos.
+def startMockNodes(count, chain=None, **kwargs):
+    chain=chain or MockChain()
+    chain.start()
+    return [MockNodeos(chain, **kwargs).start() for _ in range(count)]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser=argparse.ArgumentParser(description="Serve a mock nodeos chain (and wallet) over http")
+    parser.add_argument("--host", type=str, help="Listen address", default="localhost")
+    parser.add_argument("--port", type=int, help="First http port, further nodes use the following ports", default=8888)
+    parser.add_argument("--nodes", type=int, help="Number of nodes sharing the chain", default=1)
+    parser.add_argument("--block-interval", type=float, help="Virtual seconds per block", default=0.5)
+    parser.add_argument("--speed", type=float, help="Virtual seconds per real second", default=1.0)
+    parser.add_argument("--max-block-transactions", type=int, help="Transactions per block, default unlimited", default=None)
+    parser.add_argument("--latency", type=float, help="Seconds added to every request", default=0.0)
+    parser.add_argument("--failure-rate", type=float, help="Fraction of pushed transactions failing checktime", default=0.0)
+    parser.add_argument("--verify-signatures", action="store_true", help="Check signatures against account keys")
+    parser.add_argument("--wallet", action="store_true", help="Also serve wallet_api")
+    parser.add_argument("--account", type=str, action="append", default=[],
+                        help="name=WIF of an account to create, funded with --fund, repeat for more accounts")
+    parser.add_argument("--fund", type=int, help="Core token units given to each --account", default=10000000000)
+    args=parser.parse_args()
+
+    mockChain=MockChain(blockInterval=args.block_interval, speed=args.speed, verifySignatures=args.verify_signatures,
+                        maxBlockTransactions=args.max_block_transactions)
+    for spec in args.account:
+        name, wif=spec.split("=", 1)
+        mockChain.createAccount(name, eosKeys.wifToPublicKey(wif), balance=args.fund)
+    mockWallet=MockWallet() if args.wallet else None
+    mockChain.start()
+    servers=[MockNodeos(mockChain, mockWallet, args.host, args.port + i, latency=args.latency, failureRate=args.failure_rate).start()
+             for i in range(args.nodes)]
+    print("mock nodeos serving on %s" % (", ".join("%s:%d" % (server.host, server.port) for server in servers)))
+    try:
+        while True:
+            time.sleep(10)
+            print("%s" % (mockChain.getStats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.stop()
+        mockChain.stop()
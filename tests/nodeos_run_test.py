@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 
 import testUtils
+import eosKeys
+import abiCodec
+import cassette
+import testLog
 
 import decimal
 import argparse
 import random
 import re
+import sys
 
 ###############################################################
 # nodeos_run_test
@@ -50,6 +55,16 @@ parser.add_argument("--keep-logs", help="Don't delete var/lib/node_* folders upo
 parser.add_argument("-v", help="verbose logging", action='store_true')
 parser.add_argument("--not-noon", help="This is not the Noon branch.", action='store_true')
 parser.add_argument("--dont-kill", help="Leave cluster running after test finishes", action='store_true')
+parser.add_argument("--http", help="Query nodes over http_plugin instead of forking %s" % (testUtils.Utils.EosClientPath),
+                    action='store_true')
+parser.add_argument("--record-calls", type=str, help="Record node http, %s and mongo calls to this cassette file for offline replay" % (testUtils.Utils.EosClientPath),
+                    default=None)
+parser.add_argument("--replay-calls", type=str, help="Run against the answers of a --record-calls cassette instead of a cluster and walletd",
+                    default=None)
+parser.add_argument("--call-stats", help="Print per operation call timings at exit", action='store_true')
+parser.add_argument("--call-trace", type=str, help="Also write the timed calls to this Chrome trace json file", default=None)
+parser.add_argument("--log-json", help="Log harness messages as json lines with time, level, thread and span", action='store_true')
+parser.add_argument("--log-buffered", help="Write harness messages from a background thread", action='store_true')
 
 args = parser.parse_args()
 testOutputFile=args.output
@@ -64,15 +79,27 @@ dumpErrorDetails=args.dump_error_details
 keepLogs=args.keep_logs
 dontLaunch=args.dont_launch
 dontKill=args.dont_kill
+replayCalls=args.replay_calls is not None
+transport=testUtils.Utils.TransportHttpTag if args.http else testUtils.Utils.TransportCleosTag
 
 testUtils.Utils.Debug=debug
+if args.log_json or args.log_buffered:
+    testUtils.Utils.setLogger(testLog.Logger(stream=testLog.BufferedWriter(sys.stdout) if args.log_buffered else None,
+                                             jsonLines=args.log_json))
+if args.record_calls is not None:
+    testUtils.Utils.setCassette(cassette.Cassette(args.record_calls, cassette.RecordMode))
+if replayCalls:
+    testUtils.Utils.setCassette(cassette.Cassette(args.replay_calls, cassette.ReplayMode))
+if args.call_stats or args.call_trace is not None:
+    testUtils.Utils.setCallStats(testUtils.CallStats(maxTraceEvents=1000000 if args.call_trace is not None else 0),
+                                 args.call_trace)
 localTest=True if server == LOCAL_HOST else False
 # launcher launched bios node listens on port DEFAULT_PORT-100
-cluster=testUtils.Cluster(walletd=True, enableMongo=enableMongo, initaPrvtKey=initaPrvtKey, initbPrvtKey=initbPrvtKey, port=DEFAULT_PORT-100)
+cluster=testUtils.Cluster(walletd=True, enableMongo=enableMongo, initaPrvtKey=initaPrvtKey, initbPrvtKey=initbPrvtKey, port=DEFAULT_PORT-100, transport=transport)
 walletMgr=testUtils.WalletMgr(True, nodeosPort=DEFAULT_PORT-100)
 testSuccessful=False
-killEosInstances=not dontKill
-killWallet=not dontKill
+killEosInstances=not dontKill and not replayCalls
+killWallet=not dontKill and not replayCalls
 
 WalletdName="eos-walletd"
 ClientName="eosc"
@@ -91,7 +118,11 @@ try:
     print("SERVER: %s" % (server))
     print("PORT: %d" % (port))
     
-    if localTest and not dontLaunch:
+    if replayCalls:
+        Print("Replay cluster calls from %s" % (args.replay_calls))
+        if cluster.attach() is False:
+            errorExit("Failed to replay eos cluster discovery.")
+    elif localTest and not dontLaunch:
         cluster.killall()
         cluster.cleanup()
         Print("Stand up cluster")
@@ -102,8 +133,17 @@ try:
         cluster.initializeNodes()
         killEosInstances=False
 
-    walletMgr.killall()
-    walletMgr.cleanup()
+    if not replayCalls:
+        walletMgr.killall()
+        walletMgr.cleanup()
+
+    Print("Cross-check in-process key generation against %s create key" % (ClientName))
+    keyStr=testUtils.Utils.checkOutput([testUtils.Utils.EosClientPath, "create", "key"])
+    m=re.match('Private key: (.+)\nPublic key: (.+)\n', keyStr)
+    if m is None:
+        errorExit("FAILURE - %s create key output parse failure: %s" % (ClientName, keyStr))
+    if eosKeys.wifToPublicKey(m.group(1)) != m.group(2):
+        errorExit("FAILURE - public key derived from %s does not match %s" % (m.group(1), m.group(2)))
 
     accounts=testUtils.Cluster.createAccountKeys(3)
     if accounts is None:
@@ -129,7 +169,7 @@ try:
     exchangeAccount.ownerPublicKey=PUB_KEY2
 
     Print("Stand up walletd")
-    if walletMgr.launch() is False:
+    if not replayCalls and walletMgr.launch() is False:
         cmdError("%s" % (WalletdName))
         errorExit("Failed to stand up eos walletd.")
 
@@ -140,11 +180,10 @@ try:
         cmdError("eos wallet create")
         errorExit("Failed to create wallet %s." % (testWalletName))
 
-    for account in accounts:
-        Print("Importing keys for account %s into wallet %s." % (account.name, testWallet.name))
-        if not walletMgr.importKey(account, testWallet):
-            cmdError("%s wallet import" % (ClientName))
-            errorExit("Failed to import key for account %s" % (account.name))
+    Print("Importing keys for accounts %s into wallet %s." % (", ".join([account.name for account in accounts]), testWallet.name))
+    if not walletMgr.importKeys(accounts, testWallet):
+        cmdError("wallet import_key")
+        errorExit("Failed to import keys into wallet %s" % (testWallet.name))
 
     initaWalletName="inita"
     Print("Creating wallet \"%s\"." % (initaWalletName))
@@ -209,6 +248,16 @@ try:
     if len(noMatch) > 0:
         errorExit("FAILURE - wallet keys did not include %s" % (noMatch), raw=true)
 
+    # wallet derives the public keys itself, cross-checks in-process generated public keys
+    keyPairs=walletMgr.getKeyPairs()
+    if keyPairs is None:
+        cmdError("%s wallet keys" % (ClientName))
+        errorExit("Failed to get wallet key pairs")
+    for account in accounts:
+        for publicKey, privateKey in ((account.ownerPublicKey, account.ownerPrivateKey), (account.activePublicKey, account.activePrivateKey)):
+            if keyPairs.get(publicKey) != privateKey:
+                errorExit("FAILURE - wallet public key for %s does not match %s" % (privateKey, publicKey))
+
     Print("Locking all wallets.")
     if not walletMgr.lockAllWallets():
         cmdError("%s wallet lock_all" % (ClientName))
@@ -274,6 +323,27 @@ try:
         cmdError("FAILURE - transfer failed")
         errorExit("Transfer verification failed. Excepted %d, actual: %d" % (expectedAmount, actualAmount))
 
+    transferAmount=100
+    Print("Transfer funds %d from account %s to %s, signed in process" % (
+        transferAmount, initaAccount.name, testeraAccount.name))
+    builder=node.getTransactionBuilder()
+    transId, trans=builder.build([builder.createTransferAction(initaAccount, testeraAccount, transferAmount, "local transfer")],
+                                 [initaAccount.activePrivateKey])
+    ret=node.pushTransaction(trans)
+    if ret is None:
+        errorExit("Failed to push locally signed transfer from account %s to %s" % (initaAccount.name, testeraAccount.name))
+    if testUtils.Node.getTransId(ret) != transId:
+        errorExit("FAILURE - local transaction id %s, node returned %s" % (transId, testUtils.Node.getTransId(ret)), raw=True)
+    if not node.waitForTransIdOnNode(transId):
+        errorExit("Failed to verify locally signed transfer %s" % (transId))
+
+    expectedAmount=975521
+    Print("Verify transfer, Expected: %d" % (expectedAmount))
+    actualAmount=node.getAccountBalance(testeraAccount.name)
+    if expectedAmount != actualAmount:
+        cmdError("FAILURE - transfer failed")
+        errorExit("Transfer verification failed. Excepted %d, actual: %d" % (expectedAmount, actualAmount))
+
     Print("Create new account %s via %s" % (currencyAccount.name, initbAccount.name))
     transId=node.createAccount(currencyAccount, initbAccount, stakedDeposit=5000)
     if transId is None:
@@ -463,6 +533,16 @@ try:
         if trans is None or not trans[0]:
             errorExit("FAILURE - issue action to currency contract failed", raw=True)
 
+        Print("Verify local abi codec matches abi_json_to_bin/abi_bin_to_json for currency contract")
+        codec=abiCodec.AbiCodec.fromFile(abiFile)
+        checks=[("create", {"issuer":"currency","maximum_supply":"100000.0000 CUR","can_freeze":0,"can_recall":0,"can_whitelist":0}),
+                ("issue", {"to":"currency","quantity":"100000.0000 CUR","memo":"issue"}),
+                ("transfer", {"from":"currency","to":"inita","quantity":"0.0050 CUR","memo":"test"})]
+        for action, actionArgs in checks:
+            mismatch=abiCodec.crossCheckAction(node, contract, codec, action, actionArgs)
+            if mismatch is not None:
+                errorExit("FAILURE - abi codec mismatch: %s" % (mismatch), raw=True)
+
     # TODO need to update eosio.system contract to use new currency and update cleos and chain_plugin for interaction
     # Print("Verify currency contract has proper initial balance (via get table)")
     # contract="currency"
@@ -621,8 +701,7 @@ try:
     currentBlockNum=node.getHeadBlockNum()
     Print("CurrentBlockNum: %d" % (currentBlockNum))
     Print("Request blocks 1-%d" % (currentBlockNum))
-    for blockNum in range(1, currentBlockNum+1):
-        block=node.getBlock(blockNum, retry=False)
+    for blockNum, block in node.iterBlocks(1, currentBlockNum+1, retry=False):
         if block is None:
             cmdError("%s get block" % (ClientName))
             errorExit("mongo get block by num %d" % blockNum)
@@ -649,7 +728,7 @@ try:
     else:
         Print("Success: No such block found")
 
-    if localTest:
+    if localTest and not replayCalls:
         p = re.compile('Assert')
         errFileName="var/lib/node_00/stderr.txt"
         with open(errFileName) as errFile:
@@ -657,6 +736,9 @@ try:
                 if p.search(line):
                    errorExit("FAILURE - Assert in var/lib/node_00/stderr.txt")
 
+    if enableMongo:
+        cluster.reportMongoLagStats()
+
     testSuccessful=True
     Print("END")
 finally:
@@ -679,4 +761,7 @@ finally:
             Print("Cleanup wallet data.")
             walletMgr.cleanup()
 
+    if testUtils.Utils.cassette is not None:
+        testUtils.Utils.cassette.close()
+
 exit(0)
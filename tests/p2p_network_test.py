@@ -6,6 +6,7 @@ import impaired_network
 import lossy_network
 import p2p_stress
 
+import asyncio
 import copy
 import decimal
 import argparse
@@ -40,6 +41,8 @@ parser.add_argument("--impaired_network", help="test impaired network", action='
 parser.add_argument("--lossy_network", help="test lossy network", action='store_true')
 parser.add_argument("--stress_network", help="test load/stress network", action='store_true')
 parser.add_argument("--not_kill_wallet", help="not killing walletd", action='store_true')
+parser.add_argument("--sign_locally", help="stress network: sign transfers in process instead of via cleos and walletd", action='store_true')
+parser.add_argument("--discover_tps", help="stress network: search for the highest transaction rate the network sustains instead of the fixed speeds", action='store_true')
 
 args = parser.parse_args()
 testOutputFile=args.output
@@ -55,6 +58,7 @@ elif args.lossy_network:
     module = lossy_network.LossyNetwork()
 elif args.stress_network:
     module = p2p_stress.StressNetwork()
+    module.signLocally = args.sign_locally
 else:
     errorExit("one of impaired_network, lossy_network or stress_network must be set. Please also check peer configs in p2p_test_peers.py.")
 
@@ -165,10 +169,24 @@ if trans is None:
 else:
     Print("transaction id %s" % (node0.getTransId(trans)))
 
+asyncCluster=testUtils.AsyncCluster(cluster)
+if args.stress_network:
+    module.nodes = [cluster.getNode(i) for i in range(len(hosts))]
+
+# look up all transaction ids on node concurrently. Returns (found count, missing count)
+async def verifyTransactions(node, transIdList):
+    results = await asyncio.gather(*[node.getTransaction(transId) for transId in transIdList])
+    failedcount = sum(1 for trans in results if trans is None)
+    return (len(transIdList) - failedcount, failedcount)
+
 try:
-    maxIndex = module.maxIndex()
+    discover = args.stress_network and args.discover_tps
+    maxIndex = 1 if discover else module.maxIndex()
     for cmdInd in range(maxIndex):
-        (transIdList, checkacct, expBal, errmsg) = module.execute(cmdInd, node0, testeraAccount, eosio)
+        if discover:
+            (transIdList, checkacct, expBal, errmsg) = module.discover(node0, testeraAccount, eosio)
+        else:
+            (transIdList, checkacct, expBal, errmsg) = module.execute(cmdInd, node0, testeraAccount, eosio)
 
         if len(transIdList) == 0 and len(checkacct) == 0:
             errorExit("failed to execute command in host %s:%s" % (hosts[0], errmsg))
@@ -181,23 +199,20 @@ try:
                 host = hosts[i]
                 if host in successhosts:
                     continue
+                balanceOk = True
                 if len(checkacct) > 0:
                     actBal = cluster.getNode(i).getAccountBalance(checkacct)
-                    if expBal == actBal:
+                    balanceOk = expBal == actBal
+                    if balanceOk:
                         Print("acct balance verified in host %s" % (host))
                     else:
-                        Print("acct balance check failed in host %s, expect %d actual %d" % (host, expBal, actBal))
-                okcount = 0
-                failedcount = 0
-                for j in range(len(transIdList)):
-                    if cluster.getNode(i).getTransaction(transIdList[j]) is None:
-                        failedcount = failedcount + 1
-                    else:
-                        okcount = okcount + 1
+                        Print("acct balance check failed in host %s, expect %d actual %s" % (host, expBal, actBal))
+                (okcount, failedcount) = testUtils.Utils.runAsync(verifyTransactions(asyncCluster.getNode(i), transIdList))
                 Print("%d transaction(s) verified in host %s, %d transaction(s) failed" % (okcount, host, failedcount))
-                if failedcount == 0:
+                if failedcount == 0 and balanceOk:
                     successhosts.append(host)
         Print("%d host(s) passed, %d host(s) failed" % (len(successhosts), len(hosts) - len(successhosts)))
+    cluster.reportInfoCacheStats()
 finally:
     Print("\nfinally: restore everything")
     module.on_exit()
@@ -2,14 +2,268 @@ import testUtils
 import p2p_test_peers
 import random
 import time
+import json
 import copy
 import threading
+import queue
+import concurrent.futures
+from collections import OrderedDict
+
+class SendRecord(object):
+    """One scheduled send: intended (per schedule), actual start and completion times, send() result."""
+    __slots__ = ("seq", "intended", "actual", "done", "result")
+
+    def __init__(self, seq, intended):
+        self.seq = seq
+        self.intended = intended
+        self.actual = None
+        self.done = None
+        self.result = None
+
+class OpenLoopScheduler:
+    """Issues sends at a fixed rate regardless of how long each takes. A dispatcher thread releases send i
+    at start + i/rate onto a queue drained by a fixed pool of workers, so slow calls delay neither the
+    schedule nor other sends. Records keep intended and actual send times: latency measured from the
+    intended time is corrected for coordinated omission."""
+
+    def __init__(self, rate, workers):
+        self.rate = rate
+        self.workers = workers
+
+    # Calls send(record) for the SendRecord of each seq in [0, count). Returns list of SendRecord in seq order.
+    def run(self, count, send):
+        records = [None] * count
+        pending = queue.Queue()
+
+        def work():
+            while True:
+                record = pending.get()
+                if record is None:
+                    return
+                record.actual = time.perf_counter()
+                try:
+                    record.result = send(record)
+                except Exception as ex:
+                    print("ERROR: send %d failed: %s" % (record.seq, ex))
+                record.done = time.perf_counter()
+
+        threads = [threading.Thread(target=work, name="stress-worker-%d" % (i)) for i in range(self.workers)]
+        for th in threads:
+            th.daemon = True
+            th.start()
+
+        interval = 1.0 / self.rate
+        start = time.perf_counter()
+        try:
+            for seq in range(count):
+                intended = start + seq * interval
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                records[seq] = SendRecord(seq, intended)
+                pending.put(records[seq])
+        finally:
+            for th in threads:
+                pending.put(None)
+            for th in threads:
+                th.join()
+        return records
+
+    @staticmethod
+    def percentile(values, p):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    # Returns achieved rate and send lag / service time / corrected latency summaries for records
+    @staticmethod
+    def getStats(records):
+        records = [r for r in records if r is not None and r.done is not None]
+        if not records:
+            return None
+        span = max(r.actual for r in records) - records[0].intended
+        stats = {"count": len(records), "achievedRate": len(records) / span if span > 0 else 0.0}
+        for name, values in (("lag", [r.actual - r.intended for r in records]),
+                             ("service", [r.done - r.actual for r in records]),
+                             ("latency", [r.done - r.intended for r in records])):
+            stats[name] = {"p50": OpenLoopScheduler.percentile(values, 0.5),
+                           "p99": OpenLoopScheduler.percentile(values, 0.99), "max": max(values)}
+        return stats
+
+class LatencyStages:
+    """Per transaction stage latencies of a stress run, measured from the intended send time and folded into
+    mergeable histograms: accepted (push returned), in block on each node (first seen by the node's
+    transaction watcher) and irreversible (on the first node). Also counts accepted transactions not yet
+    in a block on the first node, the inclusion backlog, and keeps the ids of those that are."""
+
+    AcceptedStage = "accepted"
+    IrreversibleStage = "irreversible"
+
+    def __init__(self, watchers, trackIrreversible=True):
+        self.watchers = watchers
+        self.trackIrreversible = trackIrreversible
+        self.histograms = OrderedDict()
+        self.histograms[LatencyStages.AcceptedStage] = testUtils.LatencyHistogram()
+        for watcher in watchers:
+            self.histograms[LatencyStages.getBlockStage(watcher.node)] = testUtils.LatencyHistogram()
+        if trackIrreversible:
+            self.histograms[LatencyStages.IrreversibleStage] = testUtils.LatencyHistogram()
+        self.irreversibleFutures = []
+        self.acceptedCount = 0
+        self.includedCount = 0
+        self.includedIds = []
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def getBlockStage(node):
+        return "in block %s:%d" % (node.host, node.port)
+
+    # Record acceptance now and follow transId into blocks. Call right after the push returns.
+    def track(self, transId, intended):
+        self.histograms[LatencyStages.AcceptedStage].record(time.perf_counter() - intended)
+        with self.__lock:
+            self.acceptedCount += 1
+        for i, watcher in enumerate(self.watchers):
+            histogram = self.histograms[LatencyStages.getBlockStage(watcher.node)]
+            watcher.watch(transId, lambda transId, blockNum, histogram=histogram, first=(i == 0): self.__included(transId, histogram, intended, first))
+        if not self.trackIrreversible:
+            return
+        irreversible = self.histograms[LatencyStages.IrreversibleStage]
+        self.irreversibleFutures.append(self.watchers[0].watchIrreversible(
+            transId, lambda transId, blockNum: irreversible.record(time.perf_counter() - intended)))
+
+    def __included(self, transId, histogram, intended, first):
+        histogram.record(time.perf_counter() - intended)
+        if first:
+            with self.__lock:
+                self.includedCount += 1
+                self.includedIds.append(transId)
+
+    # Accepted transactions not yet seen in a block on the first node
+    def getBacklog(self):
+        with self.__lock:
+            return self.acceptedCount - self.includedCount
+
+    # Ids of accepted transactions seen in a block on the first node so far
+    def getIncludedIds(self):
+        with self.__lock:
+            return list(self.includedIds)
+
+    def getBlockHistogram(self):
+        return self.histograms[LatencyStages.getBlockStage(self.watchers[0].node)]
+
+    # Wait for tracked transactions to become irreversible. Returns number still pending at timeout.
+    def waitForIrreversible(self, timeout):
+        done, notDone = concurrent.futures.wait(self.irreversibleFutures, timeout=timeout)
+        return len(notDone)
+
+    def merge(self, other):
+        for stage, histogram in other.histograms.items():
+            if stage in self.histograms:
+                self.histograms[stage].merge(histogram)
+            else:
+                self.histograms[stage] = testUtils.LatencyHistogram().merge(histogram)
+        return self
+
+    def report(self, title):
+        print("latency from intended send time, %s:" % (title))
+        for stage, histogram in self.histograms.items():
+            print("  %-32s %s" % (stage, histogram.format()))
+
+class CapacityTrial:
+    """One fixed rate window of a capacity search: what was offered, what the chain made of it and the
+    SLO checks it failed, if any."""
+
+    CheckTimeError = "checktime_exceeded"
+
+    def __init__(self, rate, window):
+        self.rate = rate
+        self.window = window
+        self.sent = 0
+        self.accepted = 0
+        self.acceptedIds = []
+        self.rejected = 0
+        self.checkTimeRejected = 0
+        self.errors = {}
+        self.stats = None
+        self.stages = None
+        self.inBlock = None
+        # (seconds into window, inclusion backlog)
+        self.backlogSamples = []
+        self.backlogGrowth = 0.0
+        self.unincluded = 0
+        self.violations = []
+
+    def passed(self):
+        return not self.violations
+
+    # Exception name from a push_transaction error response, e.g. "checktime_exceeded"
+    @staticmethod
+    def getErrorName(output):
+        try:
+            error = json.loads(output).get("error", {})
+            return error.get("name") or str(error.get("code"))
+        except (ValueError, AttributeError):
+            return output.split("\n")[0][:64]
+
+    def addError(self, output):
+        name = CapacityTrial.getErrorName(output)
+        self.rejected += 1
+        self.errors[name] = self.errors.get(name, 0) + 1
+        # the name is missing when a plugin only forwards the message
+        if name == CapacityTrial.CheckTimeError or "allotted processing time" in output:
+            self.checkTimeRejected += 1
+
+    # Least squares slope of the backlog over the second half of the window, in transactions/s
+    def computeBacklogGrowth(self):
+        samples = [(t, backlog) for t, backlog in self.backlogSamples if t >= self.window / 2.0]
+        if len(samples) < 2:
+            return 0.0
+        meanT = sum(t for t, _ in samples) / len(samples)
+        meanB = sum(backlog for _, backlog in samples) / len(samples)
+        denom = sum((t - meanT) ** 2 for t, _ in samples)
+        if denom == 0:
+            return 0.0
+        return sum((t - meanT) * (backlog - meanB) for t, backlog in samples) / denom
+
+    def format(self):
+        p99 = self.inBlock.getPercentile(99) if self.inBlock is not None else None
+        return "%5d/s %4ds: sent %d, accepted %d, rejected %d (%d checktime), achieved %.1f/s, in block p99 %s, backlog growth %.1f/s, not included %d -> %s" % (
+            self.rate, self.window, self.sent, self.accepted, self.rejected, self.checkTimeRejected,
+            self.stats["achievedRate"] if self.stats is not None else 0.0, "%.3f s" % (p99) if p99 is not None else "n/a",
+            self.backlogGrowth, self.unincluded, "pass" if self.passed() else "FAIL (%s)" % (", ".join(self.violations)))
 
 class StressNetwork:
     speeds=[1,5,10,30,60,100,500]
     sec=10
     maxthreads=100
+    minthreads=4
     trList=[]
+    signLocally=False
+    # nodes to measure block inclusion on, defaults to the node transactions are sent to
+    nodes=None
+    watcherPollInterval=0.05
+    irreversibleTimeout=60
+    latencies=None
+    # capacity search, see discover(). Rates in transactions/s, times in seconds
+    discoverStartRate=50
+    discoverStep=50
+    discoverDecrease=0.5
+    discoverResolution=10
+    discoverMaxTrials=20
+    discoverSettle=3
+    # sustained window the best rate must hold for before it is reported
+    discoverWindow=60
+    sloInBlockP99=3.0
+    sloMinRateFraction=0.95
+    sloMaxSendLag=1.0
+    sloMaxRejectedFraction=0.01
+    sloMaxCheckTimeRejected=0
+    sloMaxBacklogGrowthFraction=0.05
+    sloMaxUnincludedFraction=0.01
+    capacity=None
+    trials=None
 
     def maxIndex(self):
         return len(self.speeds)
@@ -20,22 +274,36 @@ class StressNetwork:
             s=s+random.choice("abcdefghijklmnopqrstuvwxyz12345")
         return s
     
-    def _transfer(self, node, acc1, acc2, amount, threadId, round):
-        memo="%d %d" % (threadId, round)
-        tr = node.transferFunds(acc1, acc2, amount, memo)
-        self.trList.append(tr)
+    def _transfer(self, node, acc1, acc2, amount, record, stages):
+        memo="%d" % (record.seq)
+        tr = node.transferFunds(acc1, acc2, amount, memo, signLocally=self.signLocally)
+        if tr is not None:
+            stages.track(node.getTransId(tr), record.intended)
+        return tr
 
-    def execute(self, cmdInd, node, ta, eosio):
-        print("\n==== network stress test: %d transaction(s)/s for %d secs ====" % (self.speeds[cmdInd], self.sec))
-        total = self.speeds[cmdInd] * self.sec
+    # Discovery send: build, sign and push in process so rejections can be classified. Returns (transId, error output)
+    def _pushTransfer(self, node, builder, acc1, acc2, amount, memo, record, stages):
+        built = builder.build([builder.createTransferAction(acc1, acc2, amount, memo)], [acc1.activePrivateKey])
+        if built is None:
+            return (None, "no reference block")
+        transId, trans = built
+        try:
+            node.httpClient.call("/v1/chain/push_transaction", trans)
+        except testUtils.HttpError as ex:
+            return (None, ex.output.decode("utf-8", "replace"))
+        node.invalidateInfo()
+        stages.track(transId, record.intended)
+        return (transId, None)
 
+    # Create sender and receiver accounts from ta's keys and fund the sender. Returns (acc1, acc2, errmsg)
+    def _setupAccounts(self, node, ta, eosio):
         ta.name = self.randAcctName()
         acc1 = copy.copy(ta)
         print("creating new account %s" % (ta.name))
         tr = node.createAccount(ta, eosio, stakedDeposit=0, waitForTransBlock=True)
         trid = node.getTransId(tr)
         if trid is None:
-            return ([], "", 0.0, "failed to create account")
+            return (None, None, "failed to create account")
         print("transaction id %s" % (trid))
 
         ta.name = self.randAcctName()
@@ -44,7 +312,7 @@ class StressNetwork:
         tr = node.createAccount(ta, eosio, stakedDeposit=0, waitForTransBlock=True)
         trid = node.getTransId(tr)
         if trid is None:
-            return ([], "", 0.0, "failed to create account")
+            return (None, None, "failed to create account")
         print("transaction id %s" % (trid))
 
         print("issue currency into %s" % (acc1.name))
@@ -55,49 +323,223 @@ class StressNetwork:
         tr=node.pushMessage(contract, action, data, opts)
         trid = node.getTransId(tr[1])
         if trid is None:
-            return ([], "", 0.0, "failed to issue currency")
+            return (None, None, "failed to issue currency")
         print("transaction id %s" % (trid))
         node.waitForTransIdOnNode(trid)
 
+        return (acc1, acc2, "")
+
+    def execute(self, cmdInd, node, ta, eosio):
+        print("\n==== network stress test: %d transaction(s)/s for %d secs ====" % (self.speeds[cmdInd], self.sec))
+        total = self.speeds[cmdInd] * self.sec
+
+        (acc1, acc2, errmsg) = self._setupAccounts(node, ta, eosio)
+        if acc1 is None:
+            return ([], "", 0.0, errmsg)
+
+        # follow blocks from here on so the load phase transfers are confirmed in one pass
+        watcher = node.getTransactionWatcher()
+        watchers = [watcher] + [n.getTransactionWatcher() for n in (self.nodes or []) if n is not node]
+        for w in watchers:
+            w.pollInterval = self.watcherPollInterval
+        stages = LatencyStages(watchers)
+
         self.trList = []
-        expBal = 0
-        nthreads=self.maxthreads
-        if nthreads > self.speeds[cmdInd]:
-            nthreads = self.speeds[cmdInd]
-        cycle = int(total / nthreads)
-        total = cycle * nthreads # rounding
-        delay = 1.0 / self.speeds[cmdInd] * nthreads
+        speed = self.speeds[cmdInd]
+        nthreads = min(self.maxthreads, max(self.minthreads, speed))
+        amount = 1
 
-        print("start currency trasfer from %s to %s for %d times with %d threads" % (acc1.name, acc2.name, total, nthreads))
+        print("start currency trasfer from %s to %s for %d times at %d/s with %d workers" % (acc1.name, acc2.name, total, speed, nthreads))
 
+        scheduler = OpenLoopScheduler(speed, nthreads)
         t00 = time.time()
-        for k in range(cycle):
-            t0 = time.time()
-            amount = 1
-            threadList = []
-            for m in range(nthreads):
-                th = threading.Thread(target = self._transfer,args = (node, acc1, acc2, amount, m, k))
-                th.start()
-                threadList.append(th)
-            for th in threadList:
-                th.join()
-            expBal = expBal + amount * nthreads
-            t1 = time.time()
-            if (t1-t0 < delay):
-                time.sleep(delay - (t1-t0))
+        records = scheduler.run(total, lambda record: self._transfer(node, acc1, acc2, amount, record, stages))
         t11 = time.time()
+        self.trList = [r.result for r in records]
         print("time used = %lf" % (t11 - t00))
-
-        actBal = node.getAccountBalance(acc2.name)
-        print("account %s: expect Balance:%d, actual Balance %d" % (acc2.name, expBal, actBal))
+        stats = OpenLoopScheduler.getStats(records)
+        if stats is not None:
+            print("target %d/s, achieved %.1f/s; send lag p50 %.3f p99 %.3f max %.3f s; service time p50 %.3f p99 %.3f s; "
+                  "corrected latency p50 %.3f p99 %.3f s" % (
+                      speed, stats["achievedRate"], stats["lag"]["p50"], stats["lag"]["p99"], stats["lag"]["max"],
+                      stats["service"]["p50"], stats["service"]["p99"], stats["latency"]["p50"], stats["latency"]["p99"]))
 
         transIdlist = []
         for tr in self.trList:
+            if tr is None:
+                continue
             trid = node.getTransId(tr)
             transIdlist.append(trid)
-            node.waitForTransIdOnNode(trid)
+        # only pushed transfers move funds
+        expBal = amount * len(transIdlist)
+        actBal = node.getAccountBalance(acc2.name)
+        print("account %s: expect Balance:%d, actual Balance %d" % (acc2.name, expBal, actBal))
+        if watcher.waitForTransIds(transIdlist):
+            lastBlockNum = max([watcher.getInclusionBlockNum(trid) for trid in transIdlist], default=0)
+            node.waitForBlockNumOnNode(lastBlockNum)
+        pending = stages.waitForIrreversible(self.irreversibleTimeout)
+        if pending > 0:
+            print("%d transaction(s) not irreversible after %d s" % (pending, self.irreversibleTimeout))
+        stages.report("%d/s" % (speed))
+        if self.latencies is None:
+            self.latencies = OrderedDict()
+        if speed in self.latencies:
+            self.latencies[speed].merge(stages)
+        else:
+            self.latencies[speed] = stages
+        print("get info cache: %s" % (node.getInfoCacheStats()))
         return (transIdlist, acc2.name, expBal, "")
     
+    # Offer rate transactions/s for window seconds, then judge the outcome against the SLOs. Returns CapacityTrial
+    def _runTrial(self, node, builder, acc1, acc2, watchers, rate, window, trialNum):
+        trial = CapacityTrial(rate, window)
+        stages = LatencyStages(watchers, trackIrreversible=False)
+        nthreads = min(self.maxthreads, max(self.minthreads, rate))
+        amount = 1
+        print("trial %d: %d/s for %d secs with %d workers" % (trialNum, rate, window, nthreads))
+
+        stop = threading.Event()
+        start = time.perf_counter()
+        def sampleBacklog():
+            while not stop.wait(1.0):
+                trial.backlogSamples.append((time.perf_counter() - start, stages.getBacklog()))
+        sampler = threading.Thread(target=sampleBacklog, name="backlog-sampler")
+        sampler.daemon = True
+        sampler.start()
+        try:
+            records = OpenLoopScheduler(rate, nthreads).run(int(rate * window), lambda record: self._pushTransfer(
+                node, builder, acc1, acc2, amount, "trial %d %d" % (trialNum, record.seq), record, stages))
+        finally:
+            stop.set()
+            sampler.join()
+        # give the last transactions a few blocks to be included before counting the leftover backlog
+        time.sleep(self.discoverSettle)
+
+        for record in records:
+            if record is None or record.done is None:
+                continue
+            trial.sent += 1
+            if record.result is None:
+                trial.addError("send failed")
+            elif record.result[1] is not None:
+                trial.addError(record.result[1])
+            else:
+                trial.accepted += 1
+                trial.acceptedIds.append(record.result[0])
+        trial.stats = OpenLoopScheduler.getStats(records)
+        trial.stages = stages
+        trial.inBlock = stages.getBlockHistogram()
+        trial.backlogGrowth = trial.computeBacklogGrowth()
+        trial.unincluded = stages.getBacklog()
+        self._judgeTrial(trial)
+        print(trial.format())
+        return trial
+
+    def _judgeTrial(self, trial):
+        violations = trial.violations
+        if trial.stats is None or trial.sent == 0:
+            violations.append("nothing sent")
+            return
+        if trial.stats["achievedRate"] < self.sloMinRateFraction * trial.rate:
+            violations.append("achieved rate %.1f/s" % (trial.stats["achievedRate"]))
+        if trial.stats["lag"]["p99"] > self.sloMaxSendLag:
+            # the load generator, not the chain, fell behind
+            violations.append("send lag p99 %.3f s" % (trial.stats["lag"]["p99"]))
+        if trial.checkTimeRejected > self.sloMaxCheckTimeRejected:
+            violations.append("%d checktime rejections" % (trial.checkTimeRejected))
+        if trial.rejected > self.sloMaxRejectedFraction * trial.sent:
+            violations.append("%d rejections" % (trial.rejected))
+        p99 = trial.inBlock.getPercentile(99)
+        if p99 is None or p99 > self.sloInBlockP99:
+            violations.append("in block p99 %s" % ("%.3f s" % (p99) if p99 is not None else "n/a"))
+        if trial.backlogGrowth > self.sloMaxBacklogGrowthFraction * trial.rate:
+            violations.append("backlog growing %.1f/s" % (trial.backlogGrowth))
+        if trial.unincluded > self.sloMaxUnincludedFraction * max(1, trial.accepted):
+            violations.append("%d not included" % (trial.unincluded))
+
+    # Capacity search: find the highest offered rate at which every SLO holds for a sustained window.
+    #  Additive increase by discoverStep while trials pass, multiplicative decrease by discoverDecrease while
+    #  none has, then bisect between the best passing and lowest failing rate down to discoverResolution.
+    #  The best rate is confirmed over discoverWindow seconds; if that fails the search continues below it.
+    #  Returns (transIdlist, checked account name, expected balance, errmsg) like execute. Trials tolerate a
+    #  few accepted transactions that never make it into a block, so the ids and expected balance cover the
+    #  transactions included on the first node only.
+    def discover(self, node, ta, eosio):
+        hosts = [node] + [n for n in (self.nodes or []) if n is not node]
+        print("\n==== network capacity search over %d node(s): %s ====" % (
+            len(hosts), ", ".join("%s:%d" % (n.host, n.port) for n in hosts)))
+        if ta.activePrivateKey is None:
+            return ([], "", 0.0, "capacity search signs in process and needs the account's active private key")
+
+        (acc1, acc2, errmsg) = self._setupAccounts(node, ta, eosio)
+        if acc1 is None:
+            return ([], "", 0.0, errmsg)
+
+        builder = node.getTransactionBuilder()
+        watchers = [n.getTransactionWatcher() for n in hosts]
+        for w in watchers:
+            w.pollInterval = self.watcherPollInterval
+
+        self.trials = []
+        good = None
+        bad = None
+        rate = self.discoverStartRate
+        while len(self.trials) < self.discoverMaxTrials:
+            if good is not None and bad is not None and bad - good <= self.discoverResolution:
+                # converged, the best rate has to hold for a sustained window
+                trial = self._runTrial(node, builder, acc1, acc2, watchers, good, self.discoverWindow, len(self.trials))
+                self.trials.append(trial)
+                if trial.passed():
+                    self.capacity = good
+                    break
+                bad = good
+                below = [t.rate for t in self.trials if t.passed() and t.rate < bad]
+                good = max(below) if below else None
+                rate = (good + bad) // 2 if good is not None else int(bad * self.discoverDecrease)
+                continue
+            if rate < 1:
+                print("no rate holds the SLOs")
+                break
+
+            trial = self._runTrial(node, builder, acc1, acc2, watchers, rate, self.sec, len(self.trials))
+            self.trials.append(trial)
+            if trial.passed():
+                good = rate
+            else:
+                bad = rate
+            if good is None:
+                rate = int(rate * self.discoverDecrease)
+            elif bad is None:
+                rate = good + self.discoverStep
+            else:
+                rate = (good + bad) // 2
+
+        self.reportCapacity(hosts)
+        # accepted transactions can still be included until they expire
+        accepted = sum(len(trial.acceptedIds) for trial in self.trials)
+        testUtils.Utils.waitForTrue(lambda: sum(len(trial.stages.getIncludedIds()) for trial in self.trials) >= accepted,
+                                    timeout=builder.expirationSeconds + self.discoverSettle)
+        transIdlist = [transId for trial in self.trials for transId in trial.stages.getIncludedIds()]
+        if len(transIdlist) < accepted:
+            print("%d of %d accepted transaction(s) not included" % (accepted - len(transIdlist), accepted))
+        # trials transfer 1 unit per transaction
+        expBal = len(transIdlist)
+        actBal = node.getAccountBalance(acc2.name)
+        print("account %s: expect Balance:%d, actual Balance %d" % (acc2.name, expBal, actBal))
+        return (transIdlist, acc2.name, expBal, "")
+
+    def reportCapacity(self, hosts):
+        print("capacity search trials:")
+        for trial in (self.trials or []):
+            print("  %s" % (trial.format()))
+        topology = "%d node(s): %s" % (len(hosts), ", ".join("%s:%d" % (n.host, n.port) for n in hosts))
+        if self.capacity is None:
+            print("no sustainable rate found for %s" % (topology))
+        else:
+            print("sustainable capacity %d transaction(s)/s for %d secs on %s" % (self.capacity, self.discoverWindow, topology))
+
     def on_exit(self):
+        for speed, stages in (self.latencies or {}).items():
+            stages.report("%d/s" % (speed))
         print("end of network stress tests")
 
@@ -148,6 +148,7 @@ try:
     if not cluster.waitOnClusterSync():
         errorExit("Cluster sync wait failed.")
 
+    cluster.reportInfoCacheStats()
     testSuccessful=True
 finally:
     if not testSuccessful and dumpErrorDetails:
@@ -0,0 +1,152 @@
+"""Leveled logging for the test harness.
+
+Indentation comes from spans the caller opens with Logger.span, tracked per thread, instead of the call
+stack depth. Messages are formatted only when their level is enabled. Output goes to a stream, directly or
+through a BufferedWriter thread, as indented text or as json lines with time, level, thread and span path.
+"""
+
+import atexit
+import contextlib
+import json
+import sys
+import threading
+import time
+
+Debug=10
+Info=20
+Warning=30
+Error=40
+
+LevelNames={Debug: "DEBUG", Info: "INFO", Warning: "WARNING", Error: "ERROR"}
+
+###########################################################################################
+class BufferedWriter(object):
+    """File like writer handing text to a background thread that writes it to stream every
+    flushInterval seconds, so logging threads only append to a list. Flushed and closed at exit."""
+
+    def __init__(self, stream, flushInterval=0.1):
+        self.stream=stream
+        self.flushInterval=flushInterval
+        self.__cond=threading.Condition()
+        self.__pending=[]
+        self.__queued=0
+        self.__written=0
+        self.__closed=False
+        self.__thread=threading.Thread(target=self.__run, name="log-writer")
+        self.__thread.daemon=True
+        self.__thread.start()
+        atexit.register(self.close)
+
+    def write(self, text):
+        with self.__cond:
+            if not self.__closed:
+                self.__pending.append(text)
+                self.__queued += 1
+                return
+        self.stream.write(text)
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                if not self.__pending and not self.__closed:
+                    self.__cond.wait(self.flushInterval)
+                pending=self.__pending
+                self.__pending=[]
+                closed=self.__closed
+            if pending:
+                self.stream.write("".join(pending))
+                self.stream.flush()
+            with self.__cond:
+                self.__written += len(pending)
+                self.__cond.notify_all()
+            if closed:
+                return
+
+    # Blocks until everything written so far reached the stream
+    def flush(self):
+        with self.__cond:
+            target=self.__queued
+            self.__cond.notify_all()
+            while self.__written < target and self.__thread.is_alive():
+                self.__cond.wait(self.flushInterval)
+
+    def close(self):
+        with self.__cond:
+            if self.__closed:
+                return
+            self.__closed=True
+            self.__cond.notify_all()
+        self.__thread.join()
+        self.stream.flush()
+
+###########################################################################################
+class Logger(object):
+    """Writes messages of level and above to stream, sys.stdout at the time of writing if None.
+    Text lines are indented by indent per open span of the calling thread. Thread safe."""
+
+    def __init__(self, stream=None, level=Info, jsonLines=False, indent="  "):
+        self.stream=stream
+        self.level=level
+        self.jsonLines=jsonLines
+        self.indent=indent
+        self.__local=threading.local()
+
+    def isEnabledFor(self, level):
+        return level >= self.level
+
+    def __getSpans(self):
+        spans=getattr(self.__local, "spans", None)
+        if spans is None:
+            spans=[]
+            self.__local.spans=spans
+        return spans
+
+    # Context manager nesting the calling thread's messages one level deeper. Logs name on entry.
+    @contextlib.contextmanager
+    def span(self, name, level=Info):
+        self.log(level, name)
+        spans=self.__getSpans()
+        spans.append(name)
+        try:
+            yield
+        finally:
+            spans.pop()
+
+    # Log msg % args at level. Formatting is skipped when level is disabled.
+    def log(self, level, msg, *args):
+        if level < self.level:
+            return
+        self.__emit(level, msg % args if args else msg)
+
+    def debug(self, msg, *args):
+        self.log(Debug, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(Info, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(Warning, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(Error, msg, *args)
+
+    # print() style logging of args at level, honoring print's sep, end, file and flush keywords
+    def print(self, level, args, kwargs):
+        if level < self.level:
+            return
+        text=kwargs.get("sep", " ").join(str(arg) for arg in args)
+        self.__emit(level, text, kwargs.get("end", "\n"), kwargs.get("file"))
+        if kwargs.get("flush"):
+            (kwargs.get("file") or self.stream or sys.stdout).flush()
+
+    def __emit(self, level, text, end="\n", stream=None):
+        spans=self.__getSpans()
+        if self.jsonLines:
+            line=json.dumps({"ts": time.time(), "level": LevelNames.get(level, level), "thread": threading.get_ident(),
+                             "threadName": threading.current_thread().name, "span": "/".join(spans), "msg": text}) + "\n"
+        else:
+            line=self.indent*len(spans) + text + end
+        (stream or self.stream or sys.stdout).write(line)
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
@@ -1,5 +1,6 @@
 import copy
 import decimal
+import math
 import subprocess
 import time
 import glob
@@ -8,6 +9,8 @@ import time
 import os
 import platform
 from collections import namedtuple
+from collections import OrderedDict
+from collections import deque
 import re
 import string
 import signal
@@ -18,6 +21,26 @@ import sys
 import random
 import io
 import json
+import http.client
+import socket
+import threading
+import asyncio
+import functools
+import contextlib
+import concurrent.futures
+import atexit
+
+import eosKeys
+import abiCodec
+import eosTransaction
+import cassette
+import testLog
+
+# optional: mongo driver, used for mongo_db_plugin queries instead of the mongo shell when available
+try:
+    import pymongo
+except ImportError:
+    pymongo=None
 
 ###########################################################################################
 class Utils:
@@ -35,12 +58,23 @@ class Utils:
     EosLauncherPath="programs/eosio-launcher/eosio-launcher"
     MongoPath="mongo"
 
+    # Harness logger, indents by open spans (Utils.log.span). Messages starting with "ERROR" or "WARNING"
+    #  log at that level.
+    log=testLog.Logger()
+
     @staticmethod
     def Print(*args, **kwargs):
-        stackDepth=len(inspect.stack())-2
-        str=' '*stackDepth
-        sys.stdout.write(str)
-        print(*args, **kwargs)
+        level=testLog.Info
+        if args and isinstance(args[0], str):
+            if args[0].startswith("ERROR"):
+                level=testLog.Error
+            elif args[0].startswith("WARNING"):
+                level=testLog.Warning
+        Utils.log.print(level, args, kwargs)
+
+    @staticmethod
+    def setLogger(logger):
+        Utils.log=logger
 
     SyncStrategy=namedtuple("ChainSyncStrategy", "name id arg")
 
@@ -51,13 +85,52 @@ class Utils:
     SigKillTag="kill"
     SigTermTag="term"
 
+    # Node transports: fork cleos per call or talk to the http_plugin endpoints directly
+    TransportCleosTag="cleos"
+    TransportHttpTag="http"
+
+    # Transaction confirmation policies (for waitForTransIdOnNode/waitForTransBlock). An int N (or "N-deep")
+    #  requires the including block to be at least N blocks below head.
+    ConfirmAcceptedTag="accepted"
+    ConfirmHeadBlockTag="in-head-block"
+    ConfirmIrreversibleTag="irreversible"
+
+    defaultConfirmation=ConfirmIrreversibleTag
+
     systemWaitTimeout=90
 
-    # mongoSyncTime: nodeos mongodb plugin seems to sync with a 10-15 seconds delay. This will inject
-    #  a wait period before the 2nd DB check (if first check fails)
+    # Budget in seconds of one external command (cleos, mongo shell). Inside a wait it is capped by the
+    #  wait's remaining time, but never below minCommandTimeout. Expiry kills the command's process group.
+    commandTimeout=60
+    minCommandTimeout=2
+    __commandScope=threading.local()
+
+    # Pre-generated key pool file used by Cluster.createAccountKeys (see eosKeys.KeyPool). Same seed, same
+    #  keys on every run. keyPoolPath None generates fresh random keys instead.
+    keyPoolPath="var/lib/keypool.bin"
+    keyPoolSeed="eosio-test"
+    keyPool=None
+
+    # Node get info cache lifetime as a fraction of the block interval, 0 disables caching
+    infoCacheTtlBlocks=0.25
+
+    # Polling schedule for wait* helpers. First poll interval is a fraction of the (observed) block
+    #  interval, growing by waitBackoffFactor per poll up to waitMaxBlocks block intervals.
+    blockInterval=0.5
+    waitBackoffFactor=1.6
+    waitMaxBlocks=4
+    waitMaxInterval=3
+
+    # mongoSyncTime: nodeos mongodb plugin seems to sync with a 10-15 seconds delay. Upper bound on the wait
+    #  for the DB to catch up with the chain before the 2nd DB check (if first check fails)
     mongoSyncTime=25
     amINoon=True
 
+    # cassette.Cassette recording or replaying external calls (http_plugin, cleos, mongo shell), None: live
+    cassette=None
+    # CallStats timing harness calls, None: not instrumented
+    callStats=None
+
     # Configure for the NOON branch
     @staticmethod
     def iAmNotNoon():
@@ -79,6 +152,144 @@ class Utils:
     def setSystemWaitTimeout(timeout):
         Utils.systemWaitTimeout=timeout
 
+    @staticmethod
+    def setCommandTimeout(timeout):
+        Utils.commandTimeout=timeout
+
+    # Timeout for an external command started now by the calling thread
+    @staticmethod
+    def getCommandTimeout():
+        deadline=getattr(Utils.__commandScope, "deadline", None)
+        if deadline is None:
+            return Utils.commandTimeout
+        return min(Utils.commandTimeout, max(deadline.remaining(), Utils.minCommandTimeout))
+
+    # Context manager capping the calling thread's external commands by deadline (Deadline)
+    @staticmethod
+    @contextlib.contextmanager
+    def commandDeadline(deadline):
+        previous=getattr(Utils.__commandScope, "deadline", None)
+        Utils.__commandScope.deadline=deadline
+        try:
+            yield
+        finally:
+            Utils.__commandScope.deadline=previous
+
+    # Run cmd (list) in its own process group, passing input (bytes) to stdin. Returns (return code,
+    #  stdout bytes, stderr bytes), stderr merged into stdout with mergeStderr. On timeout, default
+    #  getCommandTimeout(), or interruption the whole process group is killed. Raises CommandTimeout.
+    @staticmethod
+    def runCommand(cmd, input=None, mergeStderr=True, timeout=None):
+        if timeout is None:
+            timeout=Utils.getCommandTimeout()
+        popen=subprocess.Popen(cmd, stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT if mergeStderr else subprocess.PIPE,
+                               start_new_session=True)
+        try:
+            outs,errs=popen.communicate(input=input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            Utils.killProcessGroup(popen)
+            outs,errs=popen.communicate()
+            raise CommandTimeout(cmd, timeout, outs or b"")
+        except BaseException:
+            Utils.killProcessGroup(popen)
+            popen.wait()
+            raise
+        return (popen.returncode, outs, errs)
+
+    @staticmethod
+    def killProcessGroup(popen):
+        try:
+            os.killpg(popen.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @staticmethod
+    def setCassette(cassette):
+        Utils.cassette=cassette
+
+    # Instrument Node, WalletMgr and Cluster calls, external calls and wait sleeps with callStats. At exit
+    #  the per operation summary is printed and, with tracePath, a Chrome trace json file written.
+    @staticmethod
+    def setCallStats(callStats, tracePath=None):
+        Utils.callStats=callStats
+        for cls in (Node, WalletMgr, Cluster):
+            CallStats.instrument(cls)
+        def report():
+            Utils.Print(callStats.report())
+            if tracePath is not None:
+                callStats.writeTrace(tracePath)
+        atexit.register(report)
+
+    # Runs func(), the external call identified by key, directly or through the cassette. Exceptions of
+    #  errorTypes are part of the recorded answer.
+    @staticmethod
+    def runExternal(key, func, errorTypes=()):
+        if Utils.callStats is None:
+            return func() if Utils.cassette is None else Utils.cassette.call(key, func, errorTypes)
+        start=time.perf_counter()
+        answer=None
+        status=None
+        try:
+            answer=func() if Utils.cassette is None else Utils.cassette.call(key, func, errorTypes)
+            return answer
+        except Exception as ex:
+            status=CallStats.getStatus(ex)
+            raise
+        finally:
+            Utils.callStats.record(cassette.getOperation(key), CallStats.getTarget(key), start,
+                                   time.perf_counter()-start, status, CallStats.getSize(answer))
+
+    # time.sleep, recorded as a "sleep" operation when instrumented
+    @staticmethod
+    def sleep(seconds):
+        if Utils.callStats is None:
+            time.sleep(seconds)
+            return
+        start=time.perf_counter()
+        time.sleep(seconds)
+        Utils.callStats.record("sleep", None, start, time.perf_counter()-start)
+
+    @staticmethod
+    def setKeyPool(path, seed=None):
+        if Utils.keyPool is not None:
+            Utils.keyPool.close()
+            Utils.keyPool=None
+        Utils.keyPoolPath=path
+        if seed is not None:
+            Utils.keyPoolSeed=seed
+
+    # Returns shared key pool, None if disabled or unusable
+    @staticmethod
+    def getKeyPool():
+        if Utils.keyPool is None and Utils.keyPoolPath is not None:
+            try:
+                Utils.keyPool=eosKeys.KeyPool(Utils.keyPoolPath, Utils.keyPoolSeed)
+            except (OSError, ValueError) as ex:
+                Utils.Print("ERROR: Failed to open key pool %s, falling back to fresh keys. %s" % (Utils.keyPoolPath, ex))
+                Utils.keyPoolPath=None
+        return Utils.keyPool
+
+    @staticmethod
+    def setDefaultConfirmation(confirmation):
+        Utils.defaultConfirmation=Utils.getConfirmation(confirmation)
+
+    # Normalize confirmation policy. None/True map to the default; returns a Confirm*Tag or an int depth
+    @staticmethod
+    def getConfirmation(confirmation=None):
+        if confirmation is None or confirmation is True:
+            return Utils.defaultConfirmation
+        if isinstance(confirmation, int) and not isinstance(confirmation, bool):
+            if confirmation < 0:
+                raise ValueError("Unknown confirmation policy: %s" % (confirmation))
+            return confirmation
+        if confirmation in (Utils.ConfirmAcceptedTag, Utils.ConfirmHeadBlockTag, Utils.ConfirmIrreversibleTag):
+            return confirmation
+        m=re.match(r"^(\d+)-deep$", str(confirmation))
+        if m is None:
+            raise ValueError("Unknown confirmation policy: %s" % (confirmation))
+        return int(m.group(1))
+
     @staticmethod
     def getChainStrategies():
         chainSyncStrategies={}
@@ -95,16 +306,588 @@ class Utils:
         return chainSyncStrategies
 
     @staticmethod
-    def checkOutput(cmd):
+    def checkOutput(cmd, mergeStderr=True):
         assert(isinstance(cmd, list))
-        retStr=subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode("utf-8")
+        retStr=Utils.runExternal("cmd " + " ".join(cmd), lambda: Utils.__checkOutput(cmd, mergeStderr),
+                                 subprocess.CalledProcessError)
         return retStr
 
+    # subprocess.check_output, stderr merged into the output with mergeStderr, under the command timeout
+    @staticmethod
+    def __checkOutput(cmd, mergeStderr):
+        returncode,outs,_=Utils.runCommand(cmd, mergeStderr=mergeStderr)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, outs)
+        return outs.decode("utf-8")
+
+    # Yields sleep times for a polling loop until deadline expires. Starts at blockInterval/4, backs off
+    #  exponentially with jitter, never sleeps past the deadline.
+    @staticmethod
+    def pollIntervals(deadline, blockInterval=None):
+        if blockInterval is None:
+            blockInterval=Utils.blockInterval
+        interval=blockInterval/4
+        maxInterval=min(Utils.waitMaxInterval, blockInterval*Utils.waitMaxBlocks)
+        while not deadline.expired():
+            sleepTime=min(interval/2 + random.uniform(0, interval/2), deadline.remaining())
+            Utils.Debug and Utils.Print("cmd: sleep %.3f seconds, remaining time %d seconds" % (sleepTime, deadline.remaining()))
+            yield sleepTime
+            interval=min(interval*Utils.waitBackoffFactor, maxInterval)
+
+    # Poll predicate until it returns True or timeout (seconds or Deadline) expires. Predicate is
+    #  checked once more at the deadline. Returns False on timeout.
+    @staticmethod
+    def waitForTrue(predicate, timeout=None, blockInterval=None):
+        deadline=Deadline.of(timeout)
+        with Utils.commandDeadline(deadline):
+            for sleepTime in Utils.pollIntervals(deadline, blockInterval):
+                if predicate():
+                    return True
+                Utils.sleep(sleepTime)
+
+            return predicate()
+
+    # asyncio variant of waitForTrue, predicate is a coroutine function
+    @staticmethod
+    async def waitForTrueAsync(predicate, timeout=None, blockInterval=None):
+        deadline=Deadline.of(timeout)
+        for sleepTime in Utils.pollIntervals(deadline, blockInterval):
+            if await predicate():
+                return True
+            start=time.perf_counter()
+            await asyncio.sleep(sleepTime)
+            if Utils.callStats is not None:
+                Utils.callStats.record("sleep", None, start, time.perf_counter()-start)
+
+        return await predicate()
+
+    # Run coroutine (e.g. AsyncCluster/AsyncNode call) to completion on a private event loop
+    @staticmethod
+    def runAsync(coro):
+        loop=asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
     @staticmethod
     def errorExit(msg="", raw=False, errorCode=1):
         Utils.Print("ERROR:" if not raw else "", msg)
         exit(errorCode)
 
+###########################################################################################
+class Deadline(object):
+    """Absolute point on the monotonic clock. Passed in place of a timeout, nested waits share
+    one deadline instead of each restarting its own full timeout."""
+
+    def __init__(self, timeout):
+        self.expiry=time.monotonic()+timeout
+
+    # Deadline from a timeout in seconds, an existing Deadline, or None (Utils.systemWaitTimeout)
+    @staticmethod
+    def of(timeout=None):
+        if isinstance(timeout, Deadline):
+            return timeout
+        if timeout is None:
+            timeout=Utils.systemWaitTimeout
+        return Deadline(timeout)
+
+    def remaining(self):
+        return max(0, self.expiry-time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expiry
+
+###########################################################################################
+class CommandTimeout(subprocess.CalledProcessError):
+    """Raised when an external command outlived its timeout and its process group was killed. Existing
+    CalledProcessError handling treats it as a failed command, isinstance tells the two apart."""
+    def __init__(self, cmd, timeout, output=b""):
+        super().__init__(-signal.SIGKILL, cmd, output)
+        self.timeout=timeout
+
+    def __str__(self):
+        return "Command '%s' timed out after %.1f seconds" % (" ".join(self.cmd), self.timeout)
+
+    def __reduce__(self):
+        return (CommandTimeout, (self.cmd, self.timeout, self.output))
+
+###########################################################################################
+class HttpError(Exception):
+    """Raised on http_plugin call failure. Mirrors subprocess.CalledProcessError's output (bytes)
+    so callers can handle cleos and http failures the same way."""
+    def __init__(self, code, path, output):
+        self.code=code
+        self.path=path
+        self.output=output
+        super().__init__("%s returned %s: %s" % (path, code, output))
+
+    def __reduce__(self):
+        return (HttpError, (self.code, self.path, self.output))
+
+class HttpTimeout(HttpError):
+    """Raised when an http_plugin request got no response within its timeout. Existing HttpError handling
+    treats it as a failed call, isinstance tells it apart from a refused or dropped connection."""
+    def __init__(self, path, timeout):
+        super().__init__(None, path, ("timed out after %.1f seconds" % (timeout)).encode("utf-8"))
+        self.timeout=timeout
+
+    def __reduce__(self):
+        return (HttpTimeout, (self.path, self.timeout))
+
+###########################################################################################
+class HttpClient(object):
+    """JSON over HTTP client for the nodeos/walletd plugin APIs. Each thread keeps its own persistent
+    keep-alive connection, so repeated calls cost a round trip instead of a cleos fork+exec. Requests
+    time out after timeout seconds, Utils.getCommandTimeout() if None, like cleos calls, raising HttpTimeout."""
+
+    def __init__(self, host, port, timeout=None):
+        self.host=host
+        self.port=port
+        self.timeout=timeout
+        self.__local=threading.local()
+
+    def __connection(self):
+        conn=getattr(self.__local, "conn", None)
+        if conn is None:
+            conn=http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.__local.conn=conn
+            self.__local.used=False
+        return conn
+
+    def close(self):
+        conn=getattr(self.__local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.__local.conn=None
+
+    # POST body (json serializable object, pre-serialized json bytes or None) to path. Returns decoded json response.
+    #  A response that is not json raises HttpError, like a failed request.
+    def call(self, path, body=None):
+        if body is None:
+            payload=b""
+        elif isinstance(body, bytes):
+            payload=body
+        else:
+            payload=json.dumps(body).encode("utf-8")
+        if Utils.cassette is None and Utils.callStats is None:
+            data=self.__post(path, payload)
+        else:
+            key="http %s:%d%s %s" % (self.host, self.port, path, payload.decode("utf-8", "replace"))
+            data=Utils.runExternal(key, lambda: self.__post(path, payload), HttpError)
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            raise HttpError(None, path, b"invalid json response: " + data[:1024])
+
+    def __post(self, path, payload):
+        headers={"Content-Type": "application/json", "Connection": "keep-alive"}
+        timeout=self.timeout if self.timeout is not None else Utils.getCommandTimeout()
+        while True:
+            conn=self.__connection()
+            reused=self.__local.used
+            conn.timeout=timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("POST", path, payload, headers)
+                resp=conn.getresponse()
+                data=resp.read()
+                self.__local.used=True
+                break
+            except socket.timeout:
+                self.close()
+                # no retry, the node may still be processing the request
+                raise HttpTimeout(path, timeout)
+            except (http.client.HTTPException, ConnectionError, socket.error) as ex:
+                self.close()
+                # server may have dropped an idle keep-alive connection, retry once on a fresh one
+                if not reused:
+                    raise HttpError(None, path, str(ex).encode("utf-8"))
+
+        if resp.status < 200 or resp.status >= 300:
+            raise HttpError(resp.status, path, data)
+        return data
+
+###########################################################################################
+class MongoError(Exception):
+    """Raised on mongo driver query failure. Carries output (bytes) like subprocess.CalledProcessError."""
+    def __init__(self, output):
+        self.output=output
+        super().__init__(output.decode("utf-8"))
+
+    def __reduce__(self):
+        return (MongoError, (self.output,))
+
+###########################################################################################
+class MongoBackend(object):
+    """Native queries against the mongo_db_plugin database through a driver client (pymongo.MongoClient,
+    or an in-process stand-in with the same interface such as mongomock.MongoClient). Clients are pooled,
+    one per mongo endpoint, and shared by all nodes. Returns typed documents."""
+
+    __clients={}
+    __clientsLock=threading.Lock()
+
+    def __init__(self, client, dbName):
+        self.client=client
+        self.db=client[dbName]
+
+    # Returns backend using the pooled client for host:port, None if the driver is not installed
+    @staticmethod
+    def connect(host, port, dbName):
+        if pymongo is None:
+            return None
+        with MongoBackend.__clientsLock:
+            client=MongoBackend.__clients.get((host, port))
+            if client is None:
+                timeoutMs=int(Utils.commandTimeout*1000)
+                client=pymongo.MongoClient(host, port, connect=False, serverSelectionTimeoutMS=timeoutMs,
+                                           socketTimeoutMS=timeoutMs)
+                MongoBackend.__clients[(host, port)]=client
+        return MongoBackend(client, dbName)
+
+    # Run driver call, driver errors are raised as MongoError
+    @staticmethod
+    def __call(func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as ex:
+            if pymongo is not None and not isinstance(ex, pymongo.errors.PyMongoError):
+                raise
+            raise MongoError(str(ex).encode("utf-8"))
+
+    # sort: list of (key, direction) pairs
+    def findOne(self, collection, query, sort=None):
+        return MongoBackend.__call(self.db[collection].find_one, query, sort=sort)
+
+    def dropDatabase(self):
+        MongoBackend.__call(self.client.drop_database, self.db.name)
+
+###########################################################################################
+class MongoLagTracker(object):
+    """Collects mongo_db_plugin ingest lag samples: how many blocks the newest irreversible (pending:false)
+    Blocks document trailed the waited for block by, and how long it took to catch up."""
+
+    def __init__(self):
+        self.__lock=threading.Lock()
+        self.blockLags=[]
+        self.timeLags=[]
+        self.timeouts=0
+
+    # timeLag None means the DB did not catch up in time
+    def addSample(self, blockLag, timeLag):
+        with self.__lock:
+            self.blockLags.append(blockLag)
+            if timeLag is None:
+                self.timeouts += 1
+            else:
+                self.timeLags.append(timeLag)
+
+    @staticmethod
+    def __distribution(samples):
+        if len(samples) == 0:
+            return None
+        samples=sorted(samples)
+        pick=lambda pct: samples[min(len(samples)-1, int(len(samples)*pct/100))]
+        return {"min": samples[0], "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": samples[-1]}
+
+    def getStats(self):
+        with self.__lock:
+            return {"samples": len(self.blockLags), "timeouts": self.timeouts,
+                    "blocks": MongoLagTracker.__distribution(self.blockLags),
+                    "seconds": MongoLagTracker.__distribution(self.timeLags)}
+
+###########################################################################################
+class LatencyHistogram(object):
+    """HDR style histogram of latencies. Values are recorded in microseconds into log-linear buckets that
+    keep significantDigits decimal digits of precision at any magnitude, so memory stays small however
+    many samples are recorded. Histograms with the same precision merge by adding bucket counts, e.g.
+    per node histograms into a cluster wide one. Percentiles report the bucket's highest equivalent value."""
+
+    def __init__(self, significantDigits=2):
+        self.significantDigits=significantDigits
+        self.__subBucketBits=(2*10**significantDigits).bit_length()
+        self.__lock=threading.Lock()
+        self.__counts={}
+        self.count=0
+        self.min=None
+        self.max=None
+
+    def __bucket(self, micros):
+        shift=max(0, micros.bit_length()-self.__subBucketBits)
+        return (shift, micros >> shift)
+
+    # Record latency in seconds
+    def record(self, seconds):
+        micros=max(0, int(seconds*1000000))
+        bucket=self.__bucket(micros)
+        with self.__lock:
+            self.__counts[bucket]=self.__counts.get(bucket, 0) + 1
+            self.count += 1
+            if self.min is None or micros < self.min:
+                self.min=micros
+            if self.max is None or micros > self.max:
+                self.max=micros
+
+    def merge(self, other):
+        assert other.significantDigits == self.significantDigits
+        with other.__lock:
+            counts=dict(other.__counts)
+            otherCount, otherMin, otherMax=other.count, other.min, other.max
+        with self.__lock:
+            for bucket, count in counts.items():
+                self.__counts[bucket]=self.__counts.get(bucket, 0) + count
+            self.count += otherCount
+            if otherMin is not None and (self.min is None or otherMin < self.min):
+                self.min=otherMin
+            if otherMax is not None and (self.max is None or otherMax > self.max):
+                self.max=otherMax
+        return self
+
+    # Latency in seconds at percentile pct (0-100), None if empty
+    def getPercentile(self, pct):
+        with self.__lock:
+            if self.count == 0:
+                return None
+            target=max(1, int(math.ceil(self.count*pct/100.0)))
+            seen=0
+            for shift, subBucket in sorted(self.__counts):
+                seen += self.__counts[(shift, subBucket)]
+                if seen >= target:
+                    return min(self.max, ((subBucket+1) << shift)-1)/1000000.0
+        return self.max/1000000.0
+
+    def getStats(self, percentiles=(50, 90, 99, 99.9)):
+        stats={"count": self.count, "min": self.min/1000000.0 if self.min is not None else None,
+               "max": self.max/1000000.0 if self.max is not None else None}
+        for pct in percentiles:
+            stats["p%g" % (pct)]=self.getPercentile(pct)
+        return stats
+
+    def format(self, percentiles=(50, 90, 99, 99.9)):
+        if self.count == 0:
+            return "no samples"
+        stats=self.getStats(percentiles)
+        return "n=%d %s max %.3f s" % (self.count, " ".join("p%g %.3f" % (pct, stats["p%g" % (pct)]) for pct in percentiles),
+                                       stats["max"])
+
+###########################################################################################
+class CallStats(object):
+    """In memory aggregate of harness call timings: per operation count, failures, bytes returned and a
+    LatencyHistogram. Operations are methods ("Node.waitForTransIdOnNode"), external calls ("cmd cleos get
+    info", "http /v1/chain/get_info") and "sleep". Method times include the calls they make. With
+    maxTraceEvents > 0 every call is also kept as a Chrome trace event, see writeTrace."""
+
+    def __init__(self, maxTraceEvents=0):
+        self.maxTraceEvents=maxTraceEvents
+        self.startTime=time.perf_counter()
+        self.__lock=threading.Lock()
+        # op -> [histogram, total seconds, failures, bytes]
+        self.__ops={}
+        self.__events=[]
+        self.droppedEvents=0
+
+    # Record call of op on target (host:port or None) that began at perf_counter start. status is None on
+    #  success, otherwise exit status, http status or exception name.
+    def record(self, op, target, start, elapsed, status=None, nbytes=0):
+        with self.__lock:
+            entry=self.__ops.get(op)
+            if entry is None:
+                entry=[LatencyHistogram(), 0.0, 0, 0]
+                self.__ops[op]=entry
+            entry[1] += elapsed
+            if status is not None:
+                entry[2] += 1
+            entry[3] += nbytes
+            if self.maxTraceEvents > 0:
+                if len(self.__events) < self.maxTraceEvents:
+                    self.__events.append((op, target, start, elapsed, status, nbytes, threading.get_ident()))
+                else:
+                    self.droppedEvents += 1
+        entry[0].record(elapsed)
+
+    @staticmethod
+    def getStatus(ex):
+        status=getattr(ex, "returncode", None)
+        if status is None:
+            status=getattr(ex, "code", None)
+        return status if status is not None else type(ex).__name__
+
+    # host:port an external call key targets, from the url or the cleos --host/--port arguments
+    @staticmethod
+    def getTarget(key):
+        parts=key.split("\n", 1)[0].split()
+        if parts[0] == "http" and len(parts) > 1:
+            return parts[1][:parts[1].find("/")]
+        try:
+            return "%s:%s" % (parts[parts.index("--host")+1], parts[parts.index("--port")+1])
+        except (ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def getSize(answer):
+        if isinstance(answer, (str, bytes)):
+            return len(answer)
+        if isinstance(answer, tuple):
+            return sum(len(item) for item in answer if isinstance(item, (str, bytes)))
+        return 0
+
+    # Wrap public methods of cls, static methods included, to record "Class.method" calls with the
+    #  instance's host:port as target. Coroutine functions are left alone.
+    @staticmethod
+    def instrument(cls):
+        for name, attr in list(cls.__dict__.items()):
+            if name.startswith("_"):
+                continue
+            isStatic=isinstance(attr, staticmethod)
+            func=attr.__func__ if isStatic else attr
+            if not inspect.isfunction(func) or inspect.iscoroutinefunction(func) or hasattr(func, "callStatsOp"):
+                continue
+            wrapper=CallStats.__wrap(func, "%s.%s" % (cls.__name__, name), isStatic)
+            setattr(cls, name, staticmethod(wrapper) if isStatic else wrapper)
+
+    @staticmethod
+    def __wrap(func, op, isStatic):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            callStats=Utils.callStats
+            if callStats is None:
+                return func(*args, **kwargs)
+            target=None
+            if not isStatic and args:
+                host=getattr(args[0], "host", None)
+                target="%s:%s" % (host, getattr(args[0], "port", None)) if host is not None else None
+            start=time.perf_counter()
+            status=None
+            try:
+                return func(*args, **kwargs)
+            except Exception as ex:
+                status=CallStats.getStatus(ex)
+                raise
+            finally:
+                callStats.record(op, target, start, time.perf_counter()-start, status)
+        wrapper.callStatsOp=op
+        return wrapper
+
+    def getStats(self):
+        with self.__lock:
+            ops={op: list(entry) for op, entry in self.__ops.items()}
+        stats={}
+        for op, (histogram, total, failures, nbytes) in ops.items():
+            opStats=histogram.getStats((50, 99))
+            opStats.update({"total": total, "failures": failures, "bytes": nbytes})
+            stats[op]=opStats
+        return stats
+
+    def report(self):
+        wallTime=time.perf_counter()-self.startTime
+        stats=self.getStats()
+        lines=["Call timings over %.1f s wall time, method times include nested calls:" % (wallTime),
+               "%-48s %8s %10s %6s %9s %9s %8s %12s" % ("operation", "count", "total s", "wall%", "p50 s", "p99 s", "failed", "bytes")]
+        for op, opStats in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+            lines.append("%-48s %8d %10.3f %5.1f%% %9.4f %9.4f %8d %12d" % (
+                op[:48], opStats["count"], opStats["total"], 100.0*opStats["total"]/wallTime if wallTime > 0 else 0.0,
+                opStats["p50"], opStats["p99"], opStats["failures"], opStats["bytes"]))
+        if self.droppedEvents:
+            lines.append("%d trace events dropped past %d" % (self.droppedEvents, self.maxTraceEvents))
+        return "\n".join(lines)
+
+    # Write recorded calls as Chrome trace event json (chrome://tracing, Perfetto)
+    def writeTrace(self, path):
+        with self.__lock:
+            events=list(self.__events)
+        pid=os.getpid()
+        traceEvents=[]
+        for op, target, start, elapsed, status, nbytes, tid in events:
+            args={"bytes": nbytes}
+            if target is not None:
+                args["target"]=target
+            if status is not None:
+                args["status"]=status
+            traceEvents.append({"name": op, "cat": op.split(" ", 1)[0].split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+                                "ts": (start-self.startTime)*1000000, "dur": elapsed*1000000, "args": args})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, f)
+
+###########################################################################################
+class BlockCache(object):
+    """Bounded LRU cache of block json objects, indexed by block number and block id. Meant for
+    irreversible blocks only, which never change. Bounded by block count and by approximate size
+    (length of the json encoding). Cached objects are shared, callers must not modify them."""
+
+    def __init__(self, maxBlocks=10000, maxBytes=64*1024*1024):
+        self.maxBlocks=maxBlocks
+        self.maxBytes=maxBytes
+        self.__lock=threading.Lock()
+        self.__blocks=OrderedDict()
+        self.__ids={}
+        self.bytes=0
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+
+    # chain api blocks carry "id", mongo Blocks documents "block_id"
+    @staticmethod
+    def getBlockId(block):
+        return block.get("id", block.get("block_id"))
+
+    def get(self, blockNum):
+        with self.__lock:
+            entry=self.__blocks.get(blockNum)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__blocks.move_to_end(blockNum)
+            self.hits += 1
+            return entry[0]
+
+    def getById(self, blockId):
+        with self.__lock:
+            blockNum=self.__ids.get(blockId)
+            if blockNum is None:
+                self.misses += 1
+                return None
+            self.__blocks.move_to_end(blockNum)
+            self.hits += 1
+            return self.__blocks[blockNum][0]
+
+    def put(self, blockNum, block):
+        size=len(json.dumps(block, default=str))
+        if size > self.maxBytes:
+            return
+        blockId=BlockCache.getBlockId(block)
+        with self.__lock:
+            self.__remove(blockNum)
+            self.__blocks[blockNum]=(block, blockId, size)
+            if blockId is not None:
+                self.__ids[blockId]=blockNum
+            self.bytes += size
+            while len(self.__blocks) > self.maxBlocks or self.bytes > self.maxBytes:
+                oldestBlockNum=next(iter(self.__blocks))
+                self.__remove(oldestBlockNum)
+                self.evictions += 1
+
+    def __remove(self, blockNum):
+        entry=self.__blocks.pop(blockNum, None)
+        if entry is None:
+            return
+        block, blockId, size=entry
+        if blockId is not None:
+            self.__ids.pop(blockId, None)
+        self.bytes -= size
+
+    def clear(self):
+        with self.__lock:
+            self.__blocks.clear()
+            self.__ids.clear()
+            self.bytes=0
+
+    def getStats(self):
+        with self.__lock:
+            total=self.hits+self.misses
+            return {"blocks": len(self.__blocks), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hitRate": self.hits/total if total > 0 else 0.0}
+
 ###########################################################################################
 class Table(object):
     def __init__(self, name):
@@ -137,21 +920,53 @@ class Account(object):
 ###########################################################################################
 class Node(object):
 
-    def __init__(self, host, port, pid=None, cmd=None, alive=None, enableMongo=False, mongoHost="localhost", mongoPort=27017, mongoDb="EOStest"):
+    # mongoClient: mongo driver client to use for db queries (e.g. an in-process stand-in), defaults to a
+    #  pooled pymongo client if pymongo is installed, else queries go through the mongo shell
+    def __init__(self, host, port, pid=None, cmd=None, alive=None, enableMongo=False, mongoHost="localhost", mongoPort=27017, mongoDb="EOStest", transport=Utils.TransportCleosTag, mongoClient=None):
         self.host=host
         self.port=port
         self.pid=pid
         self.cmd=cmd
         self.alive=alive
         self.enableMongo=enableMongo
+        self.transport=transport
+        self.httpClient=HttpClient(host, port)
+        self.transWatcher=None
+        self.__transBuilder=None
+        self.blockInterval=None
+        self.__lastHeadBlock=None
+        # getTransBlockNum scan results of irreversible blocks: transaction id -> block num, and block num
+        #  -> transaction ids for at most maxScannedBlocks blocks, least recently scanned evicted first
+        self.maxScannedBlocks=10000
+        self.__transBlockLock=threading.Lock()
+        self.__transBlockNums={}
+        self.__scannedBlocks=OrderedDict()
+        self.__infoCond=threading.Condition()
+        self.__info=None
+        self.__infoTime=0
+        self.__infoEpoch=0
+        # get info request in flight: {"epoch": invalidation epoch at its start, "done": bool, "result": info}
+        self.__infoFlight=None
+        self.infoCacheHits=0
+        self.infoCacheCoalesced=0
+        self.infoCacheMisses=0
+        self.__irreversibleBlockNum=0
+        self.blockCache=BlockCache()
+        self.dbBlockCache=BlockCache()
         self.mongoSyncTime=None if Utils.mongoSyncTime < 1 else Utils.mongoSyncTime
         self.mongoHost=mongoHost
         self.mongoPort=mongoPort
         self.mongoDb=mongoDb
         self.endpointArgs="--host %s --port %d" % (self.host, self.port)
         self.mongoEndpointArgs=""
+        self.mongoBackend=None
+        self.mongoLag=MongoLagTracker()
         if self.enableMongo:
             self.mongoEndpointArgs += "--host %s --port %d %s" % (mongoHost, mongoPort, mongoDb)
+            if mongoClient is not None:
+                self.mongoBackend=MongoBackend(mongoClient, mongoDb)
+            else:
+                self.mongoBackend=MongoBackend.connect(mongoHost, mongoPort, mongoDb)
 
     def __str__(self):
         #return "Host: %s, Port:%d, Pid:%s, Alive:%s, Cmd:\"%s\"" % (self.host, self.port, self.pid, self.alive, self.cmd)
@@ -180,6 +995,15 @@ class Node(object):
         jsonData=json.loads(jStr)
         return jsonData
 
+    # Returns json object for either a cleos command or the matching http_plugin api call,
+    #  depending on node transport.
+    def __callReturnJson(self, cmd, apiPath, apiBody=None):
+        if self.transport == Utils.TransportHttpTag:
+            Utils.Debug and Utils.Print("http: %s %s" % (apiPath, json.dumps(apiBody)))
+            return self.httpClient.call(apiPath, apiBody)
+        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
+        return Node.runCmdReturnJson(cmd)
+
     @staticmethod
     def runCmdReturnStr(cmd, trace=False):
         retStr=Node.__checkOutput(cmd.split())
@@ -195,22 +1019,27 @@ class Node(object):
 
     @staticmethod
     def __checkOutput(cmd):
-        retStr=subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode("utf-8")
+        retStr=Utils.checkOutput(cmd)
         #retStr=subprocess.check_output(cmd).decode("utf-8")
         return retStr
 
 
     # Passes input to stdin, executes cmd. Returns tuple with return code(int),
-    #  stdout(byte stream) and stderr(byte stream).
+    #  stdout(byte stream) and stderr(byte stream). A command killed on timeout returns
+    #  CommandTimeout's return code and output.
     @staticmethod
     def stdinAndCheckOutput(cmd, subcommand):
+        return Utils.runExternal("stdin %s\n%s" % (" ".join(cmd), subcommand),
+                                 lambda: Node.__stdinAndCheckOutput(cmd, subcommand))
+
+    @staticmethod
+    def __stdinAndCheckOutput(cmd, subcommand):
         outs=None
         errs=None
         try:
-            popen=subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            outs,errs=popen.communicate(input=subcommand.encode("utf-8"))
-            ret=popen.wait()
+            ret,outs,errs=Utils.runCommand(cmd, input=subcommand.encode("utf-8"), mergeStderr=False)
         except subprocess.CalledProcessError as ex:
+            Utils.Print("ERROR: %s" % (ex))
             msg=ex.output
             return (ex.returncode, msg, None)
 
@@ -242,6 +1071,20 @@ class Node(object):
         jsonData=json.loads(jStr)
         return jsonData
 
+    # Find one document in collection, natively if a mongo backend is available, else by piping
+    #  subcommand into the mongo shell
+    def __queryDb(self, collection, query, subcommand, sort=None, trace=False):
+        if self.mongoBackend is not None:
+            Utils.Debug and Utils.Print("mongo: %s.findOne(%s, sort=%s)" % (collection, query, sort))
+            if Utils.cassette is None and Utils.callStats is None:
+                return self.mongoBackend.findOne(collection, query, sort)
+            return Utils.runExternal("mongo findOne %s %s %s sort=%s" % (self.mongoEndpointArgs, collection, query, sort),
+                                     lambda: self.mongoBackend.findOne(collection, query, sort), MongoError)
+
+        cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
+        Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
+        return Node.runMongoCmdReturnJson(cmd.split(), subcommand, trace)
+
     @staticmethod
     def getTransId(trans):
         #Utils.Print("%s" % trans)
@@ -255,28 +1098,61 @@ class Node(object):
     def setWalletEndpointArgs(self, args):
         self.endpointArgs="--host %s --port %d %s" % (self.host, self.port, args)
 
+    # True if blockNum is known to be irreversible. Only queries get info if blockNum is above the
+    #  highest last irreversible block number seen so far
+    def isBlockIrreversible(self, blockNum):
+        if blockNum <= self.__irreversibleBlockNum:
+            return True
+        info=self.getInfo(silentErrors=True)
+        if info is None:
+            return False
+        self.__irreversibleBlockNum=max(self.__irreversibleBlockNum, int(info["last_irreversible_block_num"]))
+        return blockNum <= self.__irreversibleBlockNum
+
+    # Block caches are keyed by int block number. Returns blockNum (int or decimal string) as int, None if
+    #  it is not a number, e.g. a block id.
+    @staticmethod
+    def __getBlockCacheKey(blockNum):
+        try:
+            return int(blockNum)
+        except (TypeError, ValueError):
+            return None
+
+    # Get block from the chain api, regardless of mongo configuration. Returns json object. Irreversible
+    #  blocks are served from self.blockCache.
+    def getChainBlock(self, blockNum, silentErrors=False):
+        cacheKey=Node.__getBlockCacheKey(blockNum)
+        block=self.blockCache.get(cacheKey) if cacheKey is not None else self.blockCache.getById(blockNum)
+        if block is not None:
+            return block
+        cmd="%s %s get block %s" % (Utils.EosClientPath, self.endpointArgs, blockNum)
+        try:
+            trans=self.__callReturnJson(cmd, "/v1/chain/get_block", {"block_num_or_id": str(blockNum)})
+            if self.isBlockIrreversible(int(trans["block_num"])):
+                self.blockCache.put(int(trans["block_num"]), trans)
+            return trans
+        except (subprocess.CalledProcessError, HttpError) as ex:
+            if not silentErrors:
+                msg=ex.output.decode("utf-8")
+                Utils.Print("ERROR: Exception during get block. %s" % (msg))
+            return None
+
     def getBlock(self, blockNum, retry=True, silentErrors=False):
         if not self.enableMongo:
-            cmd="%s %s get block %s" % (Utils.EosClientPath, self.endpointArgs, blockNum)
-            Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-            try:
-                trans=Node.runCmdReturnJson(cmd)
-                return trans
-            except subprocess.CalledProcessError as ex:
-                if not silentErrors:
-                    msg=ex.output.decode("utf-8")
-                    Utils.Print("ERROR: Exception during get block. %s" % (msg))
-                return None
+            return self.getChainBlock(blockNum, silentErrors)
         else:
+            cacheKey=Node.__getBlockCacheKey(blockNum)
+            block=self.dbBlockCache.get(cacheKey) if cacheKey is not None else None
+            if block is not None:
+                return block
             for i in range(2):
-                cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
                 subcommand='db.Blocks.findOne( { "block_num": %s } )' % (blockNum)
-                Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
                 try:
-                    trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand)
+                    trans=self.__queryDb("Blocks", {"block_num": blockNum}, subcommand)
                     if trans is not None:
+                        self.__cacheDbBlock(trans)
                         return trans
-                except subprocess.CalledProcessError as ex:
+                except (subprocess.CalledProcessError, MongoError) as ex:
                     if not silentErrors:
                         msg=ex.output.decode("utf-8")
                         Utils.Print("ERROR: Exception during get db node get block. %s" % (msg))
@@ -284,21 +1160,47 @@ class Node(object):
                 if not retry:
                     break
                 if self.mongoSyncTime is not None:
-                    Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                    time.sleep(self.mongoSyncTime)
+                    self.waitForDbSync(blockNum)
 
         return None
 
+    # Generator yielding (blockNum, block) for blockNum in range(start, end), in order. Blocks are fetched
+    #  (through getBlock) by up to maxWorkers concurrent requests, at most readAhead blocks ahead of the
+    #  consumer. block is None if the fetch failed.
+    def iterBlocks(self, start, end, retry=True, silentErrors=False, maxWorkers=8, readAhead=64):
+        assert readAhead >= maxWorkers
+        executor=concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers)
+        pending=deque()
+        nextBlockNum=start
+        try:
+            while nextBlockNum < end or len(pending) > 0:
+                while nextBlockNum < end and len(pending) < readAhead:
+                    pending.append((nextBlockNum, executor.submit(self.getBlock, nextBlockNum, retry, silentErrors)))
+                    nextBlockNum += 1
+                blockNum, future=pending.popleft()
+                yield (blockNum, future.result())
+        finally:
+            for blockNum, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    # Cache mongo Blocks document once the plugin has marked it irreversible
+    def __cacheDbBlock(self, block):
+        if block.get("pending") is False and "block_num" in block:
+            self.dbBlockCache.put(int(block["block_num"]), block)
+
     def getBlockById(self, blockId, retry=True, silentErrors=False):
+        block=self.dbBlockCache.getById(blockId)
+        if block is not None:
+            return block
         for i in range(2):
-            cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
             subcommand='db.Blocks.findOne( { "block_id": "%s" } )' % (blockId)
-            Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
             try:
-                trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand)
+                trans=self.__queryDb("Blocks", {"block_id": blockId}, subcommand)
                 if trans is not None:
+                    self.__cacheDbBlock(trans)
                     return trans
-            except subprocess.CalledProcessError as ex:
+            except (subprocess.CalledProcessError, MongoError) as ex:
                 if not silentErrors:
                     msg=ex.output.decode("utf-8")
                     Utils.Print("ERROR: Exception during db get block by id. %s" % (msg))
@@ -306,8 +1208,7 @@ class Node(object):
             if not retry:
                 break
             if self.mongoSyncTime is not None:
-                Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                time.sleep(self.mongoSyncTime)
+                self.waitForDbSync()
 
         return None
 
@@ -325,24 +1226,21 @@ class Node(object):
     def getTransaction(self, transId, retry=True, silentErrors=False):
         if not self.enableMongo:
             cmd="%s %s get transaction %s" % (Utils.EosClientPath, self.endpointArgs, transId)
-            Utils.Debug and Utils.Print("cmd: %s" % (cmd))
             try:
-                trans=Node.runCmdReturnJson(cmd)
+                trans=self.__callReturnJson(cmd, "/v1/account_history/get_transaction", {"transaction_id": transId})
                 return trans
-            except subprocess.CalledProcessError as ex:
+            except (subprocess.CalledProcessError, HttpError) as ex:
                 if not silentErrors:
                     msg=ex.output.decode("utf-8")
                     Utils.Print("ERROR: Exception during account by transaction retrieval. %s" % (msg))
                 return None
         else:
             for i in range(2):
-                cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
                 subcommand='db.Transactions.findOne( { $and : [ { "transaction_id": "%s" }, {"pending":false} ] } )' % (transId)
-                Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
                 try:
-                    trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand)
+                    trans=self.__queryDb("Transactions", {"transaction_id": transId, "pending": False}, subcommand)
                     return trans
-                except subprocess.CalledProcessError as ex:
+                except (subprocess.CalledProcessError, MongoError) as ex:
                     if not silentErrors:
                         msg=ex.output.decode("utf-8")
                         Utils.Print("ERROR: Exception during get db node get trans. %s" % (msg))
@@ -350,21 +1248,18 @@ class Node(object):
                 if not retry:
                     break
                 if self.mongoSyncTime is not None:
-                    Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                    time.sleep(self.mongoSyncTime)
+                    self.waitForDbSync()
 
         return None
 
     def getTransByBlockId(self, blockId, retry=True, silentErrors=False):
         for i in range(2):
-            cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
             subcommand='db.Transactions.find( { "block_id": "%s" } )' % (blockId)
-            Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
             try:
-                trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand, True)
+                trans=self.__queryDb("Transactions", {"block_id": blockId}, subcommand, trace=True)
                 if trans is not None:
                     return trans
-            except subprocess.CalledProcessError as ex:
+            except (subprocess.CalledProcessError, MongoError) as ex:
                 if not silentErrors:
                     msg=ex.output.decode("utf-8")
                     Utils.Print("ERROR: Exception during db get trans by blockId. %s" % (msg))
@@ -372,8 +1267,7 @@ class Node(object):
             if not retry:
                 break
             if self.mongoSyncTime is not None:
-                Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                time.sleep(self.mongoSyncTime)
+                self.waitForDbSync()
 
         return None
 
@@ -381,14 +1275,12 @@ class Node(object):
 
     def getActionFromDb(self, transId, retry=True, silentErrors=False):
         for i in range(2):
-            cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
             subcommand='db.Actions.findOne( { "transaction_id": "%s" } )' % (transId)
-            Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
             try:
-                trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand)
+                trans=self.__queryDb("Actions", {"transaction_id": transId}, subcommand)
                 if trans is not None:
                     return trans
-            except subprocess.CalledProcessError as ex:
+            except (subprocess.CalledProcessError, MongoError) as ex:
                 if not silentErrors:
                     msg=ex.output.decode("utf-8")
                     Utils.Print("ERROR: Exception during get db node get message. %s" % (msg))
@@ -396,21 +1288,18 @@ class Node(object):
             if not retry:
                 break
             if self.mongoSyncTime is not None:
-                Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                time.sleep(self.mongoSyncTime)
+                self.waitForDbSync()
 
         return None
 
     def getMessageFromDb(self, transId, retry=True, silentErrors=False):
         for i in range(2):
-            cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
             subcommand='db.Messages.findOne( { "transaction_id": "%s" } )' % (transId)
-            Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
             try:
-                trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand)
+                trans=self.__queryDb("Messages", {"transaction_id": transId}, subcommand)
                 if trans is not None:
                     return trans
-            except subprocess.CalledProcessError as ex:
+            except (subprocess.CalledProcessError, MongoError) as ex:
                 if not silentErrors:
                     msg=ex.output.decode("utf-8")
                     Utils.Print("ERROR: Exception during get db node get message. %s" % (msg))
@@ -418,24 +1307,86 @@ class Node(object):
             if not retry:
                 break
             if self.mongoSyncTime is not None:
-                Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                time.sleep(self.mongoSyncTime)
+                self.waitForDbSync()
 
         return None
 
-    def doesNodeHaveTransId(self, transId):
+    # Returns number of the block that included transaction, None if not found. trans is the node's
+    #  get transaction result, if already at hand
+    def getTransBlockNum(self, transId, trans=None):
+        with self.__transBlockLock:
+            blockNum=self.__transBlockNums.get(transId)
+        if blockNum is not None:
+            return blockNum
+        if self.transWatcher is not None:
+            blockNum=self.transWatcher.getInclusionBlockNum(transId, irreversibleOnly=True)
+            if blockNum is not None:
+                return blockNum
+
+        if trans is None:
+            trans=self.getTransaction(transId, silentErrors=True)
+            if trans is None:
+                return None
+
+        if self.enableMongo:
+            # block num is the leading 32 bits (big endian) of the block id
+            return int(trans["block_id"][:8], 16)
+
+        # account history does not report the block; scan forward from the reference block. The
+        #  transaction ids of scanned irreversible blocks are kept, so later lookups rarely fetch blocks.
+        #  Reversible blocks may still be replaced by a fork and are scanned again every time.
+        headBlockNum=self.getHeadBlockNum()
+        if headBlockNum is None:
+            return None
+        refBlockNum=int(trans["transaction"]["data"]["ref_block_num"])
+        refBlockNum=headBlockNum - ((headBlockNum - refBlockNum) & 0xffff)
+        for blockNum in range(max(refBlockNum, 1), headBlockNum+1):
+            with self.__transBlockLock:
+                if blockNum in self.__scannedBlocks:
+                    continue
+            block=self.getChainBlock(blockNum, silentErrors=True)
+            if block is None:
+                break
+            transIds=TransactionWatcher.getTransIdsFromBlock(block)
+            if self.isBlockIrreversible(blockNum):
+                self.__addScannedBlock(blockNum, transIds)
+            if transId in transIds:
+                return blockNum
+
+        with self.__transBlockLock:
+            return self.__transBlockNums.get(transId)
+
+    def __addScannedBlock(self, blockNum, transIds):
+        with self.__transBlockLock:
+            if blockNum in self.__scannedBlocks:
+                return
+            self.__scannedBlocks[blockNum]=transIds
+            for blockTransId in transIds:
+                self.__transBlockNums[blockTransId]=blockNum
+            while len(self.__scannedBlocks) > self.maxScannedBlocks:
+                evictedNum, evictedIds=self.__scannedBlocks.popitem(last=False)
+                for evictedId in evictedIds:
+                    if self.__transBlockNums.get(evictedId) == evictedNum:
+                        del self.__transBlockNums[evictedId]
+
+    # confirmation: see Utils.getConfirmation
+    def doesNodeHaveTransId(self, transId, confirmation=None):
+        confirmation=Utils.getConfirmation(confirmation)
         trans=self.getTransaction(transId, silentErrors=True)
         if trans is None:
             return False
+        if confirmation == Utils.ConfirmAcceptedTag:
+            return True
 
-        blockNum=None
-        if not self.enableMongo:
-            blockNum=int(trans["transaction"]["data"]["ref_block_num"])
-        else:
-            blockNum=int(trans["ref_block_num"])
+        blockNum=self.getTransBlockNum(transId, trans)
+        if blockNum is None:
+            return False
+        if confirmation == Utils.ConfirmIrreversibleTag:
+            return self.doesNodeHaveBlockNum(blockNum)
 
-        blockNum += 1
-        return self.doesNodeHaveBlockNum(blockNum)
+        depth=0 if confirmation == Utils.ConfirmHeadBlockTag else confirmation
+        headBlockNum=self.getHeadBlockNum()
+        return headBlockNum is not None and blockNum+depth <= headBlockNum
 
     def createInitAccounts(self, producers):
         """Initializes accounts. Requires eosio account. Creates init accounts and funds them."""
@@ -488,7 +1439,8 @@ class Node(object):
         return None
 
     # Create account and return creation transactions. Return transaction json object
-    # waitForTransBlock: wait on creation transaction id to appear in a block
+    # waitForTransBlock: wait on creation transaction id to appear in a block. True (default confirmation
+    #  policy) or a confirmation policy, see Utils.getConfirmation
     def createAccount(self, account, creatorAccount, stakedDeposit=1000, waitForTransBlock=False):
         cmd=None
         if Utils.amINoon:
@@ -509,70 +1461,82 @@ class Node(object):
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during account creation. %s" % (msg))
             return None
+        self.invalidateInfo()
 
-        if waitForTransBlock and not self.waitForTransIdOnNode(transId):
+        if waitForTransBlock and not self.waitForTransIdOnNode(transId, confirmation=waitForTransBlock):
             return None
 
         if stakedDeposit > 0:
             trans = self.transferFunds(creatorAccount, account, stakedDeposit, "init")
             transId=Node.getTransId(trans)
-            if waitForTransBlock and not self.waitForTransIdOnNode(transId):
+            if waitForTransBlock and not self.waitForTransIdOnNode(transId, confirmation=waitForTransBlock):
                 return None
         return trans
 
     def getEosAccount(self, name):
         cmd="%s %s get account %s" % (Utils.EosClientPath, self.endpointArgs, name)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnJson(cmd)
+            trans=self.__callReturnJson(cmd, "/v1/chain/get_account", {"account_name": name})
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during get account. %s" % (msg))
             return None
 
     def getEosAccountFromDb(self, name):
-        cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
         subcommand='db.Accounts.findOne({"name" : "%s"})' % (name)
-        Utils.Debug and Utils.Print("cmd: echo '%s' | %s" % (subcommand, cmd))
         try:
-            trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand)
+            trans=self.__queryDb("Accounts", {"name": name}, subcommand)
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, MongoError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during get account from db. %s" % (msg))
             return None
 
 
+    # Returns balance string formatted as cleos prints it
+    def __getCurrencyBalanceStr(self, cmd, contract, account, symbol):
+        if self.transport != Utils.TransportHttpTag:
+            Utils.Debug and Utils.Print("cmd: %s" % (cmd))
+            return Node.runCmdReturnStr(cmd)
+
+        body={"code": contract, "account": account, "symbol": symbol}
+        Utils.Debug and Utils.Print("http: %s %s" % ("/v1/chain/get_currency_balance", json.dumps(body)))
+        rows=self.httpClient.call("/v1/chain/get_currency_balance", body)
+        if not symbol:
+            return json.dumps(rows) + "\n"
+        return (json.dumps(rows[0]) + "\n") if len(rows) > 0 else ""
+
     def getEosCurrencyBalance(self, name):
         cmd="%s %s get currency balance eosio %s EOS" % (Utils.EosClientPath, self.endpointArgs, name)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnStr(cmd)
+            trans=self.__getCurrencyBalanceStr(cmd, "eosio", name, "EOS")
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during get EOS balance. %s" % (msg))
             return None
 
     def getCurrencyBalance(self, contract, account, symbol):
         cmd="%s %s get currency balance %s %s %s" % (Utils.EosClientPath, self.endpointArgs, contract, account, symbol)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnStr(cmd)
+            trans=self.__getCurrencyBalanceStr(cmd, contract, account, symbol)
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during get currency balance. %s" % (msg))
             return None
 
     def getCurrencyStats(self, contract, symbol=""):
         cmd="%s %s get currency stats %s %s" % (Utils.EosClientPath, self.endpointArgs, contract, symbol)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnJson(cmd)
+            trans=self.__callReturnJson(cmd, "/v1/chain/get_currency_stats", {"code": contract, "symbol": symbol})
+            if self.transport == Utils.TransportHttpTag and symbol:
+                if symbol not in trans:
+                    raise HttpError(None, "/v1/chain/get_currency_stats", ("symbol %s not found" % (symbol)).encode("utf-8"))
+                trans=trans[symbol]
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during get currency stats. %s" % (msg))
             return None
@@ -597,67 +1561,52 @@ class Node(object):
                         return None
                     return ret
                 if self.mongoSyncTime is not None:
-                    Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                    time.sleep(self.mongoSyncTime)
+                    self.waitForDbSync()
 
         return None
 
+    # timeout may be seconds or a Deadline shared with the caller
     def waitForBlockNumOnNode(self, blockNum, timeout=None):
-        if timeout is None:
-            timeout=Utils.systemWaitTimeout
-        startTime=time.time()
-        remainingTime=timeout
-        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (remainingTime))
-        while time.time()-startTime < timeout:
-            if self.doesNodeHaveBlockNum(blockNum):
-                return True
-            sleepTime=3 if remainingTime > 3 else (3 - remainingTime)
-            remainingTime -= sleepTime
-            Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (sleepTime))
-            time.sleep(sleepTime)
-
-        return False
-
-    def waitForTransIdOnNode(self, transId, timeout=None):
-        if timeout is None:
-            timeout=Utils.systemWaitTimeout
-        startTime=time.time()
-        remainingTime=timeout
-        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (remainingTime))
-        while time.time()-startTime < timeout:
-            if self.doesNodeHaveTransId(transId):
-                return True
-            sleepTime=3 if remainingTime > 3 else (3 - remainingTime)
-            remainingTime -= sleepTime
-            Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (sleepTime))
-            time.sleep(sleepTime)
-
-        return False
+        deadline=Deadline.of(timeout)
+        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (deadline.remaining()))
+        return Utils.waitForTrue(lambda: self.doesNodeHaveBlockNum(blockNum), deadline, self.getBlockInterval())
+
+    # confirmation: see Utils.getConfirmation
+    def waitForTransIdOnNode(self, transId, timeout=None, confirmation=None):
+        deadline=Deadline.of(timeout)
+        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (deadline.remaining()))
+        return Utils.waitForTrue(lambda: self.doesNodeHaveTransId(transId, confirmation), deadline,
+                                 self.getBlockInterval())
+
+    # Returns the node's TransactionWatcher, creating and starting it on first use
+    def getTransactionWatcher(self, startBlockNum=None):
+        if self.transWatcher is None:
+            self.transWatcher=TransactionWatcher(self, startBlockNum)
+            self.transWatcher.start()
+        return self.transWatcher
 
     def waitForNextBlock(self, timeout=None):
-        if timeout is None:
-            timeout=Utils.systemWaitTimeout
-        startTime=time.time()
-        remainingTime=timeout
-        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (remainingTime))
+        deadline=Deadline.of(timeout)
+        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (deadline.remaining()))
         num=self.getIrreversibleBlockNum()
         Utils.Debug and Utils.Print("Current block number: %s" % (num))
 
-        while time.time()-startTime < timeout:
+        def isNextBlock():
             nextNum=self.getIrreversibleBlockNum()
             if nextNum > num:
                 Utils.Debug and Utils.Print("Next block number: %s" % (nextNum))
                 return True
+            return False
 
-            sleepTime=.5 if remainingTime > .5 else (.5 - remainingTime)
-            remainingTime -= sleepTime
-            Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (sleepTime))
-            time.sleep(sleepTime)
-
-        return False
+        return Utils.waitForTrue(isNextBlock, deadline, self.getBlockInterval())
 
     # Trasfer funds. Returns "transfer" json return object
-    def transferFunds(self, source, destination, amount, memo="memo", force=False):
+    # signLocally: build and sign the transaction in process with source.activePrivateKey and push it over
+    #  http, instead of cleos and walletd. Falls back to cleos if the key is unknown.
+    def transferFunds(self, source, destination, amount, memo="memo", force=False, signLocally=False):
+        if signLocally and source.activePrivateKey is not None:
+            return self.__transferFundsLocally(source, destination, amount, memo, force)
+
         cmd="%s %s -v transfer %s %s %d" % (
             Utils.EosClientPath, self.endpointArgs, source.name, destination.name, amount)
         cmdArr=cmd.split()
@@ -669,12 +1618,23 @@ class Node(object):
         trans=None
         try:
             trans=Node.__runCmdArrReturnJson(cmdArr)
+            self.invalidateInfo()
             return trans
         except subprocess.CalledProcessError as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during funds transfer. %s" % (msg))
             return None
 
+    def __transferFundsLocally(self, source, destination, amount, memo, force):
+        builder=self.getTransactionBuilder()
+        try:
+            actions=[builder.createTransferAction(source, destination, amount, memo)]
+            contextFreeActions=[builder.createNonceAction()] if force else None
+            return builder.push(actions, [source.activePrivateKey], contextFreeActions)
+        except (abiCodec.AbiError, ValueError) as ex:
+            Utils.Print("ERROR: Exception during local funds transfer. %s" % (ex))
+            return None
+
     def validateSpreadFundsOnNode(self, adminAccount, accounts, expectedTotal):
         actualTotal=self.getAccountBalance(adminAccount.name)
         for account in accounts:
@@ -701,11 +1661,10 @@ class Node(object):
     # Gets accounts mapped to key. Returns json object
     def getAccountsByKey(self, key):
         cmd="%s %s get accounts %s" % (Utils.EosClientPath, self.endpointArgs, key)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnJson(cmd)
+            trans=self.__callReturnJson(cmd, "/v1/account_history/get_key_accounts", {"public_key": key})
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during accounts by key retrieval. %s" % (msg))
             return None
@@ -718,11 +1677,10 @@ class Node(object):
 
     def getServants(self, name):
         cmd="%s %s get servants %s" % (Utils.EosClientPath, self.endpointArgs, name)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnJson(cmd)
+            trans=self.__callReturnJson(cmd, "/v1/account_history/get_controlled_accounts", {"controlling_account": name})
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during servants retrieval. %s" % (msg))
             return None
@@ -740,9 +1698,7 @@ class Node(object):
             balance=int(decimal.Decimal(balanceStr[1:])*10000)
             return balance
         else:
-            if self.mongoSyncTime is not None:
-                Utils.Debug and Utils.Print("cmd: sleep %d seconds" % (self.mongoSyncTime))
-                time.sleep(self.mongoSyncTime)
+            self.waitForDbSync()
 
             account=self.getEosAccountFromDb(name)
             if account is not None:
@@ -756,11 +1712,10 @@ class Node(object):
     # transactions lookup by id. Returns json object
     def getTransactionsByAccount(self, name):
         cmd="%s %s get transactions %s" % (Utils.EosClientPath, self.endpointArgs, name)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnJson(cmd)
+            trans=self.__callReturnJson(cmd, "/v1/account_history/get_transactions", {"account_name": name})
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during transactions by account retrieval. %s" % (msg))
             return None
@@ -775,8 +1730,34 @@ class Node(object):
             transArr.append(id)
         return transArr
 
+    # Returns abi json object set on account, None if no abi or on failure
+    def getAccountAbi(self, account):
+        Utils.Debug and Utils.Print("http: /v1/chain/get_code %s" % (account))
+        try:
+            trans=self.httpClient.call("/v1/chain/get_code", {"account_name": account})
+            return trans.get("abi")
+        except HttpError as ex:
+            msg=ex.output.decode("utf-8")
+            Utils.Print("ERROR: Exception during get abi. %s" % (msg))
+            return None
+
+    # Returns transaction builder for signing transactions in process, shared by all callers on this node
+    def getTransactionBuilder(self):
+        if self.__transBuilder is None:
+            self.__transBuilder=eosTransaction.TransactionBuilder(self)
+        return self.__transBuilder
+
     def getAccountCodeHash(self, account):
         cmd="%s %s get code %s" % (Utils.EosClientPath, self.endpointArgs, account)
+        if self.transport == Utils.TransportHttpTag:
+            try:
+                trans=self.__callReturnJson(cmd, "/v1/chain/get_code", {"account_name": account})
+                return trans["code_hash"]
+            except HttpError as ex:
+                msg=ex.output.decode("utf-8")
+                Utils.Print("ERROR: Exception during code hash retrieval. %s" % (msg))
+                return None
+
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
             retStr=Utils.checkOutput(cmd.split())
@@ -818,12 +1799,13 @@ class Node(object):
                 # retMap["stderr"]=ex.stderr
                 return retMap
 
+        self.invalidateInfo()
         if shouldFail:
             Utils.Print("ERROR: The publish contract did not fail as expected.")
             return None
 
         transId=Node.getTransId(trans)
-        if waitForTransBlock and not self.waitForTransIdOnNode(transId):
+        if waitForTransBlock and not self.waitForTransIdOnNode(transId, confirmation=waitForTransBlock):
             return None
         return trans
 
@@ -838,19 +1820,21 @@ class Node(object):
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during producer creation. %s" % (msg))
             return None
+        self.invalidateInfo()
 
         transId=Node.getTransId(trans)
-        if waitForTransBlock and not self.waitForTransIdOnNode(transId):
+        if waitForTransBlock and not self.waitForTransIdOnNode(transId, confirmation=waitForTransBlock):
             return None
         return trans
 
     def getTable(self, account, contract, table):
         cmd="%s %s get table %s %s %s" % (Utils.EosClientPath, self.endpointArgs, account, contract, table)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
+        body={"json": True, "code": account, "scope": contract, "table": table, "table_key": "",
+              "lower_bound": "", "upper_bound": "", "limit": 10}
         try:
-            trans=Node.runCmdReturnJson(cmd)
+            trans=self.__callReturnJson(cmd, "/v1/chain/get_table_rows", body)
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, HttpError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during table retrieval. %s" % (msg))
             return None
@@ -894,6 +1878,7 @@ class Node(object):
         Utils.Debug and Utils.Print("cmd: %s" % (s))
         try:
             trans=Node.__runCmdArrReturnJson(cmdArr)
+            self.invalidateInfo()
             return (True, trans)
         except subprocess.CalledProcessError as ex:
             msg=ex.output.decode("utf-8")
@@ -901,6 +1886,56 @@ class Node(object):
                 Utils.Print("ERROR: Exception during push message. %s" % (msg))
             return (False, msg)
 
+    # Push packed transaction json object (signatures, compression, data), or its json bytes such as a
+    #  transCorpus record. Returns push result json object.
+    #  cleos has no command for pre-packed transactions so this always goes over http.
+    def pushTransaction(self, trans, silentErrors=False):
+        Utils.Debug and Utils.Print("http: /v1/chain/push_transaction")
+        try:
+            ret=self.httpClient.call("/v1/chain/push_transaction", trans)
+            self.invalidateInfo()
+            return ret
+        except HttpError as ex:
+            if not silentErrors:
+                msg=ex.output.decode("utf-8")
+                Utils.Print("ERROR: Exception during push transaction. %s" % (msg))
+            return None
+
+    # Push list of packed transactions in one call. Returns list of push results.
+    def pushTransactions(self, transArr, silentErrors=False):
+        Utils.Debug and Utils.Print("http: /v1/chain/push_transactions (%d)" % (len(transArr)))
+        try:
+            ret=self.httpClient.call("/v1/chain/push_transactions", transArr)
+            self.invalidateInfo()
+            return ret
+        except HttpError as ex:
+            if not silentErrors:
+                msg=ex.output.decode("utf-8")
+                Utils.Print("ERROR: Exception during push transactions. %s" % (msg))
+            return None
+
+    # Serialize action args via the contract abi on the node. Returns hex string of binary args.
+    def abiJsonToBin(self, code, action, args):
+        body={"code": code, "action": action, "args": args}
+        try:
+            trans=self.httpClient.call("/v1/chain/abi_json_to_bin", body)
+            return trans["binargs"]
+        except HttpError as ex:
+            msg=ex.output.decode("utf-8")
+            Utils.Print("ERROR: Exception during abi json to bin. %s" % (msg))
+            return None
+
+    # Deserialize hex string binary action args via the contract abi on the node. Returns json object.
+    def abiBinToJson(self, code, action, binargs):
+        body={"code": code, "action": action, "binargs": binargs}
+        try:
+            trans=self.httpClient.call("/v1/chain/abi_bin_to_json", body)
+            return trans["args"]
+        except HttpError as ex:
+            msg=ex.output.decode("utf-8")
+            Utils.Print("ERROR: Exception during abi bin to json. %s" % (msg))
+            return None
+
     def setPermission(self, account, code, pType, requirement, waitForTransBlock=False):
         cmd="%s %s set action permission %s %s %s %s" % (
             Utils.EosClientPath, self.endpointArgs, account, code, pType, requirement)
@@ -912,32 +1947,162 @@ class Node(object):
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during set permission. %s" % (msg))
             return None
+        self.invalidateInfo()
 
         transId=Node.getTransId(trans)
-        if waitForTransBlock and not self.waitForTransIdOnNode(transId):
+        if waitForTransBlock and not self.waitForTransIdOnNode(transId, confirmation=waitForTransBlock):
             return None
         return trans
 
+    # Get info, served from a short lived cache (see Utils.infoCacheTtlBlocks). Concurrent callers missing
+    #  the cache share a single in flight request. Every caller of a failed request gets None, and the error
+    #  printed unless silentErrors.
     def getInfo(self, silentErrors=False):
+        ttl=self.getBlockInterval()*Utils.infoCacheTtlBlocks
+        with self.__infoCond:
+            if self.__info is not None and time.monotonic()-self.__infoTime < ttl:
+                self.infoCacheHits += 1
+                return self.__info
+            # join a request in flight only if it started after the last invalidation
+            flight=self.__infoFlight
+            joined=flight is not None and flight["epoch"] == self.__infoEpoch
+            if joined:
+                while not flight["done"]:
+                    self.__infoCond.wait()
+                self.infoCacheCoalesced += 1
+                info, msg=flight["result"], flight["error"]
+            else:
+                flight={"epoch": self.__infoEpoch, "done": False, "result": None, "error": None}
+                self.__infoFlight=flight
+                self.infoCacheMisses += 1
+                info=None
+        if joined:
+            # the caller that started the request reports its failure only for itself
+            if msg is not None and not silentErrors:
+                Utils.Print("ERROR: Exception during get info. %s" % (msg))
+            return info
+
+        msg="get info did not complete"
+        try:
+            info, msg=self.__fetchInfo()
+        finally:
+            with self.__infoCond:
+                flight["result"]=info
+                flight["error"]=msg
+                flight["done"]=True
+                if self.__infoFlight is flight:
+                    self.__infoFlight=None
+                if info is not None and flight["epoch"] == self.__infoEpoch:
+                    self.__info=info
+                    self.__infoTime=time.monotonic()
+                self.__infoCond.notify_all()
+        if msg is not None and not silentErrors:
+            Utils.Print("ERROR: Exception during get info. %s" % (msg))
+        return info
+
+    # Returns (get info json object, None) or (None, error message)
+    def __fetchInfo(self):
         cmd="%s %s get info" % (Utils.EosClientPath, self.endpointArgs)
-        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            trans=Node.runCmdReturnJson(cmd)
-            return trans
-        except subprocess.CalledProcessError as ex:
-            if not silentErrors:
-                msg=ex.output.decode("utf-8")
-                Utils.Print("ERROR: Exception during get info. %s" % (msg))
+            trans=self.__callReturnJson(cmd, "/v1/chain/get_info")
+            self.__observeHeadBlock(trans)
+            return (trans, None)
+        except (subprocess.CalledProcessError, HttpError) as ex:
+            return (None, ex.output.decode("utf-8"))
+
+    # Drop cached get info, e.g. after a write. A request already in flight will not repopulate the cache,
+    #  and later callers do not join it.
+    def invalidateInfo(self):
+        with self.__infoCond:
+            self.__info=None
+            self.__infoEpoch += 1
+
+    # Returns get info cache counters
+    def getInfoCacheStats(self):
+        with self.__infoCond:
+            total=self.infoCacheHits+self.infoCacheCoalesced+self.infoCacheMisses
+            hitRate=(self.infoCacheHits+self.infoCacheCoalesced)/total if total > 0 else 0.0
+            return {"hits": self.infoCacheHits, "coalesced": self.infoCacheCoalesced,
+                    "misses": self.infoCacheMisses, "hitRate": hitRate}
+
+    # Estimate block interval from head block num/time pairs seen in get info
+    def __observeHeadBlock(self, info):
+        try:
+            headBlockNum=info["head_block_num"]
+            timeStr=info["head_block_time"]
+            fmt="%Y-%m-%dT%H:%M:%S.%f" if "." in timeStr else "%Y-%m-%dT%H:%M:%S"
+            headBlockTime=datetime.datetime.strptime(timeStr, fmt)
+        except (KeyError, TypeError, ValueError):
+            return
+
+        if self.__lastHeadBlock is not None:
+            lastBlockNum, lastBlockTime=self.__lastHeadBlock
+            if headBlockNum > lastBlockNum:
+                interval=(headBlockTime-lastBlockTime).total_seconds()/(headBlockNum-lastBlockNum)
+                if interval > 0:
+                    self.blockInterval=interval
+        self.__lastHeadBlock=(headBlockNum, headBlockTime)
+
+    # Observed block interval in seconds, Utils.blockInterval until enough blocks have been seen
+    def getBlockInterval(self):
+        return self.blockInterval if self.blockInterval is not None else Utils.blockInterval
+
+    # Returns block_num of the newest document in the mongo Blocks collection, None on failure
+    def getDbHeadBlockNum(self):
+        block=self.getBlockFromDb(-1)
+        if block is None:
             return None
+        return int(block["block_num"])
+
+    # Returns block_num of the newest irreversible (pending:false) document in the mongo Blocks collection,
+    #  None on failure. mongo_db_plugin clears pending and updates Accounts balances only once a block
+    #  becomes irreversible.
+    def getDbIrreversibleBlockNum(self):
+        subcommand="db.Blocks.find({\"pending\": false}).sort({\"_id\":-1}).limit(1).pretty()"
+        try:
+            block=self.__queryDb("Blocks", {"pending": False}, subcommand, sort=[("_id", -1)])
+        except (subprocess.CalledProcessError, MongoError) as ex:
+            msg=ex.output.decode("utf-8")
+            Utils.Print("ERROR: Exception during get db irreversible block. %s" % (msg))
+            return None
+        if block is None:
+            return None
+        return int(block["block_num"])
+
+    # Wait until mongo_db_plugin has made blockNum (default: current chain head) irreversible, so its
+    #  transactions and account balances are final in the db. The target is at least the chain's last
+    #  irreversible block. Waits at most timeout (default: mongoSyncTime) seconds. Ingest lag is recorded
+    #  in self.mongoLag. Returns True once caught up.
+    def waitForDbSync(self, blockNum=None, timeout=None):
+        info=self.getInfo(silentErrors=True)
+        if info is None:
+            return False
+        if blockNum is None:
+            blockNum=int(info["head_block_num"])
+        blockNum=max(int(blockNum), int(info["last_irreversible_block_num"]))
+        if timeout is None:
+            timeout=self.mongoSyncTime if self.mongoSyncTime is not None else 0
+
+        startTime=time.monotonic()
+        firstDbBlockNum=[]
+        def isSynced():
+            dbBlockNum=self.getDbIrreversibleBlockNum()
+            if len(firstDbBlockNum) == 0:
+                firstDbBlockNum.append(dbBlockNum)
+            return dbBlockNum is not None and dbBlockNum >= blockNum
+
+        Utils.Debug and Utils.Print("cmd: wait up to %d seconds for db to reach block %d" % (timeout, blockNum))
+        synced=Utils.waitForTrue(isSynced, timeout, self.getBlockInterval())
+        if firstDbBlockNum[0] is not None:
+            self.mongoLag.addSample(max(0, blockNum-firstDbBlockNum[0]), time.monotonic()-startTime if synced else None)
+        return synced
 
     def getBlockFromDb(self, idx):
-        cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
         subcommand="db.Blocks.find().sort({\"_id\":%d}).limit(1).pretty()" % (idx)
-        Utils.Debug and Utils.Print("cmd: echo \"%s\" | %s" % (subcommand, cmd))
         try:
-            trans=Node.runMongoCmdReturnJson(cmd.split(), subcommand)
+            trans=self.__queryDb("Blocks", {}, subcommand, sort=[("_id", idx)])
             return trans
-        except subprocess.CalledProcessError as ex:
+        except (subprocess.CalledProcessError, MongoError) as ex:
             msg=ex.output.decode("utf-8")
             Utils.Print("ERROR: Exception during get db block. %s" % (msg))
             return None
@@ -976,6 +2141,229 @@ class Node(object):
                 return blockNum
         return None
 
+###########################################################################################
+class TransactionWatcher(object):
+    """Follows blocks on a node as they are produced and resolves waiters registered on transaction ids.
+    One pass over the block stream serves any number of waiters, instead of each waiter polling the
+    node on its own. Waiters get a concurrent.futures.Future resolving to the including block number
+    (wrap with asyncio.wrap_future from coroutines) and/or a callback(transId, blockNum).
+
+    Only executed transactions count as included. Waiters resolve on the first block seen including the
+    transaction, which may still be forked out. Blocks above the last irreversible block are kept with
+    their ids and scanned again when a fork replaces them; inclusions in irreversible blocks are kept for
+    the last maxIncluded transactions."""
+
+    ExecutedStatus="executed"
+
+    def __init__(self, node, startBlockNum=None, pollInterval=0.25, maxIncluded=100000):
+        self.node=node
+        self.pollInterval=pollInterval
+        self.maxIncluded=maxIncluded
+        self.forks=0
+        self.__nextBlockNum=startBlockNum
+        self.__lock=threading.Lock()
+        self.__waiters={}
+        # transaction id -> block num, irreversible blocks only, oldest first
+        self.__included=OrderedDict()
+        # block num -> (block id, transaction ids) of processed blocks above the last irreversible block
+        self.__reversible=OrderedDict()
+        self.__reversibleIds={}
+        self.__irreversibleWaiters=[]
+        self.__lib=0
+        self.__stopEvent=threading.Event()
+        self.__thread=None
+
+    # Returns list of transaction ids included in the block json object. With executedOnly, receipts of
+    #  failed, expired or delayed transactions are skipped.
+    @staticmethod
+    def getTransIdsFromBlock(block, executedOnly=False):
+        transIds=[]
+        for region in block.get("regions", []):
+            for cycle in region.get("cycles_summary", []):
+                for shard in cycle:
+                    for receipt in shard.get("transactions", []):
+                        if executedOnly and receipt.get("status", TransactionWatcher.ExecutedStatus) != TransactionWatcher.ExecutedStatus:
+                            continue
+                        transIds.append(receipt["id"])
+        return transIds
+
+    # Start following blocks. Default start is the node's current head block
+    def start(self):
+        if self.__thread is not None:
+            return
+        if self.__nextBlockNum is None:
+            info=self.node.getInfo(silentErrors=True)
+            self.__nextBlockNum=info["head_block_num"] if info is not None else 1
+        self.__stopEvent.clear()
+        self.__thread=threading.Thread(target=self.__run, name="trans-watcher-%d" % (self.node.port))
+        self.__thread.daemon=True
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stopEvent.set()
+        self.__thread.join()
+        self.__thread=None
+
+    # Block number of next block to be processed
+    def getNextBlockNum(self):
+        return self.__nextBlockNum
+
+    # Returns number of the block which included transId, None if not seen yet. With irreversibleOnly,
+    #  inclusions in blocks above the last irreversible block are not reported.
+    def getInclusionBlockNum(self, transId, irreversibleOnly=False):
+        with self.__lock:
+            blockNum=self.__included.get(transId)
+            if blockNum is None and not irreversibleOnly:
+                blockNum=self.__reversibleIds.get(transId)
+            return blockNum
+
+    # Register interest in transId. Returns future resolving to the including block number
+    def watch(self, transId, callback=None):
+        future=concurrent.futures.Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: None if f.cancelled() else callback(transId, f.result()))
+        with self.__lock:
+            blockNum=self.__included.get(transId)
+            if blockNum is None:
+                blockNum=self.__reversibleIds.get(transId)
+            if blockNum is None:
+                self.__waiters.setdefault(transId, []).append(future)
+                return future
+
+        future.set_result(blockNum)
+        return future
+
+    # Drop a future registered by watch and cancel it, unless it is already being resolved
+    def unwatch(self, transId, future):
+        with self.__lock:
+            futures=self.__waiters.get(transId)
+            if futures is None or future not in futures:
+                return
+            futures.remove(future)
+            if not futures:
+                del self.__waiters[transId]
+        future.cancel()
+
+    # Register interest in transId becoming irreversible. Returns future resolving to the including block
+    #  number once the node's last irreversible block reaches it
+    def watchIrreversible(self, transId, callback=None):
+        future=concurrent.futures.Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: None if f.cancelled() else callback(transId, f.result()))
+        self.watch(transId, lambda transId, blockNum: self.__addIrreversibleWaiter(blockNum, future))
+        return future
+
+    def __addIrreversibleWaiter(self, blockNum, future):
+        with self.__lock:
+            if blockNum > self.__lib:
+                self.__irreversibleWaiters.append((blockNum, future))
+                return
+        future.set_result(blockNum)
+
+    def __processIrreversible(self, lib):
+        with self.__lock:
+            if lib <= self.__lib:
+                return
+            # make sure the blocks becoming irreversible are the ones processed, a fork may have replaced
+            #  them without a longer chain having been seen yet
+            promoted=[blockNum for blockNum in self.__reversible if blockNum <= lib]
+            lastId=self.__reversible[promoted[-1]][0] if promoted else None
+        if lastId is not None:
+            block=self.node.getChainBlock(promoted[-1], silentErrors=True)
+            if block is None:
+                return
+            if block["id"] != lastId:
+                self.__rollback()
+                return
+
+        with self.__lock:
+            self.__lib=lib
+            for blockNum in promoted:
+                blockId, transIds=self.__reversible.pop(blockNum)
+                for transId in transIds:
+                    self.__reversibleIds.pop(transId, None)
+                    self.__addIncluded(transId, blockNum)
+            resolved=[(blockNum, future) for blockNum, future in self.__irreversibleWaiters if blockNum <= lib]
+            if resolved:
+                self.__irreversibleWaiters=[(blockNum, future) for blockNum, future in self.__irreversibleWaiters if blockNum > lib]
+        for blockNum, future in resolved:
+            future.set_result(blockNum)
+
+    # Caller holds the lock
+    def __addIncluded(self, transId, blockNum):
+        self.__included[transId]=blockNum
+        while len(self.__included) > self.maxIncluded:
+            self.__included.popitem(last=False)
+
+    # A fork replaced processed reversible blocks: forget them all and scan again from the lowest
+    def __rollback(self):
+        with self.__lock:
+            if not self.__reversible:
+                return
+            self.forks += 1
+            self.__nextBlockNum=next(iter(self.__reversible))
+            self.__reversible.clear()
+            self.__reversibleIds.clear()
+        Utils.Debug and Utils.Print("Fork on node port %d, rescanning from block %d" % (self.node.port, self.__nextBlockNum))
+
+    # Wait on all transIds to appear in a block. Returns True if all were seen before timeout
+    def waitForTransIds(self, transIds, timeout=None):
+        deadline=Deadline.of(timeout)
+        watched=[(transId, self.watch(transId)) for transId in transIds]
+        done, notDone=concurrent.futures.wait([future for _, future in watched], timeout=deadline.remaining())
+        if len(notDone) > 0:
+            for transId, future in watched:
+                if future in notDone:
+                    self.unwatch(transId, future)
+            Utils.Print("ERROR: %d of %d transaction(s) not seen on node port %d." % (
+                len(notDone), len(watched), self.node.port))
+            return False
+        return True
+
+    # Returns False, without processing, if block does not extend the processed reversible blocks
+    def __processBlock(self, blockNum, block):
+        resolved=[]
+        with self.__lock:
+            previous=self.__reversible.get(blockNum-1)
+            if previous is not None and block.get("previous") != previous[0]:
+                return False
+            transIds=TransactionWatcher.getTransIdsFromBlock(block, executedOnly=True)
+            if blockNum <= self.__lib:
+                for transId in transIds:
+                    self.__addIncluded(transId, blockNum)
+            else:
+                self.__reversible[blockNum]=(block["id"], transIds)
+                for transId in transIds:
+                    self.__reversibleIds[transId]=blockNum
+            for transId in transIds:
+                futures=self.__waiters.pop(transId, None)
+                if futures is not None:
+                    resolved.append((blockNum, futures))
+
+        for blockNum, futures in resolved:
+            for future in futures:
+                future.set_result(blockNum)
+        return True
+
+    def __run(self):
+        while not self.__stopEvent.is_set():
+            info=self.node.getInfo(silentErrors=True)
+            headBlockNum=info["head_block_num"] if info is not None else 0
+            while self.__nextBlockNum <= headBlockNum and not self.__stopEvent.is_set():
+                block=self.node.getChainBlock(self.__nextBlockNum, silentErrors=True)
+                if block is None:
+                    break
+                if not self.__processBlock(self.__nextBlockNum, block):
+                    self.__rollback()
+                    continue
+                self.__nextBlockNum += 1
+            if info is not None:
+                self.__processIrreversible(info["last_irreversible_block_num"])
+
+            self.__stopEvent.wait(self.pollInterval)
+
 ###########################################################################################
 
 Wallet=namedtuple("Wallet", "name password host port")
@@ -995,6 +2383,8 @@ class WalletMgr(object):
         self.endpointArgs="--host %s --port %d" % (self.nodeosHost, self.nodeosPort)
         if self.walletd:
             self.endpointArgs += " --wallet-host %s --wallet-port %d" % (self.host, self.port)
+        # wallet_api_plugin lives in walletd, or in nodeos if there is no standalone walletd
+        self.httpClient=HttpClient(self.host, self.port) if self.walletd else HttpClient(self.nodeosHost, self.nodeosPort)
 
     def launch(self):
         if not self.walletd:
@@ -1009,7 +2399,7 @@ class WalletMgr(object):
             self.__walletPid=popen.pid
 
         # Give walletd time to warm up
-        time.sleep(1)
+        Utils.sleep(1)
         return True
 
     def create(self, name):
@@ -1020,7 +2410,7 @@ class WalletMgr(object):
         p = re.compile('\n\"(\w+)\"\n', re.MULTILINE)
         cmd="%s %s wallet create --name %s" % (Utils.EosClientPath, self.endpointArgs, name)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-        retStr=subprocess.check_output(cmd.split()).decode("utf-8")
+        retStr=Utils.checkOutput(cmd.split(), mergeStderr=False)
         #Utils.Print("create: %s" % (retStr))
         m=p.search(retStr)
         if m is None:
@@ -1038,7 +2428,7 @@ class WalletMgr(object):
             Utils.EosClientPath, self.endpointArgs, wallet.name, account.ownerPrivateKey)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
         try:
-            retStr=subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT).decode("utf-8")
+            retStr=Utils.checkOutput(cmd.split())
         except subprocess.CalledProcessError as ex:
             msg=ex.output.decode("utf-8")
             if warningMsg in msg:
@@ -1054,7 +2444,7 @@ class WalletMgr(object):
                 Utils.EosClientPath, self.endpointArgs, wallet.name, account.activePrivateKey)
             Utils.Debug and Utils.Print("cmd: %s" % (cmd))
             try:
-                retStr=subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT).decode("utf-8")
+                retStr=Utils.checkOutput(cmd.split())
             except subprocess.CalledProcessError as ex:
                 msg=ex.output.decode("utf-8")
                 if warningMsg in msg:
@@ -1066,10 +2456,50 @@ class WalletMgr(object):
 
         return True
 
+    # Import owner and active keys of accounts into wallet through the wallet api, up to maxWorkers calls
+    #  in flight. Each distinct key is imported once; keys already in the wallet count as imported.
+    #  Returns True if all keys are in the wallet.
+    def importKeys(self, accounts, wallet, maxWorkers=16):
+        keys=[]
+        seen=set()
+        for account in accounts:
+            if account.activePrivateKey is None:
+                Utils.Print("WARNING: Active private key is not defined for account \"%s\"" % (account.name))
+            for key in (account.ownerPrivateKey, account.activePrivateKey):
+                if key is not None and key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+
+        Utils.Debug and Utils.Print("http: /v1/wallet/import_key %d key(s) into wallet %s" % (len(keys), wallet.name))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            results=list(executor.map(lambda key: self.__importKeyHttp(key, wallet), keys))
+        return all(results)
+
+    def __importKeyHttp(self, key, wallet):
+        try:
+            self.httpClient.call("/v1/wallet/import_key", [wallet.name, key])
+            return True
+        except HttpError as ex:
+            msg=ex.output.decode("utf-8")
+            if "Key already in wallet" in msg:
+                Utils.Debug and Utils.Print("WARNING: This key is already imported into the wallet.")
+                return True
+            Utils.Print("ERROR: Failed to import key %s. %s" % (key, msg))
+            return False
+
+    # Return code of cleos command line cmd, None if it timed out
+    @staticmethod
+    def __callStatus(cmd):
+        try:
+            return Utils.runExternal("cmd " + cmd, lambda: Utils.runCommand(cmd.split())[0], CommandTimeout)
+        except CommandTimeout as ex:
+            Utils.Print("ERROR: %s" % (ex))
+            return None
+
     def lockWallet(self, wallet):
         cmd="%s %s wallet lock --name %s" % (Utils.EosClientPath, self.endpointArgs, wallet.name)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-        if 0 != subprocess.call(cmd.split(), stdout=Utils.FNull):
+        if 0 != WalletMgr.__callStatus(cmd):
             Utils.Print("ERROR: Failed to lock wallet %s." % (wallet.name))
             return False
 
@@ -1078,9 +2508,15 @@ class WalletMgr(object):
     def unlockWallet(self, wallet):
         cmd="%s %s wallet unlock --name %s" % (Utils.EosClientPath, self.endpointArgs, wallet.name)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-        popen=subprocess.Popen(cmd.split(), stdout=Utils.FNull, stdin=subprocess.PIPE)
-        outs, errs = popen.communicate(input=wallet.password.encode("utf-8"))
-        if 0 != popen.wait():
+        def unlock():
+            ret, outs, errs = Utils.runCommand(cmd.split(), input=wallet.password.encode("utf-8"), mergeStderr=False)
+            return (ret, errs)
+        try:
+            ret, errs = Utils.runExternal("stdin %s\n%s" % (cmd, wallet.password), unlock, CommandTimeout)
+        except CommandTimeout as ex:
+            Utils.Print("ERROR: Failed to unlock wallet %s: %s" % (wallet.name, ex))
+            return False
+        if 0 != ret:
             Utils.Print("ERROR: Failed to unlock wallet %s: %s" % (wallet.name, errs.decode("utf-8")))
             return False
 
@@ -1089,7 +2525,7 @@ class WalletMgr(object):
     def lockAllWallets(self):
         cmd="%s %s wallet lock_all" % (Utils.EosClientPath, self.endpointArgs)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-        if 0 != subprocess.call(cmd.split(), stdout=Utils.FNull):
+        if 0 != WalletMgr.__callStatus(cmd):
             Utils.Print("ERROR: Failed to lock all wallets.")
             return False
 
@@ -1101,7 +2537,7 @@ class WalletMgr(object):
         p = re.compile('\s+\"(\w+)\s\*\",?\n', re.MULTILINE)
         cmd="%s %s wallet list" % (Utils.EosClientPath, self.endpointArgs)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-        retStr=subprocess.check_output(cmd.split()).decode("utf-8")
+        retStr=Utils.checkOutput(cmd.split(), mergeStderr=False)
         #Utils.Print("retStr: %s" % (retStr))
         m=p.findall(retStr)
         if m is None:
@@ -1117,7 +2553,7 @@ class WalletMgr(object):
         p = re.compile('\n\s+\"(\w+)\"\n', re.MULTILINE)
         cmd="%s %s wallet keys" % (Utils.EosClientPath, self.endpointArgs)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-        retStr=subprocess.check_output(cmd.split()).decode("utf-8")
+        retStr=Utils.checkOutput(cmd.split(), mergeStderr=False)
         #Utils.Print("retStr: %s" % (retStr))
         m=p.findall(retStr)
         if m is None:
@@ -1127,6 +2563,17 @@ class WalletMgr(object):
 
         return keys
 
+    # Returns map of public key to private key for all unlocked wallets, as derived by the wallet
+    def getKeyPairs(self):
+        cmd="%s %s wallet keys" % (Utils.EosClientPath, self.endpointArgs)
+        Utils.Debug and Utils.Print("cmd: %s" % (cmd))
+        try:
+            retStr=Utils.checkOutput(cmd.split(), mergeStderr=False)
+            return dict(json.loads(retStr[retStr.find('['):]))
+        except (subprocess.CalledProcessError, ValueError) as ex:
+            Utils.Print("ERROR: Exception during wallet keys retrieval. %s" % (ex))
+            return None
+
 
     def dumpErrorDetails(self):
         Utils.Print("=================================================================")
@@ -1139,7 +2586,10 @@ class WalletMgr(object):
     def killall(self):
         cmd="pkill %s" % (Utils.EosWalletName)
         Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-        subprocess.call(cmd.split())
+        try:
+            Utils.runCommand(cmd.split())
+        except CommandTimeout as ex:
+            Utils.Print("ERROR: %s" % (ex))
 
     def cleanup(self):
         dataDir=WalletMgr.__walletDataDir
@@ -1157,7 +2607,9 @@ class Cluster(object):
 
 
     # walletd [True|False] Is walletd running. If not load the wallet plugin
-    def __init__(self, walletd=False, localCluster=True, host="localhost", port=8888, walletHost="localhost", walletPort=8899, enableMongo=False, mongoHost="localhost", mongoPort=27017, mongoDb="EOStest", initaPrvtKey=None, initbPrvtKey=None, staging=False):
+    # transport [Utils.TransportCleosTag|Utils.TransportHttpTag] How nodes talk to nodeos
+    # mongoClient Mongo driver client for db queries (e.g. mongomock.MongoClient()), see Node
+    def __init__(self, walletd=False, localCluster=True, host="localhost", port=8888, walletHost="localhost", walletPort=8899, enableMongo=False, mongoHost="localhost", mongoPort=27017, mongoDb="EOStest", initaPrvtKey=None, initbPrvtKey=None, staging=False, transport=Utils.TransportCleosTag, mongoClient=None):
         self.accounts={}
         self.nodes={}
         self.localCluster=localCluster
@@ -1181,6 +2633,8 @@ class Cluster(object):
             self.mongoUri="mongodb://%s:%d/%s" % (mongoHost, mongoPort, mongoDb)
             self.mongoEndpointArgs += "--host %s --port %d %s" % (mongoHost, mongoPort, mongoDb)
         self.staging=staging
+        self.transport=transport
+        self.mongoClient=mongoClient
         # init accounts
         self.initaAccount=Account("inita")
         self.initbAccount=Account("initb")
@@ -1231,6 +2685,11 @@ class Cluster(object):
             return False
 
         self.nodes=range(total_nodes) # placeholder for cleanup purposes only
+        return self.attach(total_nodes)
+
+    # Take over the total_nodes nodes of a launcher started cluster: processes from pgrep, keys from the
+    #  generated config files. Used after launch, and on replay where both come from the cassette.
+    def attach(self, total_nodes=1):
         nodes=self.discoverLocalNodes(total_nodes)
 
         if total_nodes != len(nodes):
@@ -1248,7 +2707,7 @@ class Cluster(object):
 
     # Initialize the default nodes (at present just the root node)
     def initializeNodes(self):
-        node=Node(self.host, self.port, enableMongo=self.enableMongo, mongoHost=self.mongoHost, mongoPort=self.mongoPort, mongoDb=self.mongoDb)
+        node=Node(self.host, self.port, enableMongo=self.enableMongo, mongoHost=self.mongoHost, mongoPort=self.mongoPort, mongoDb=self.mongoDb, transport=self.transport, mongoClient=self.mongoClient)
         node.setWalletEndpointArgs(self.walletEndpointArgs)
         Utils.Debug and Utils.Print("Node:", node)
 
@@ -1279,7 +2738,7 @@ class Cluster(object):
         for n in nArr:
             port=n["port"]
             host=n["host"]
-            node=Node(host, port)
+            node=Node(host, port, transport=self.transport)
             node.setWalletEndpointArgs(self.walletEndpointArgs)
             Utils.Debug and Utils.Print("Node:", node)
 
@@ -1296,16 +2755,14 @@ class Cluster(object):
     # If a last transaction exists wait for it on root node, then collect its head block number.
     #  Wait on this block number on each cluster node
     def waitOnClusterSync(self, timeout=None):
-        if timeout is None:
-            timeout=Utils.systemWaitTimeout
-        startTime=time.time()
-        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (timeout))
+        deadline=Deadline.of(timeout)
+        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (deadline.remaining()))
         if self.nodes[0].alive is False:
             Utils.Print("ERROR: Root node is down.")
             return False;
 
         if self.__lastTrans is not None:
-            if self.nodes[0].waitForTransIdOnNode(self.__lastTrans) is False:
+            if self.nodes[0].waitForTransIdOnNode(self.__lastTrans, deadline) is False:
                 Utils.Print("ERROR: Failed to wait for last known transaction(%s) on root node." %
                             (self.__lastTrans))
                 return False;
@@ -1315,77 +2772,39 @@ class Cluster(object):
         if targetHeadBlockNum == -1:
             return False
 
-        currentTimeout=timeout-(time.time()-startTime)
-        return self.waitOnClusterBlockNumSync(targetHeadBlockNum, currentTimeout)
+        return self.waitOnClusterBlockNumSync(targetHeadBlockNum, deadline)
 
     def waitOnClusterBlockNumSync(self, targetHeadBlockNum, timeout=None):
-        if timeout is None:
-            timeout=Utils.systemWaitTimeout
-        startTime=time.time()
-        remainingTime=timeout
-        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (remainingTime))
-        while time.time()-startTime < timeout:
-            synced=True
+        deadline=Deadline.of(timeout)
+        Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (deadline.remaining()))
+
+        def isSynced():
             for node in self.nodes:
                 if node.alive:
                     if node.doesNodeHaveBlockNum(targetHeadBlockNum) is False:
-                        synced=False
-                        break
-
-            if synced is True:
-                return True
-            #Utils.Debug and Utils.Print("Brief pause to allow nodes to catch up.")
-            sleepTime=3 if remainingTime > 3 else (3 - remainingTime)
-            remainingTime -= sleepTime
-            Utils.Debug and Utils.Print("cmd: remaining time %d seconds" % (remainingTime))
-            time.sleep(sleepTime)
+                        return False
+            return True
 
-        return False
+        return Utils.waitForTrue(isSynced, deadline, self.nodes[0].getBlockInterval())
 
+    # Create count accounts with random names and owner/active keys leased from the key pool (see
+    #  Utils.getKeyPool), or generated in-process if there is no pool
     @staticmethod
     def createAccountKeys(count):
+        keyPool=Utils.getKeyPool()
+        keys=keyPool.lease(2*count) if keyPool is not None else eosKeys.createKeys(2*count)
         accounts=[]
-        p = re.compile('Private key: (.+)\nPublic key: (.+)\n', re.MULTILINE)
         for i in range(0, count):
-            try:
-                cmd="%s create key" % (Utils.EosClientPath)
-                Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-                keyStr=subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT).decode("utf-8")
-                m=p.match(keyStr)
-                if m is None:
-                    Utils.Print("ERROR: Owner key creation regex mismatch")
-                    break
-
-                ownerPrivate=m.group(1)
-                ownerPublic=m.group(2)
-
-                cmd="%s create key" % (Utils.EosClientPath)
-                Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-                keyStr=subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT).decode("utf-8")
-                m=p.match(keyStr)
-                if m is None:
-                    Utils.Print("ERROR: Owner key creation regex mismatch")
-                    break
-
-                activePrivate=m.group(1)
-                activePublic=m.group(2)
-
-                name=''.join(random.choice(string.ascii_lowercase) for _ in range(5))
-                account=Account(name)
-                account.ownerPrivateKey=ownerPrivate
-                account.ownerPublicKey=ownerPublic
-                account.activePrivateKey=activePrivate
-                account.activePublicKey=activePublic
-                accounts.append(account)
+            ownerPrivate, ownerPublic=keys[2*i]
+            activePrivate, activePublic=keys[2*i+1]
 
-            except subprocess.CalledProcessError as ex:
-                msg=ex.output.decode("utf-8")
-                Utils.Print("ERROR: Exception during key creation. %s" % (msg))
-                break
-
-        if count != len(accounts):
-            Utils.Print("Account keys creation failed. Expected %d, actual: %d" % (count, len(accounts)))
-            return None
+            name=''.join(random.choice(string.ascii_lowercase) for _ in range(5))
+            account=Account(name)
+            account.ownerPrivateKey=ownerPrivate
+            account.ownerPublicKey=ownerPublic
+            account.activePrivateKey=activePrivate
+            account.activePublicKey=activePublic
+            accounts.append(account)
 
         return accounts
 
@@ -1403,20 +2822,10 @@ class Cluster(object):
                 Utils.Print("Account keys creation failed.")
                 return False
 
-        Utils.Print("Importing keys for account %s into wallet %s." % (self.initaAccount.name, wallet.name))
-        if not self.walletMgr.importKey(self.initaAccount, wallet):
-            Utils.Print("ERROR: Failed to import key for account %s" % (self.initaAccount.name))
-            return False
-
-        Utils.Print("Importing keys for account %s into wallet %s." % (self.initbAccount.name, wallet.name))
-        if not self.walletMgr.importKey(self.initbAccount, wallet):
-            Utils.Print("ERROR: Failed to import key for account %s" % (self.initbAccount.name))
-            return False
-
-        for account in accounts:
-            Utils.Print("Importing keys for account %s into wallet %s." % (account.name, wallet.name))
-            if not self.walletMgr.importKey(account, wallet):
-                Utils.Print("ERROR: Failed to import key for account %s" % (account.name))
+        importAccounts=[self.initaAccount, self.initbAccount] + (accounts if accounts is not None else [])
+        with Utils.log.span("Importing keys for %d accounts into wallet %s." % (len(importAccounts), wallet.name)):
+            if not self.walletMgr.importKeys(importAccounts, wallet):
+                Utils.Print("ERROR: Failed to import account keys into wallet %s" % (wallet.name))
                 return False
 
         self.accounts=accounts
@@ -1425,6 +2834,39 @@ class Cluster(object):
     def getNode(self, id=0):
         return self.nodes[id]
 
+    # id of the last transaction sent by spreadFunds, None if there is none
+    def getLastTransId(self):
+        return self.__lastTrans
+
+    # Print per node block cache counters
+    def reportBlockCacheStats(self):
+        for node in self.nodes:
+            for name, cache in (("chain", node.blockCache), ("db", node.dbBlockCache)):
+                stats=cache.getStats()
+                Utils.Print("Node port %d %s block cache: %d blocks, %d bytes, hits %d, misses %d, evictions %d, hit rate %.1f%%" % (
+                    node.port, name, stats["blocks"], stats["bytes"], stats["hits"], stats["misses"],
+                    stats["evictions"], stats["hitRate"]*100))
+
+    # Print per node mongo_db_plugin ingest lag distribution
+    def reportMongoLagStats(self):
+        for node in self.nodes:
+            stats=node.mongoLag.getStats()
+            if stats["samples"] == 0:
+                continue
+            Utils.Print("Node port %d mongo ingest lag: %d samples, %d timeouts" % (node.port, stats["samples"], stats["timeouts"]))
+            for unit in ("blocks", "seconds"):
+                dist=stats[unit]
+                if dist is not None:
+                    Utils.Print("    %s: min %.2f, p50 %.2f, p90 %.2f, p99 %.2f, max %.2f" % (
+                        unit, dist["min"], dist["p50"], dist["p90"], dist["p99"], dist["max"]))
+
+    # Print per node get info cache counters
+    def reportInfoCacheStats(self):
+        for node in self.nodes:
+            stats=node.getInfoCacheStats()
+            Utils.Print("Node port %d get info cache: hits %d, coalesced %d, misses %d, hit rate %.1f%%" % (
+                node.port, stats["hits"], stats["coalesced"], stats["misses"], stats["hitRate"]*100))
+
     def getNodes(self):
         return self.nodes
 
@@ -1435,6 +2877,10 @@ class Cluster(object):
         if len(self.accounts) == 0:
             return True
 
+        with Utils.log.span("Spread funds across %d accounts" % (len(self.accounts))):
+            return self.__spreadFunds(amount)
+
+    def __spreadFunds(self, amount):
         count=len(self.accounts)
         transferAmount=(count*amount)+amount
         node=self.nodes[0]
@@ -1476,8 +2922,8 @@ class Cluster(object):
             transferAmount -= amount
             fromm=account
             to=self.accounts[i+1] if i < (count-1) else self.initaAccount
-            Utils.Print("Transfer %d units from account %s to %s on eos server port %d." %
-                    (transferAmount, fromm.name, to.name, node.port))
+            Utils.log.info("Transfer %d units from account %s to %s on eos server port %d.",
+                           transferAmount, fromm.name, to.name, node.port)
 
             trans=node.transferFunds(fromm, to, transferAmount)
             transId=Node.getTransId(trans)
@@ -1521,10 +2967,10 @@ class Cluster(object):
 
         Utils.Print("Funds spread across all accounts")
 
-        Utils.Print("Validate funds.")
-        if False == self.validateSpreadFunds(initialFunds):
-            Utils.Print("ERROR: Failed to validate funds transfer across nodes.")
-            return False
+        with Utils.log.span("Validate funds."):
+            if False == self.validateSpreadFunds(initialFunds):
+                Utils.Print("ERROR: Failed to validate funds transfer across nodes.")
+                return False
 
         return True
 
@@ -1545,9 +2991,10 @@ class Cluster(object):
     def parseProducerKeys(configFile):
         """Parse config file. Returns dictionary with account name keys. Dictionary values are list containing the public/private keys"""
 
-        configStr=None
-        with open(configFile, 'r') as f:
-            configStr=f.read()
+        def readConfig():
+            with open(configFile, 'r') as f:
+                return f.read()
+        configStr=Utils.runExternal("file %s" % (configFile), readConfig)
 
         pattern="^\s*private-key\s*=\W+(\w+)\W+(\w+)\W+$"
         m=re.search(pattern, configStr, re.MULTILINE)
@@ -1625,7 +3072,7 @@ class Cluster(object):
 
             cmd="pgrep %s %s" % (pgrepOpts, Utils.EosServerName)
             Utils.Debug and Utils.Print("cmd: %s" % (cmd))
-            psOut=subprocess.check_output(cmd.split()).decode("utf-8")
+            psOut=Utils.checkOutput(cmd.split(), mergeStderr=False)
             #Utils.Print("psOut: <%s>" % psOut)
 
             for i in range(0, totalNodes):
@@ -1634,7 +3081,7 @@ class Cluster(object):
                 if m is None:
                     Utils.Print("ERROR: Failed to find %s pid. Pattern %s" % (Utils.EosServerName, pattern))
                     break
-                instance=Node(self.host, self.port + i, pid=int(m.group(1)), cmd=m.group(2), alive=True, enableMongo=self.enableMongo, mongoHost=self.mongoHost, mongoPort=self.mongoPort, mongoDb=self.mongoDb)
+                instance=Node(self.host, self.port + i, pid=int(m.group(1)), cmd=m.group(2), alive=True, enableMongo=self.enableMongo, mongoHost=self.mongoHost, mongoPort=self.mongoPort, mongoDb=self.mongoDb, transport=self.transport, mongoClient=self.mongoClient)
                 instance.setWalletEndpointArgs(self.walletEndpointArgs)
                 Utils.Debug and Utils.Print("Node:", instance)
                 nodes.append(instance)
@@ -1668,7 +3115,7 @@ class Cluster(object):
             if killedCount >= killCount:
                 break
 
-        time.sleep(1) # Give processes time to stand down
+        Utils.sleep(1) # Give processes time to stand down
         return self.updateNodesStatus()
 
     def relaunchEosInstances(self):
@@ -1731,8 +3178,6 @@ class Cluster(object):
                 pass
 
     def waitForNextBlock(self, timeout=None):
-        if timeout is None:
-            timeout=Utils.systemWaitTimeout
         node=self.nodes[0]
         return node.waitForNextBlock(timeout)
 
@@ -1743,6 +3188,16 @@ class Cluster(object):
             shutil.rmtree(f)
 
         if self.enableMongo:
+            backend=MongoBackend(self.mongoClient, self.mongoDb) if self.mongoClient is not None else \
+                MongoBackend.connect(self.mongoHost, self.mongoPort, self.mongoDb)
+            if backend is not None:
+                Utils.Debug and Utils.Print("mongo: dropDatabase %s" % (self.mongoDb))
+                try:
+                    backend.dropDatabase()
+                except MongoError as ex:
+                    Utils.Print("ERROR: Failed to drop database: %s" % (ex.output.decode("utf-8")))
+                return
+
             cmd="%s %s" % (Utils.MongoPath, self.mongoEndpointArgs)
             subcommand="db.dropDatabase()"
             Utils.Debug and Utils.Print("echo %s | %s" % (subcommand, cmd))
@@ -1769,10 +3224,184 @@ class Cluster(object):
         if waitForTransBlock and transId is not None:
             node=self.nodes[0]
             Utils.Debug and Utils.Print("Wait for transaction id %s on server port %d." % ( transId, node.port))
-            if node.waitForTransIdOnNode(transId) is False:
+            if node.waitForTransIdOnNode(transId, confirmation=waitForTransBlock) is False:
                 Utils.Print("ERROR: Failed waiting for transaction id %s on server port %d." % (
                     transId, node.port))
                 return False
 
         return True
 ###########################################################################################
+
+###########################################################################################
+class AsyncNode(object):
+    """asyncio variant of Node. Every Node method is available under the same name as a coroutine
+    returning the same value. Blocking calls (cleos or http) run on a shared thread pool so calls
+    against many nodes overlap; waits poll with asyncio.sleep instead of holding a thread."""
+    maxWorkers=64
+    __executor=None
+
+    def __init__(self, node):
+        self.node=node
+
+    def __str__(self):
+        return str(self.node)
+
+    @staticmethod
+    def getExecutor():
+        if AsyncNode.__executor is None:
+            AsyncNode.__executor=concurrent.futures.ThreadPoolExecutor(max_workers=AsyncNode.maxWorkers)
+        return AsyncNode.__executor
+
+    @staticmethod
+    async def runInExecutor(func, *args, **kwargs):
+        loop=asyncio.get_event_loop()
+        return await loop.run_in_executor(AsyncNode.getExecutor(), functools.partial(func, *args, **kwargs))
+
+    # runInExecutor with the command timeouts of func's cleos and http calls bounded by deadline, as
+    #  Utils.waitForTrue does. The deadline is set in the executor thread, thread locals do not carry over.
+    @staticmethod
+    async def runWithDeadline(deadline, func, *args, **kwargs):
+        def call():
+            with Utils.commandDeadline(deadline):
+                return func(*args, **kwargs)
+        return await AsyncNode.runInExecutor(call)
+
+    # Plain attributes pass through, Node methods become coroutines
+    def __getattr__(self, name):
+        attr=getattr(self.node, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await AsyncNode.runInExecutor(attr, *args, **kwargs)
+        return method
+
+    async def validateSpreadFundsOnNode(self, adminAccount, accounts, expectedTotal):
+        balances=await asyncio.gather(self.getAccountBalance(adminAccount.name),
+                                      *[self.getAccountBalance(account.name) for account in accounts])
+        actualTotal=balances[0]
+        for account, fund in zip(accounts, balances[1:]):
+            if fund != account.balance:
+                Utils.Print("ERROR: validateSpreadFunds> Expected: %d, actual: %d for account %s" %
+                        (account.balance, fund, account.name))
+                return False
+            actualTotal += fund
+
+        if actualTotal != expectedTotal:
+            Utils.Print("ERROR: validateSpreadFunds> Expected total: %d , actual: %d" % (
+                expectedTotal, actualTotal))
+            return False
+
+        return True
+
+    async def getSystemBalance(self, adminAccount, accounts):
+        balances=await asyncio.gather(self.getAccountBalance(adminAccount.name),
+                                      *[self.getAccountBalance(account.name) for account in accounts])
+        return sum(balances)
+
+    async def waitForBlockNumOnNode(self, blockNum, timeout=None):
+        deadline=Deadline.of(timeout)
+        return await Utils.waitForTrueAsync(
+            lambda: AsyncNode.runWithDeadline(deadline, self.node.doesNodeHaveBlockNum, blockNum), deadline,
+            self.node.getBlockInterval())
+
+    async def waitForTransIdOnNode(self, transId, timeout=None, confirmation=None):
+        deadline=Deadline.of(timeout)
+        return await Utils.waitForTrueAsync(
+            lambda: AsyncNode.runWithDeadline(deadline, self.node.doesNodeHaveTransId, transId, confirmation), deadline,
+            self.node.getBlockInterval())
+
+    async def waitForNextBlock(self, timeout=None):
+        deadline=Deadline.of(timeout)
+        num=await AsyncNode.runWithDeadline(deadline, self.node.getIrreversibleBlockNum)
+
+        async def isNextBlock():
+            nextNum=await AsyncNode.runWithDeadline(deadline, self.node.getIrreversibleBlockNum)
+            return nextNum > num
+
+        return await Utils.waitForTrueAsync(isNextBlock, deadline, self.node.getBlockInterval())
+
+###########################################################################################
+class AsyncCluster(object):
+    """asyncio variant of Cluster. Cluster-wide checks visit all nodes concurrently, so checking N
+    nodes costs about one node round trip. Other Cluster methods are exposed as coroutines under
+    the same name."""
+
+    def __init__(self, cluster):
+        self.cluster=cluster
+
+    def __getattr__(self, name):
+        attr=getattr(self.cluster, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await AsyncNode.runInExecutor(attr, *args, **kwargs)
+        return method
+
+    def getNode(self, id=0):
+        return AsyncNode(self.cluster.nodes[id])
+
+    def getNodes(self):
+        return [AsyncNode(node) for node in self.cluster.nodes]
+
+    async def updateNodesStatus(self):
+        await asyncio.gather(*[node.checkPulse() for node in self.getNodes()])
+
+    async def waitOnClusterSync(self, timeout=None):
+        deadline=Deadline.of(timeout)
+        rootNode=self.getNode(0)
+        if rootNode.alive is False:
+            Utils.Print("ERROR: Root node is down.")
+            return False
+
+        lastTrans=self.cluster.getLastTransId()
+        if lastTrans is not None:
+            if await rootNode.waitForTransIdOnNode(lastTrans, deadline) is False:
+                Utils.Print("ERROR: Failed to wait for last known transaction(%s) on root node." % (lastTrans))
+                return False
+
+        targetHeadBlockNum=await AsyncNode.runWithDeadline(deadline, rootNode.node.getHeadBlockNum)
+        Utils.Debug and Utils.Print("Head block number on root node: %d" % (targetHeadBlockNum))
+        if targetHeadBlockNum == -1:
+            return False
+
+        return await self.waitOnClusterBlockNumSync(targetHeadBlockNum, deadline)
+
+    async def waitOnClusterBlockNumSync(self, targetHeadBlockNum, timeout=None):
+        deadline=Deadline.of(timeout)
+        nodes=[node for node in self.getNodes() if node.alive]
+        results=await asyncio.gather(*[node.waitForBlockNumOnNode(targetHeadBlockNum, deadline) for node in nodes])
+        return all(results)
+
+    async def validateSpreadFunds(self, expectedTotal):
+        nodes=[node for node in self.getNodes() if node.alive]
+        results=await asyncio.gather(*[node.validateSpreadFundsOnNode(self.cluster.initaAccount, self.cluster.accounts, expectedTotal) for node in nodes])
+        for node, result in zip(nodes, results):
+            if result is False:
+                Utils.Print("ERROR: Failed to validate funds on eos node port: %d" % (node.port))
+                return False
+
+        return True
+
+    async def spreadFundsAndValidate(self, amount=1):
+        Utils.Debug and Utils.Print("Get system balance.")
+        initialFunds=await self.getNode(0).getSystemBalance(self.cluster.initaAccount, self.cluster.accounts)
+        Utils.Debug and Utils.Print("Initial system balance: %d" % (initialFunds))
+
+        if False == await self.spreadFunds(amount):
+            Utils.Print("ERROR: Failed to spread funds across nodes.")
+            return False
+
+        Utils.Print("Funds spread across all accounts")
+
+        Utils.Print("Validate funds.")
+        if False == await self.validateSpreadFunds(initialFunds):
+            Utils.Print("ERROR: Failed to validate funds transfer across nodes.")
+            return False
+
+        return True
+
+    async def waitForNextBlock(self, timeout=None):
+        return await self.getNode(0).waitForNextBlock(timeout)
+###########################################################################################
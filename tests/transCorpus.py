@@ -0,0 +1,185 @@
+"""Pre-signed transaction corpus: generate once across a process pool, replay many times.
+
+A corpus file holds N signed transactions ready for push_transaction, so a load run only pays for sending.
+Layout: header (magic, record count, index offset), then records of u32 length + payload, then the index
+of u64 record offsets. Payload is the 32 byte transaction id followed by the push_transaction json body.
+"""
+
+import json
+import mmap
+import multiprocessing
+import struct
+
+import abiCodec
+import eosTransaction
+
+Magic=b"EOSTXC01"
+_headerLayout=struct.Struct("<8sQQ")
+_lengthLayout=struct.Struct("<I")
+_idSize=32
+
+# Corpus transactions must still be valid when replayed later; nodeos caps expiration at one hour by default
+DefaultExpirationSeconds=3000
+
+###########################################################################################
+def _formatArgs(template, values):
+    if isinstance(template, str):
+        return template.format(**values)
+    if isinstance(template, dict):
+        return dict((k, _formatArgs(v, values)) for k, v in template.items())
+    if isinstance(template, list):
+        return [_formatArgs(v, values) for v in template]
+    return template
+
+# Worker: builds and signs transactions [start, start+count). Returns list of (id bytes, body bytes).
+def _generateChunk(args):
+    (start, count, accounts, reference, chainId, systemAbi, actionSpec, amount, memo, unique)=args
+    builder=eosTransaction.TransactionBuilder(None, chainId)
+    builder.setCodec(eosTransaction.SystemAccount, abiCodec.AbiCodec(systemAbi))
+    if actionSpec is not None:
+        builder.setCodec(actionSpec["code"], abiCodec.AbiCodec(actionSpec["abi"]))
+
+    records=[]
+    for seq in range(start, start+count):
+        sender, senderKey=accounts[seq % len(accounts)]
+        receiver=accounts[(seq+1) % len(accounts)][0]
+        values={"seq": seq, "sender": sender, "receiver": receiver}
+        if actionSpec is None:
+            args={"from": sender, "to": receiver, "memo": _formatArgs(memo, values),
+                  "quantity": abiCodec.intsToAsset(amount, abiCodec.symbolToInt(eosTransaction.CoreSymbol))}
+            action=builder.createAction(eosTransaction.SystemAccount, "transfer", args, [(sender, eosTransaction.ActivePermission)])
+        else:
+            action=builder.createAction(actionSpec["code"], actionSpec["action"], _formatArgs(actionSpec["args"], values),
+                                        [(sender, eosTransaction.ActivePermission)])
+        contextFreeActions=None
+        if unique:
+            contextFreeActions=[builder.createAction(eosTransaction.SystemAccount, "nonce", {"value": "corpus %d" % (seq)}, [])]
+        transId, trans=builder.build([action], [senderKey], contextFreeActions, reference)
+        records.append((bytes.fromhex(transId), json.dumps(trans).encode("utf-8")))
+    return records
+
+def generateCorpus(path, accounts, count, reference, systemAbi, chainId=eosTransaction.ZeroChainId, actionSpec=None,
+                   amount=1, memo="corpus {seq}", unique=False, processes=None, chunkSize=256):
+    """Writes count signed transactions to corpus file path. Returns number written.
+
+    accounts: testUtils.Account objects with activePrivateKey; transaction seq is sent by accounts[seq % n]
+     to accounts[(seq+1) % n].
+    reference: (expiration, ref_block_num, ref_block_prefix), e.g. from TransactionBuilder.getReference()
+     with expirationSeconds=DefaultExpirationSeconds.
+    systemAbi: eosio account abi json object (Node.getAccountAbi("eosio")).
+    actionSpec: None for core token transfers of amount, else {"code", "action", "args", "abi"} where string
+     values in args are formatted with {seq}, {sender} and {receiver}.
+    unique: add a context free nonce action, for actions that would otherwise repeat.
+    """
+    accounts=[(account.name, account.activePrivateKey) for account in accounts]
+    chunks=[]
+    for start in range(0, count, chunkSize):
+        chunks.append((start, min(chunkSize, count-start), accounts, reference, chainId, systemAbi,
+                       actionSpec, amount, memo, unique))
+
+    processes=processes or multiprocessing.cpu_count()
+    processes=min(processes, len(chunks))
+    offsets=[]
+    with open(path, "wb") as f:
+        f.write(_headerLayout.pack(Magic, 0, 0))
+        def writeChunk(records):
+            for transId, body in records:
+                offsets.append(f.tell())
+                f.write(_lengthLayout.pack(len(transId)+len(body)))
+                f.write(transId)
+                f.write(body)
+
+        if processes <= 1:
+            for chunk in chunks:
+                writeChunk(_generateChunk(chunk))
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                for records in pool.imap(_generateChunk, chunks):
+                    writeChunk(records)
+
+        indexOffset=f.tell()
+        f.write(struct.pack("<%dQ" % (len(offsets)), *offsets))
+        f.seek(0)
+        f.write(_headerLayout.pack(Magic, len(offsets), indexOffset))
+    return len(offsets)
+
+###########################################################################################
+class TransCorpus(object):
+    """Read side of a corpus file, memory mapped. corpus[i] returns (transaction id, push_transaction body
+    bytes); the body can go to HttpClient.call as is."""
+
+    def __init__(self, path):
+        self.path=path
+        self.__file=open(path, "rb")
+        self.__mmap=mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, indexOffset=_headerLayout.unpack_from(self.__mmap, 0)
+        if magic != Magic:
+            self.close()
+            raise ValueError("Not a transaction corpus: %s" % (path))
+        self.__offsets=struct.unpack_from("<%dQ" % (self.count), self.__mmap, indexOffset)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        offset=self.__offsets[index]
+        length=_lengthLayout.unpack_from(self.__mmap, offset)[0]
+        start=offset+_lengthLayout.size
+        transId=self.__mmap[start:start+_idSize].hex()
+        return (transId, self.__mmap[start+_idSize:start+length])
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    # Returns push_transaction json object for record index
+    def getTrans(self, index):
+        return json.loads(self[index][1].decode("utf-8"))
+
+    def close(self):
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__mmap=None
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import testUtils
+
+    parser=argparse.ArgumentParser(description="Generate a pre-signed transaction corpus against a running node")
+    parser.add_argument("--host", type=str, help="nodeos host", default="localhost")
+    parser.add_argument("--port", type=int, help="nodeos http port", default=8888)
+    parser.add_argument("--account", type=str, action="append", required=True,
+                        help="name=WIF active private key of a sending account, repeat for more accounts")
+    parser.add_argument("--count", type=int, help="Number of transactions", default=10000)
+    parser.add_argument("--amount", type=int, help="Transfer amount in core token units", default=1)
+    parser.add_argument("--output", type=str, help="Corpus file", default="trans-corpus.bin")
+    parser.add_argument("--processes", type=int, help="Worker processes, default cpu count", default=None)
+    parser.add_argument("--expiration", type=int, help="Expiration seconds past head block time", default=DefaultExpirationSeconds)
+    args=parser.parse_args()
+
+    accounts=[]
+    for spec in args.account:
+        name, wif=spec.split("=", 1)
+        account=testUtils.Account(name)
+        account.activePrivateKey=wif
+        accounts.append(account)
+
+    node=testUtils.Node(args.host, args.port, transport=testUtils.Utils.TransportHttpTag)
+    builder=eosTransaction.TransactionBuilder(node, expirationSeconds=args.expiration)
+    reference=builder.getReference()
+    systemAbi=node.getAccountAbi(eosTransaction.SystemAccount)
+    if reference is None or systemAbi is None:
+        testUtils.Utils.errorExit("Failed to get reference block or eosio abi from %s:%d" % (args.host, args.port))
+
+    start=time.perf_counter()
+    written=generateCorpus(args.output, accounts, args.count, reference, systemAbi, amount=args.amount, processes=args.processes)
+    elapsed=time.perf_counter()-start
+    print("Wrote %d transactions to %s in %.2f s (%.0f/s)" % (written, args.output, elapsed, written/elapsed))
@@ -0,0 +1,294 @@
+"""High rate transaction submission through chain push_transactions.
+
+BatchSubmitter takes (transaction id, push_transaction body) pairs, from a transCorpus file or a live
+generator, groups them into push_transactions batches and keeps a fixed number of requests in flight per
+node. Each response entry is matched back to its transaction and counted as accepted, rejected or duplicate.
+"""
+
+import json
+import queue
+import re
+import threading
+import time
+
+import eosTransaction
+import testUtils
+
+AcceptedTag="accepted"
+RejectedTag="rejected"
+DuplicateTag="duplicate"
+
+# chain_plugin refuses larger push_transactions requests
+MaxBatchSize=1000
+
+_exceptionNamePattern=re.compile(r"\d+ (\w+):")
+
+###########################################################################################
+class SubmitStats(object):
+    """Counts of a submission run, per status, per node and per error category. Thread safe."""
+
+    def __init__(self, maxErrorSamples=10):
+        self.maxErrorSamples=maxErrorSamples
+        self.counts={AcceptedTag: 0, RejectedTag: 0, DuplicateTag: 0}
+        self.nodeCounts={}
+        self.errors={}
+        self.errorSamples=[]
+        self.idMismatches=0
+        self.batches=0
+        self.failedBatches=0
+        self.batchLatencies=[]
+        self.startTime=None
+        self.endTime=None
+        self.__lock=threading.Lock()
+
+    def add(self, nodeKey, status, error=None):
+        with self.__lock:
+            self.counts[status] += 1
+            nodeCounts=self.nodeCounts.setdefault(nodeKey, {AcceptedTag: 0, RejectedTag: 0, DuplicateTag: 0})
+            nodeCounts[status] += 1
+            if error is not None:
+                category=SubmitStats.categorize(error)
+                self.errors[category]=self.errors.get(category, 0) + 1
+                if len(self.errorSamples) < self.maxErrorSamples:
+                    self.errorSamples.append(error[:512])
+
+    def addIdMismatch(self):
+        with self.__lock:
+            self.idMismatches += 1
+
+    def addBatch(self, latency, failed):
+        with self.__lock:
+            self.batches += 1
+            if failed:
+                self.failedBatches += 1
+            self.batchLatencies.append(latency)
+
+    # Exception name from an fc detail string, e.g. "tx_duplicate"
+    @staticmethod
+    def categorize(error):
+        m=_exceptionNamePattern.search(error)
+        return m.group(1) if m is not None else error.split("\n")[0][:64]
+
+    def getTotal(self):
+        return sum(self.counts.values())
+
+    def getElapsed(self):
+        if self.startTime is None:
+            return 0.0
+        return (self.endTime or time.perf_counter())-self.startTime
+
+    def getStats(self):
+        with self.__lock:
+            elapsed=self.getElapsed()
+            latencies=sorted(self.batchLatencies)
+            def percentile(p):
+                return latencies[min(len(latencies)-1, int(p*len(latencies)))] if latencies else 0.0
+            return {"counts": dict(self.counts), "nodes": dict(self.nodeCounts), "errors": dict(self.errors),
+                    "idMismatches": self.idMismatches, "batches": self.batches, "failedBatches": self.failedBatches,
+                    "elapsed": elapsed, "acceptedPerSec": self.counts[AcceptedTag]/elapsed if elapsed > 0 else 0.0,
+                    "batchLatency": {"p50": percentile(0.5), "p99": percentile(0.99),
+                                     "max": latencies[-1] if latencies else 0.0}}
+
+    def report(self):
+        stats=self.getStats()
+        lines=["Submitted %d transactions in %.2f s: %d accepted (%.0f/s), %d rejected, %d duplicate" % (
+            self.getTotal(), stats["elapsed"], stats["counts"][AcceptedTag], stats["acceptedPerSec"],
+            stats["counts"][RejectedTag], stats["counts"][DuplicateTag])]
+        lines.append("  %d batches (%d failed), batch latency p50 %.3f s, p99 %.3f s, max %.3f s" % (
+            stats["batches"], stats["failedBatches"], stats["batchLatency"]["p50"], stats["batchLatency"]["p99"],
+            stats["batchLatency"]["max"]))
+        for nodeKey, counts in sorted(stats["nodes"].items()):
+            lines.append("  %s: %d accepted, %d rejected, %d duplicate" % (
+                nodeKey, counts[AcceptedTag], counts[RejectedTag], counts[DuplicateTag]))
+        for category, count in sorted(stats["errors"].items(), key=lambda item: -item[1]):
+            lines.append("  error %s: %d" % (category, count))
+        if stats["idMismatches"]:
+            lines.append("  %d accepted transactions returned an unexpected id" % (stats["idMismatches"]))
+        return "\n".join(lines)
+
+###########################################################################################
+class BatchSubmitter(object):
+    """Pushes transactions to nodes with push_transactions, batchSize per request and inFlight requests
+    outstanding per node. Batches go to whichever node connection is free next.
+
+    onResult(transId, status, node, result), if given, is called from worker threads for every transaction."""
+
+    def __init__(self, nodes, batchSize=100, inFlight=4, onResult=None):
+        assert 0 < batchSize <= MaxBatchSize
+        self.nodes=nodes
+        self.batchSize=batchSize
+        self.inFlight=inFlight
+        self.onResult=onResult
+
+    @staticmethod
+    def getNodeKey(node):
+        return "%s:%d" % (node.host, node.port)
+
+    @staticmethod
+    def __toBytes(body):
+        return body if isinstance(body, (bytes, bytearray, memoryview)) else json.dumps(body).encode("utf-8")
+
+    # Submit every (transId, body) in source, body being push_transaction json object or its json bytes.
+    #  count: stop after count transactions. Returns SubmitStats.
+    def run(self, source, count=None):
+        stats=SubmitStats()
+        batches=queue.Queue(maxsize=2*self.inFlight*len(self.nodes))
+        workers=[]
+        for node in self.nodes:
+            for i in range(self.inFlight):
+                worker=threading.Thread(target=self.__worker, args=(node, batches, stats),
+                                        name="submit-%s-%d" % (BatchSubmitter.getNodeKey(node), i))
+                worker.daemon=True
+                workers.append(worker)
+
+        stats.startTime=time.perf_counter()
+        for worker in workers:
+            worker.start()
+        try:
+            batch=[]
+            for submitted, (transId, body) in enumerate(source):
+                if count is not None and submitted >= count:
+                    break
+                batch.append((transId, BatchSubmitter.__toBytes(body)))
+                if len(batch) == self.batchSize:
+                    if not BatchSubmitter.__put(batches, batch, workers):
+                        raise RuntimeError("All push_transactions workers exited")
+                    batch=[]
+            if batch and not BatchSubmitter.__put(batches, batch, workers):
+                raise RuntimeError("All push_transactions workers exited")
+        finally:
+            for _ in workers:
+                if not BatchSubmitter.__put(batches, None, workers):
+                    break
+            for worker in workers:
+                worker.join()
+            stats.endTime=time.perf_counter()
+        return stats
+
+    # Queue item, waiting while the queue is full. Returns False, without queueing, once no worker is left
+    #  to take it.
+    @staticmethod
+    def __put(batches, item, workers):
+        while True:
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if not any(worker.is_alive() for worker in workers):
+                    return False
+
+    def __worker(self, node, batches, stats):
+        nodeKey=BatchSubmitter.getNodeKey(node)
+        while True:
+            batch=batches.get()
+            if batch is None:
+                return
+            payload=b"[" + b",".join(bytes(body) for _, body in batch) + b"]"
+            start=time.perf_counter()
+            results=None
+            error=None
+            try:
+                results=node.httpClient.call("/v1/chain/push_transactions", payload)
+                if not isinstance(results, list):
+                    raise ValueError("push_transactions returned %s instead of a list" % (type(results).__name__))
+            except Exception as ex:
+                # HttpError, or a malformed response: count the batch as failed and keep the worker alive
+                error=ex
+            stats.addBatch(time.perf_counter()-start, error is not None)
+            node.invalidateInfo()
+
+            if error is not None:
+                if isinstance(error, testUtils.HttpError):
+                    status=DuplicateTag if error.code == 409 else RejectedTag
+                    msg=error.output.decode("utf-8", "replace")
+                else:
+                    status=RejectedTag
+                    msg="%s: %s" % (type(error).__name__, error)
+                for transId, _ in batch:
+                    self.__record(stats, node, nodeKey, transId, status, msg, None)
+                continue
+
+            recorded=0
+            try:
+                for i, (transId, _) in enumerate(batch):
+                    result=results[i] if i < len(results) else None
+                    recorded=i+1
+                    if not isinstance(result, dict):
+                        self.__record(stats, node, nodeKey, transId, RejectedTag,
+                                      "missing push_transactions result" if result is None else
+                                      "malformed push_transactions result: %s" % (str(result)[:256]), None)
+                        continue
+                    processed=result.get("processed")
+                    if isinstance(processed, dict) and "error" in processed:
+                        msg=str(processed["error"])
+                        status=DuplicateTag if "tx_duplicate" in msg else RejectedTag
+                        self.__record(stats, node, nodeKey, transId, status, msg, result)
+                        continue
+                    if result.get("transaction_id") != transId:
+                        stats.addIdMismatch()
+                    self.__record(stats, node, nodeKey, transId, AcceptedTag, None, result)
+            except Exception as ex:
+                # result handling or onResult failed: the rest of the batch counts as rejected, keep the worker alive
+                msg="%s: %s" % (type(ex).__name__, ex)
+                testUtils.Utils.Print("ERROR: Exception during push_transactions result handling. %s" % (msg))
+                for transId, _ in batch[recorded:]:
+                    self.__record(stats, node, nodeKey, transId, RejectedTag, msg, None, silentErrors=True)
+
+    # Count transId's status and report it to onResult. With silentErrors, onResult exceptions are ignored.
+    def __record(self, stats, node, nodeKey, transId, status, error, result, silentErrors=False):
+        stats.add(nodeKey, status, error)
+        if self.onResult is not None:
+            try:
+                self.onResult(transId, status, node, result)
+            except Exception:
+                if not silentErrors:
+                    raise
+
+###########################################################################################
+# True if the chain head time has used up refreshFraction of reference's expiration window
+def _isReferenceAging(builder, reference, refreshFraction):
+    info=builder.node.getInfo(silentErrors=True)
+    if info is None:
+        return True
+    headTime=eosTransaction.parseTime(info["head_block_time"])
+    return reference[0]-headTime < builder.expirationSeconds*(1-refreshFraction)
+
+# Live source: yields (transId, push_transaction json object) for count core token transfers, sender
+#  accounts[seq % n] to accounts[(seq+1) % n], built with TransactionBuilder. Every checkEvery
+#  transactions the (cached) head block time is compared with the expiration. The reference block is
+#  refreshed once refreshFraction of the expiration window has passed on chain, so slow generation or
+#  backpressure does not yield transactions that expire before they are pushed.
+def liveTransfers(builder, accounts, count, amount=1, memo="live %d", refreshFraction=0.25, checkEvery=100):
+    reference=None
+    for seq in range(count):
+        if reference is None or (seq % checkEvery == 0 and _isReferenceAging(builder, reference, refreshFraction)):
+            reference=builder.getReference()
+            if reference is None:
+                return
+        sender=accounts[seq % len(accounts)]
+        receiver=accounts[(seq+1) % len(accounts)]
+        action=builder.createTransferAction(sender, receiver, amount, memo % (seq))
+        transId, trans=builder.build([action], [sender.activePrivateKey], reference=reference)
+        yield (transId, trans)
+
+if __name__ == "__main__":
+    import argparse
+    import transCorpus
+
+    parser=argparse.ArgumentParser(description="Replay a transaction corpus with push_transactions")
+    parser.add_argument("--corpus", type=str, help="Corpus file from transCorpus.py", required=True)
+    parser.add_argument("--node", type=str, action="append", help="host:port of a nodeos http endpoint, repeat for more nodes")
+    parser.add_argument("--batch-size", type=int, help="Transactions per push_transactions request", default=100)
+    parser.add_argument("--in-flight", type=int, help="Outstanding requests per node", default=4)
+    parser.add_argument("--count", type=int, help="Submit at most count transactions", default=None)
+    args=parser.parse_args()
+
+    nodes=[]
+    for spec in (args.node or ["localhost:8888"]):
+        host, port=spec.rsplit(":", 1)
+        nodes.append(testUtils.Node(host, int(port), transport=testUtils.Utils.TransportHttpTag))
+
+    with transCorpus.TransCorpus(args.corpus) as corpus:
+        submitter=BatchSubmitter(nodes, batchSize=args.batch_size, inFlight=args.in_flight)
+        stats=submitter.run(corpus, count=args.count)
+    print(stats.report())